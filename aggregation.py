@@ -0,0 +1,239 @@
+"""
+SQL-side aggregation helpers for group-by style queries.
+Lets execute() describe group keys and aggregates, which are compiled to a
+single GROUP BY statement so only one row per group leaves the database.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import case, extract, func, select, tuple_
+from filters import filter_criteria
+from types_definitions import GroupKeyDict, MeasureDict, PredicateDict
+
+# Dialects supporting GROUP BY GROUPING SETS (used for the totals row)
+GROUPING_SETS_DIALECTS = ('mssql', 'postgresql', 'oracle')
+
+
+def key(column: str, name: Optional[str] = None) -> GroupKeyDict:
+    """
+    Group by the value of a column
+    
+    Args:
+        column: Column name on the aggregated model
+        name: Result key (defaults to the column name)
+    """
+    return {'column': column, 'part': None, 'name': name or column}
+
+
+def year_key(column: str, name: Optional[str] = None) -> GroupKeyDict:
+    """Group by the year of a date column (result value is an int)"""
+    return {'column': column, 'part': 'year', 'name': name or f'{column}Year'}
+
+
+def month_key(column: str, name: Optional[str] = None) -> GroupKeyDict:
+    """Group by the month (1-12) of a date column (result value is an int)"""
+    return {'column': column, 'part': 'month', 'name': name or f'{column}Month'}
+
+
+def _measure(name: str, function: str, column: Optional[str] = None,
+             predicate: Optional[PredicateDict] = None) -> MeasureDict:
+    """Build a measure dictionary"""
+    return {'name': name, 'function': function, 'column': column, 'predicate': predicate}
+
+
+def count_rows(name: str = 'Count') -> MeasureDict:
+    """COUNT(*) of the group"""
+    return _measure(name, 'count')
+
+
+def count_where(predicate: PredicateDict, name: str) -> MeasureDict:
+    """
+    Number of rows of the group matching a predicate
+    
+    Example:
+        count_where(gt('Debit', 0), 'DebitTransactions')
+    """
+    return _measure(name, 'count_where', predicate=predicate)
+
+
+def sum_of(column: str, name: Optional[str] = None) -> MeasureDict:
+    """SUM of a column, NULL values counted as 0"""
+    return _measure(name or column, 'sum', column)
+
+
+def avg_of(column: str, name: Optional[str] = None) -> MeasureDict:
+    """AVG of a column (NULL values are ignored)"""
+    return _measure(name or column, 'avg', column)
+
+
+def min_of(column: str, name: Optional[str] = None) -> MeasureDict:
+    """MIN of a column"""
+    return _measure(name or column, 'min', column)
+
+
+def max_of(column: str, name: Optional[str] = None) -> MeasureDict:
+    """MAX of a column"""
+    return _measure(name or column, 'max', column)
+
+
+class AggregateResult:
+    """
+    Result of an aggregation
+    
+    Attributes:
+        rows: One dictionary per group (key names and measure names)
+        total: Measures over all rows when totals were requested, else None
+    """
+    
+    def __init__(self, rows: List[Dict[str, Any]], total: Optional[Dict[str, Any]] = None) -> None:
+        self.rows = rows
+        self.total = total
+    
+    def __iter__(self):
+        return iter(self.rows)
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def _column(model: Any, name: str) -> Any:
+    """Get a mapped column attribute, validating the name"""
+    if name not in model.__table__.columns:
+        raise ValueError(f"Column '{name}' does not exist on {model.__name__}")
+    return getattr(model, name)
+
+
+def _key_expression(model: Any, group_key: GroupKeyDict) -> Any:
+    """Compile a group key to a SQL expression"""
+    column = _column(model, group_key['column'])
+    if group_key['part'] is None:
+        return column
+    return extract(group_key['part'], column)
+
+
+def _measure_expression(model: Any, measure: MeasureDict) -> Any:
+    """Compile a measure to a SQL aggregate expression"""
+    function = measure['function']
+    if function == 'count':
+        return func.count()
+    if function == 'count_where':
+        criterion = filter_criteria(model, [measure['predicate']])[0]
+        return func.coalesce(func.sum(case((criterion, 1), else_=0)), 0)
+    
+    column = _column(model, measure['column'])
+    if function == 'sum':
+        return func.coalesce(func.sum(column), 0)
+    if function == 'avg':
+        return func.avg(column)
+    if function == 'min':
+        return func.min(column)
+    if function == 'max':
+        return func.max(column)
+    raise ValueError(f"Unknown aggregate function '{function}'")
+
+
+def aggregate_select(
+    model: Any,
+    keys: Sequence[GroupKeyDict],
+    measures: Sequence[MeasureDict],
+    where: Optional[Sequence[PredicateDict]] = None
+) -> Any:
+    """
+    Build the GROUP BY statement of aggregate() without executing it
+    
+    The soft delete filter is applied by the session executing the statement
+    (unless executed with include_deleted=True).
+    
+    Args:
+        model: Mapped model class
+        keys: Group keys created with key(), year_key(), month_key()
+        measures: Aggregates created with sum_of(), count_rows(), ...
+        where: Row predicates (see filters.py), combined with AND
+    
+    Returns:
+        Select: One row per group (one row in total without keys)
+    
+    Raises:
+        ValueError: If a column or function is unknown
+    """
+    key_expressions = [_key_expression(model, group_key) for group_key in keys]
+    statement = select(
+        *[expression.label(group_key['name']) for expression, group_key in zip(key_expressions, keys)],
+        *[_measure_expression(model, measure).label(measure['name']) for measure in measures]
+    ).select_from(model).where(*filter_criteria(model, list(where or [])))
+    if key_expressions:
+        statement = statement.group_by(*key_expressions)
+    return statement
+
+
+def aggregate(
+    session: Any,
+    model: Any,
+    keys: Sequence[GroupKeyDict],
+    measures: Sequence[MeasureDict],
+    where: Optional[Sequence[PredicateDict]] = None,
+    totals: bool = False
+) -> AggregateResult:
+    """
+    Aggregate a model's rows per group in SQL
+    
+    Soft-deleted rows are excluded by the session's soft delete listener
+    (models.filter_soft_deletes). With totals=True the measures over all
+    groups are returned too, computed with GROUPING SETS on dialects that
+    support it (one statement) or with a second statement otherwise.
+    
+    Args:
+        session: SQLAlchemy session (not the read-only wrapper)
+        model: Mapped model class
+        keys: Group keys created with key(), year_key(), month_key()
+        measures: Aggregates created with sum_of(), count_rows(), ...
+        where: Row predicates (see filters.py), combined with AND
+        totals: Also compute the measures over all rows
+    
+    Returns:
+        AggregateResult: Rows ordered by the group keys, and the totals row
+    
+    Raises:
+        ValueError: If a column or function is unknown
+    """
+    if not measures:
+        raise ValueError("At least one measure must be given")
+    
+    key_expressions = [_key_expression(model, group_key) for group_key in keys]
+    measure_columns = [_measure_expression(model, measure).label(measure['name']) for measure in measures]
+    
+    criteria = filter_criteria(model, list(where or []))
+    
+    def statement(expressions: List[Any]) -> Any:
+        selected = [expression.label(group_key['name']) for expression, group_key in zip(expressions, keys)]
+        return select(*selected, *measure_columns).select_from(model).where(*criteria)
+    
+    def to_dict(row: Any) -> Dict[str, Any]:
+        return {name: row._mapping[name] for name in row._mapping.keys() if name != '_is_total'}
+    
+    if not key_expressions:
+        total = to_dict(session.execute(statement([])).one())
+        return AggregateResult([total], total if totals else None)
+    
+    if totals and session.get_bind().dialect.name in GROUPING_SETS_DIALECTS:
+        query = statement(key_expressions).add_columns(
+            func.grouping(key_expressions[0]).label('_is_total')
+        ).group_by(
+            func.grouping_sets(tuple_(*key_expressions), tuple_())
+        ).order_by(*key_expressions)
+        rows: List[Dict[str, Any]] = []
+        total = None
+        for row in session.execute(query):
+            if row._mapping['_is_total']:
+                total = to_dict(row)
+                total.update({group_key['name']: None for group_key in keys})
+            else:
+                rows.append(to_dict(row))
+        return AggregateResult(rows, total)
+    
+    query = statement(key_expressions).group_by(*key_expressions).order_by(*key_expressions)
+    rows = [to_dict(row) for row in session.execute(query)]
+    
+    total = None
+    if totals:
+        total = to_dict(session.execute(statement([])).one())
+        total.update({group_key['name']: None for group_key in keys})
+    return AggregateResult(rows, total)
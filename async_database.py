@@ -0,0 +1,306 @@
+"""
+Asyncio database access for the web tier.
+An AsyncDatabase mirrors Database with an async engine (aioodbc for SQL
+Server, aiosqlite, asyncpg), so async Flask endpoints wait for the database
+without blocking on the driver.
+
+Audit queries are synchronous (execute(session)); AsyncReadOnlySession.run()
+runs them through AsyncSession.run_sync, which hands the query a regular
+ReadOnlySession whose statements are awaited on the async connection.
+
+Connections of an async engine belong to the event loop that opened them.
+Flask (WSGI) would run each async view in a fresh event loop, so all async
+database work runs on one long-lived loop per process instead (a daemon
+thread, see AsyncDatabase.run) and the engine pools connections like the
+synchronous one (DB_POOL_MODE). A WSGI view still blocks its worker thread
+until the result is ready; what the loop adds is pooled async connections
+and concurrent requests overlapping their database waits. Python code of
+the queries runs on the loop thread, one request at a time.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+from sqlalchemy.pool import NullPool
+from config import Config
+from database import ReadOnlySession, dialect_isolation_level
+from filters import filter_criteria
+from types_definitions import ColumnsDict, FiltersDict
+from core_fetch import core_select
+
+try:
+    import greenlet  # noqa: F401 - required by SQLAlchemy's asyncio bridge
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+
+class AsyncReadOnlySession:
+    """
+    Read-only wrapper of an AsyncSession.
+    Only SELECT queries are allowed.
+    """
+    
+    def __init__(
+        self,
+        session: 'AsyncSession',
+        columns: Optional[ColumnsDict] = None,
+        filters: Optional[FiltersDict] = None
+    ) -> None:
+        """
+        Initialize async read-only session wrapper
+        
+        Args:
+            session: SQLAlchemy AsyncSession to wrap
+            columns: Optional column projection declared by the query's define()
+            filters: Optional resolved row predicates declared by the query's define()
+        """
+        self._session = session
+        self._columns: ColumnsDict = columns or {}
+        self._filters: FiltersDict = filters or {}
+    
+    async def run(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run synchronous query code, e.g. a query module's execute(session)
+        
+        The function receives a ReadOnlySession with the declared projection
+        and filters; its statements are awaited on the async connection.
+        Avoid running several functions that use session.snapshot() concurrently
+        in one event loop, as snapshot loads are serialized with thread locks.
+        
+        Args:
+            function: Callable taking the session as first argument
+        
+        Returns:
+            The function's result
+        
+        Usage:
+            results = await session.run(test_module.execute)
+        """
+        def call(sync_session: Any) -> Any:
+            wrapped = ReadOnlySession(sync_session, columns=self._columns, filters=self._filters)
+            return function(wrapped, *args, **kwargs)
+        
+        return await self._session.run_sync(call)
+    
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Allow execute for SELECT queries
+        
+        Returns:
+            Result object
+        """
+        return await self._session.execute(*args, **kwargs)
+    
+    async def scalars(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Allow scalars for SELECT queries
+        
+        Returns:
+            ScalarResult object
+        """
+        return await self._session.scalars(*args, **kwargs)
+    
+    async def fetch(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        numeric: str = 'decimal'
+    ) -> Any:
+        """
+        Fetch rows of a model through Core (see ReadOnlySession.fetch)
+        
+        Returns:
+            list: Rows (tuple-like, columns accessible by attribute)
+        """
+        names = list(columns) if columns else self._columns.get(model.__name__)
+        criteria = filter_criteria(model, self._filters.get(model.__name__, []))
+        result = await self._session.execute(core_select(model, names, criteria, numeric=numeric))
+        return result.all()
+    
+    async def close(self) -> None:
+        """Close the session"""
+        await self._session.close()
+    
+    async def rollback(self) -> None:
+        """Allow rollback"""
+        await self._session.rollback()
+    
+    async def __aenter__(self) -> 'AsyncReadOnlySession':
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+    
+    # Block write operations
+    def add(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+    
+    def add_all(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+    
+    async def delete(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+    
+    async def commit(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+    
+    async def flush(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+    
+    async def merge(self, *args: Any, **kwargs: Any) -> None:
+        raise PermissionError("Write operations are not allowed. Session is read-only.")
+
+
+class AsyncDatabase:
+    """Async database connection manager"""
+    
+    def __init__(self) -> None:
+        """Initialize async engines and session factories (created lazily)"""
+        self.engine: Optional['AsyncEngine'] = None
+        self.SessionLocal: Optional['async_sessionmaker'] = None
+        self.read_engine: Optional['AsyncEngine'] = None
+        self.ReadSessionLocal: Optional['async_sessionmaker'] = None
+        self._initialized: bool = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Get the process's database event loop, starting its thread if needed
+        
+        A forked child has no loop thread and must not use the parent's
+        connections, so it gets a new loop and new engines.
+        """
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='async-database', daemon=True).start()
+                self._pid = os.getpid()
+                self._initialized = False
+            return self._loop
+    
+    def run(self, coroutine: Awaitable[Any]) -> Any:
+        """
+        Run a coroutine on the database event loop and wait for its result
+        
+        Sessions and engines of this instance must only be used inside such
+        coroutines; callable from any thread except the loop's own.
+        
+        Args:
+            coroutine: Coroutine using the async sessions
+        
+        Returns:
+            The coroutine's result
+        
+        Usage:
+            async def count():
+                async with await async_db.get_session() as session:
+                    return await session.run(lambda s: s.query(Transaction).count())
+            total = async_db.run(count())
+        """
+        loop = self.loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("AsyncDatabase.run() cannot be called from the database event loop; await instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+    
+    def _initialize(self) -> None:
+        """Create async engines and session factories (lazy initialization)"""
+        if self._initialized:
+            return
+        if not ASYNC_AVAILABLE:
+            raise RuntimeError("Async database access requires greenlet (pip install greenlet)")
+        
+        try:
+            self.engine = self._create_engine(Config.get_async_connection_string())
+            if Config.has_separate_read_connection():
+                self.read_engine = self._create_engine(
+                    Config.get_async_connection_string(Config.get_read_connection_string())
+                )
+            else:
+                self.read_engine = self.engine
+            
+            self.SessionLocal = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+            self.ReadSessionLocal = async_sessionmaker(self.read_engine, autoflush=False, expire_on_commit=False)
+            self._initialized = True
+        
+        except Exception as e:
+            print(f"✗ Error initializing async database connection: {e}")
+            raise
+    
+    @staticmethod
+    def _create_engine(connection_string: str) -> 'AsyncEngine':
+        """Create an async engine with the configured pool (see Database._engine_pool_options)"""
+        pool = Config.get_pool_options()
+        if pool['mode'] == 'queue':
+            # AsyncAdaptedQueuePool; connections stay on the database event loop
+            options: Dict[str, Any] = {
+                'pool_size': pool['size'],
+                'max_overflow': pool['max_overflow'],
+                'pool_timeout': pool['timeout'],
+                'pool_recycle': pool['recycle'],
+                'pool_pre_ping': pool['pre_ping']
+            }
+        else:
+            options = {'poolclass': NullPool}
+        engine = create_async_engine(connection_string, echo=False, **options)
+        if engine.dialect.name == 'sqlite' and Config.SQLITE_TUNING:
+            from embedded_backend import tune_sqlite
+            tune_sqlite(engine.sync_engine)
+        return engine
+    
+    async def get_session(
+        self,
+        columns: Optional[ColumnsDict] = None,
+        filters: Optional[FiltersDict] = None,
+        isolation_level: Optional[str] = None
+    ) -> AsyncReadOnlySession:
+        """
+        Create and return a new async read-only session on the read engine
+        
+        Args:
+            columns: Optional column projection declared by the query's define()
+            filters: Optional resolved row predicates declared by the query's define()
+            isolation_level: Optional isolation level; defaults to DB_ISOLATION_LEVEL
+        
+        Returns:
+            AsyncReadOnlySession: Read-only async session wrapper
+        
+        Raises:
+            ValueError: If the isolation level is not supported
+        """
+        self._initialize()
+        level = Config.get_isolation_level(isolation_level)
+        session = self.ReadSessionLocal()
+        if level:
+            # Must be set before the first statement starts the transaction
+            level = dialect_isolation_level(self.read_engine.dialect.name, level)
+            await session.connection(execution_options={'isolation_level': level})
+        return AsyncReadOnlySession(session, columns=columns, filters=filters)
+    
+    def get_write_session(self) -> 'AsyncSession':
+        """
+        Create and return a new writable AsyncSession on the write engine
+        
+        Returns:
+            AsyncSession: Async session (caller must commit/close it)
+        """
+        self._initialize()
+        return self.SessionLocal()
+    
+    async def dispose(self) -> None:
+        """Close the engines' connections (await it on the database event loop, see run)"""
+        if self.engine is not None:
+            await self.engine.dispose()
+        if self.read_engine is not None and self.read_engine is not self.engine:
+            await self.read_engine.dispose()
+
+
+# Global async database instance
+async_db = AsyncDatabase()
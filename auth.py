@@ -285,6 +285,19 @@ def get_all_users():
         session.close()
 
 
+async def get_all_users_async():
+    """دریافت لیست تمام کاربران از طریق موتور async (برای endpointهای async)"""
+    from sqlalchemy import select
+    from async_database import async_db
+    
+    session = async_db.get_write_session()
+    try:
+        result = await session.scalars(select(User).order_by(User.created_at.desc()))
+        return result.all()
+    finally:
+        await session.close()
+
+
 def update_user(user_id: int, **kwargs) -> bool:
     """به‌روزرسانی اطلاعات کاربر"""
     if not db._initialized:
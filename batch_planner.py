@@ -0,0 +1,311 @@
+"""
+Shared-scan batch planner for running many tests in one batch.
+Tests declaring their source columns in define() are grouped by source model;
+each group's table is scanned once (the union of the group's columns) and
+every test of the group reads its rows from that scan instead of querying the
+table again, so a full battery costs roughly one pass per table.
+
+A test's session.query(Model).all() (or iteration / count()) and
+session.fetch(Model) are served from the shared scan, projected to the test's
+declared columns and filtered by its declared predicates in Python. Any other
+use of the query (filter(), order_by(), ...) runs in SQL as usual.
+
+Only predicates with the same result in Python and SQL are evaluated on
+shared rows (comparisons of numeric, date and boolean columns); tests with
+string predicates (collation-dependent) or their own isolation level keep
+their own queries.
+"""
+import operator
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric
+from filters import _coerce, resolve_filters
+from types_definitions import PredicateDict
+
+# Filter operators evaluated on shared rows
+COMPARISONS = {
+    'gt': operator.gt,
+    'ge': operator.ge,
+    'lt': operator.lt,
+    'le': operator.le,
+    'eq': operator.eq,
+    'ne': operator.ne
+}
+
+
+def _model_of(name: str) -> Optional[Any]:
+    """Mapped model class of a model name"""
+    from database import Base
+    import models  # noqa: F401 - registers the mappers
+    
+    for mapper in Base.registry.mappers:
+        if mapper.class_.__name__ == name:
+            return mapper.class_
+    return None
+
+
+def _python_predicate(model: Any, predicate: PredicateDict, position: int) -> Optional[Callable[[Any], bool]]:
+    """
+    Compile a resolved predicate to a test on a scanned row
+    
+    Args:
+        model: Mapped model class
+        predicate: Resolved predicate (see filters.resolve_filters)
+        position: Index of the predicate's column in the scanned rows
+    
+    Returns:
+        Callable returning True for matching rows, or None if the predicate
+        cannot be evaluated exactly like SQL (string columns, unknown operators)
+    """
+    table_columns = model.__table__.columns
+    name = predicate['column']
+    if name not in table_columns:
+        return None
+    column = table_columns[name]
+    if not isinstance(column.type, (Numeric, Integer, Date, DateTime, Boolean)):
+        return None
+    
+    op = predicate['op']
+    value = predicate.get('value')
+    # Comparisons with NULL are never true in SQL
+    if op == 'not_null':
+        return lambda row: row[position] is not None
+    if op == 'between':
+        low, high = (_coerce(model, column, bound) for bound in value)
+        return lambda row: row[position] is not None and low <= row[position] <= high
+    if op == 'in':
+        if isinstance(value, str):
+            value = [item.strip() for item in value.split(',') if item.strip()]
+        values = [_coerce(model, column, item) for item in value]
+        return lambda row: row[position] is not None and row[position] in values
+    compare = COMPARISONS.get(op)
+    if compare is None:
+        return None
+    value = _coerce(model, column, value)
+    return lambda row: row[position] is not None and compare(row[position], value)
+
+
+class SharedScan:
+    """One scan of a model's table shared by a group of tests"""
+    
+    def __init__(self, model: Any, columns: List[str], consumers: List[str]) -> None:
+        """
+        Initialize the scan (rows are read on first use)
+        
+        Args:
+            model: Mapped model class
+            columns: Union of the columns the group's tests read, in table order
+            consumers: Test ids of the group
+        """
+        self.model = model
+        self.columns = columns
+        self.consumers = list(consumers)
+        self._pending = set(consumers)
+        self._rows: Optional[List[Any]] = None
+        self.scans = 0
+    
+    def rows(self, session: Any) -> List[Any]:
+        """Get the scanned rows, scanning the table on the first call"""
+        if self._rows is None:
+            attributes = [getattr(self.model, name) for name in self.columns]
+            self._rows = session.query(*attributes).all()
+            self.scans += 1
+        return self._rows
+    
+    def release(self, test_id: str) -> None:
+        """Mark a test as done; the rows are dropped after the last test"""
+        self._pending.discard(test_id)
+        if not self._pending:
+            self._rows = None
+
+
+class PreloadedQuery:
+    """
+    Query of one test over a shared scan
+    
+    all(), iteration and count() use the shared rows; any other attribute
+    is taken from the test's own SQL query.
+    """
+    
+    def __init__(
+        self,
+        scan: SharedScan,
+        session: Any,
+        row_type: Any,
+        positions: List[int],
+        predicates: List[Callable[[Any], bool]]
+    ) -> None:
+        self._scan = scan
+        self._session = session
+        self._row_type = row_type
+        self._positions = positions
+        self._predicates = predicates
+    
+    def all(self) -> List[Any]:
+        """Rows of the test: the declared columns of the rows matching its predicates"""
+        make = self._row_type._make
+        predicates = self._predicates
+        rows = self._scan.rows(self._session)
+        if predicates:
+            rows = [row for row in rows if all(test(row) for test in predicates)]
+        positions = self._positions
+        return [make([row[position] for position in positions]) for row in rows]
+    
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.all())
+    
+    def count(self) -> int:
+        return len(self.all())
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session.query(self._scan.model), name)
+
+
+class BatchSession:
+    """
+    Read-only session of one test in a batch
+    
+    Wraps the test's ReadOnlySession; reads of planned models are served
+    from the shared scans.
+    """
+    
+    def __init__(self, planner: 'BatchPlanner', test_id: str, session: Any) -> None:
+        self._planner = planner
+        self._test_id = test_id
+        self._session = session
+    
+    def query(self, *args: Any, **kwargs: Any) -> Any:
+        """Query the shared scan for query(Model) of a planned model, otherwise the database"""
+        if len(args) == 1 and not kwargs:
+            preloaded = self._planner.preloaded(self._test_id, args[0], self._session)
+            if preloaded is not None:
+                return preloaded
+        return self._session.query(*args, **kwargs)
+    
+    def fetch(self, model: Any, columns: Any = None, numeric: str = 'decimal') -> List[Any]:
+        """Fetch rows of a planned model from the shared scan (see ReadOnlySession.fetch)"""
+        if not columns and numeric == 'decimal':
+            preloaded = self._planner.preloaded(self._test_id, model, self._session)
+            if preloaded is not None:
+                return preloaded.all()
+        return self._session.fetch(model, columns, numeric)
+    
+    def close(self) -> None:
+        """Close the session and release the test's shared scans"""
+        self._planner.release(self._test_id)
+        self._session.close()
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+
+class BatchPlanner:
+    """
+    Plans shared scans for a batch of tests
+    
+    Usage:
+        planner = BatchPlanner(modules, query_runner.get_parameter)
+        for test_id, module in modules.items():
+            session = planner.session(test_id, get_test_session(module))
+            try:
+                results = module.execute(session)
+            finally:
+                session.close()
+    """
+    
+    def __init__(self, modules: Dict[str, Any], get_value: Callable[[str, Any], Any]) -> None:
+        """
+        Group the tests by the source models they declare
+        
+        Args:
+            modules: Test id -> query module, in run order
+            get_value: Parameter getter resolving filter parameters (query_runner.get_parameter)
+        """
+        self.scans: Dict[str, SharedScan] = {}
+        # (test id, model name) -> (row type, column names, resolved predicates)
+        self._reads: Dict[Any, Any] = {}
+        
+        groups: Dict[str, List[str]] = {}
+        for test_id, module in modules.items():
+            try:
+                definitions = module.define() if hasattr(module, 'define') else None
+            except Exception:
+                # Reported when the test runs
+                continue
+            if not definitions or definitions.get('isolation_level'):
+                continue
+            filters = resolve_filters(definitions.get('filters'), get_value)
+            for model_name, names in (definitions.get('columns') or {}).items():
+                model = _model_of(model_name)
+                if model is None or not names:
+                    continue
+                predicates = filters.get(model_name, [])
+                if any(_python_predicate(model, predicate, 0) is None for predicate in predicates):
+                    continue
+                self._reads[(test_id, model_name)] = (list(names), predicates)
+                groups.setdefault(model_name, []).append(test_id)
+        
+        for model_name, test_ids in groups.items():
+            if len(test_ids) < 2:
+                # A single reader gains nothing from a shared scan
+                for test_id in test_ids:
+                    del self._reads[(test_id, model_name)]
+                continue
+            model = _model_of(model_name)
+            wanted = set()
+            for test_id in test_ids:
+                names, predicates = self._reads[(test_id, model_name)]
+                wanted.update(names)
+                wanted.update(predicate['column'] for predicate in predicates)
+            columns = [column.name for column in model.__table__.columns if column.name in wanted]
+            self.scans[model_name] = SharedScan(model, columns, test_ids)
+        
+        for (test_id, model_name), (names, predicates) in list(self._reads.items()):
+            scan = self.scans[model_name]
+            row_type = namedtuple(f'{model_name}Row', names)
+            self._reads[(test_id, model_name)] = (
+                row_type,
+                [scan.columns.index(name) for name in names],
+                [
+                    _python_predicate(scan.model, predicate, scan.columns.index(predicate['column']))
+                    for predicate in predicates
+                ]
+            )
+    
+    def session(self, test_id: str, session: Any) -> Any:
+        """
+        Wrap a test's session so its planned reads use the shared scans
+        
+        Returns:
+            BatchSession, or the session itself if the test reads no planned model
+        """
+        if any(key[0] == test_id for key in self._reads):
+            return BatchSession(self, test_id, session)
+        return session
+    
+    def preloaded(self, test_id: str, model: Any, session: Any) -> Optional[PreloadedQuery]:
+        """Query of a test over the shared scan of a model, or None if not planned"""
+        if not isinstance(model, type):
+            return None
+        read = self._reads.get((test_id, model.__name__))
+        if read is None:
+            return None
+        row_type, positions, predicates = read
+        return PreloadedQuery(self.scans[model.__name__], session, row_type, positions, predicates)
+    
+    def release(self, test_id: str) -> None:
+        """Release the shared scans a finished test was reading"""
+        for scan in self.scans.values():
+            scan.release(test_id)
+    
+    def summary(self) -> Dict[str, Any]:
+        """
+        Describe the planned scans
+        
+        Returns:
+            dict: Model name -> scanned columns, tests of the group and number of scans made
+        """
+        return {
+            model_name: {'columns': scan.columns, 'tests': scan.consumers, 'scans': scan.scans}
+            for model_name, scan in self.scans.items()
+        }
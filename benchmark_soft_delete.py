@@ -0,0 +1,155 @@
+"""
+Micro-benchmark of the soft delete filter
+Compares the previous Query before_compile hook with the current
+do_orm_execute / with_loader_criteria listener (models.filter_soft_deletes).
+
+For each mode it runs the same small queries many times against a temporary
+SQLite database and reports the time per query with the statement cache, how
+many times SQL had to be compiled (cache misses), and the time per query when
+every execution is compiled from scratch (statement cache disabled).
+Timings on a shared machine are noisy, so the number of Python function calls
+per query (counted with cProfile) is reported as a stable measure of the
+per-execution overhead.
+
+Usage:
+    python benchmark_soft_delete.py
+    python benchmark_soft_delete.py --queries 5000
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# باید قبل از import ماژول config تنظیم شود
+os.environ['CONNECTION_STRING'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(prefix='audit_benchmark_'), 'benchmark.db'
+)
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Query, Session
+from database import db, Base
+import models
+from models import Transaction
+
+
+def legacy_filter_soft_deletes(query):
+    """The before_compile hook used before the do_orm_execute listener"""
+    for entity in query.column_descriptions:
+        entity_class = entity['entity']
+        if entity_class is not None and hasattr(entity_class, 'IsDeleted'):
+            if not query._execution_options.get('include_deleted', False):
+                query = query.enable_assertions(False).filter(entity_class.IsDeleted == False)
+    return query
+
+
+def use_legacy_hook() -> None:
+    """Switch from the current listener to the legacy before_compile hook"""
+    event.remove(Session, 'do_orm_execute', models.filter_soft_deletes)
+    event.listen(Query, 'before_compile', legacy_filter_soft_deletes, retval=True)
+
+
+def use_current_listener() -> None:
+    """Switch back to the current do_orm_execute listener"""
+    event.remove(Query, 'before_compile', legacy_filter_soft_deletes)
+    event.listen(Session, 'do_orm_execute', models.filter_soft_deletes)
+
+
+def populate(rows: int) -> None:
+    """Create the schema and insert sample transactions"""
+    Base.metadata.create_all(db.engine)
+    session = db.SessionLocal()
+    try:
+        session.add_all([
+            Transaction(Uuid=f'bench-{i}', AccountCode=f'{i % 50:04d}', Debit=i, Credit=0, IsDeleted=(i % 10 == 0))
+            for i in range(rows)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def count_compilations() -> Dict[str, int]:
+    """Count SQL compilations on the engine's dialect"""
+    counter = {'compilations': 0}
+    dialect = db.engine.dialect
+    original = type(dialect).statement_compiler
+
+    def counting_compiler(*args: Any, **kwargs: Any) -> Any:
+        counter['compilations'] += 1
+        return original(*args, **kwargs)
+
+    dialect.statement_compiler = counting_compiler
+    return counter
+
+
+QUERIES: List[Tuple[str, Callable[[Session, int, Dict[str, Any]], Any]]] = [
+    ('entity by id', lambda s, i, o: s.query(Transaction).execution_options(**o).filter(Transaction.Id == i).first()),
+    ('columns by account', lambda s, i, o: s.query(Transaction.Id, Transaction.Debit).execution_options(**o).filter(Transaction.AccountCode == f'{i % 50:04d}').all()),
+    ('count', lambda s, i, o: s.query(func.count(Transaction.Id)).execution_options(**o).scalar()),
+]
+
+
+def time_queries(session: Session, run_query: Callable, queries: int, repeat: int, options: Dict[str, Any]) -> float:
+    """Best time of repeat rounds of queries executions, in seconds per query"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(queries):
+            run_query(session, i + 1, options)
+        best = min(best, time.perf_counter() - start)
+    return best / queries
+
+
+def count_calls(session: Session, run_query: Callable, queries: int) -> float:
+    """Python function calls per query execution"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for i in range(queries):
+        run_query(session, i + 1, {})
+    profiler.disable()
+    return pstats.Stats(profiler).total_calls / queries
+
+
+def run(label: str, queries: int, repeat: int, counter: Dict[str, int]) -> None:
+    """Run every query shape and print per-query timings (best of repeat rounds)"""
+    print(f'\n{label}')
+    print(f'  {"query":<20} {"cached":>10} {"compilations":>13} {"uncached":>10} {"calls/query":>12}')
+    for name, run_query in QUERIES:
+        session = db.SessionLocal()
+        try:
+            run_query(session, 1, {})  # warm up
+            counter['compilations'] = 0
+            cached = time_queries(session, run_query, queries, repeat, {})
+            compilations = counter['compilations']
+            uncached = time_queries(session, run_query, queries, repeat, {'compiled_cache': None})
+            calls = count_calls(session, run_query, min(queries, 200))
+        finally:
+            session.close()
+        print(f'  {name:<20} {cached * 1e6:7.1f} µs {compilations:>13} {uncached * 1e6:7.1f} µs {calls:12.0f}')
+
+
+def main() -> None:
+    """Main function - Entry point for the script"""
+    parser = argparse.ArgumentParser(description='Soft delete filter micro-benchmark')
+    parser.add_argument('--queries', type=int, default=2000, help='Queries per shape and mode')
+    parser.add_argument('--repeat', type=int, default=5, help='Rounds per shape (best is reported)')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows in the sample table')
+    args = parser.parse_args()
+
+    db._initialize()
+    populate(args.rows)
+    counter = count_compilations()
+
+    use_legacy_hook()
+    try:
+        run('before_compile hook (previous)', args.queries, args.repeat, counter)
+    finally:
+        use_current_listener()
+    run('do_orm_execute + with_loader_criteria (current)', args.queries, args.repeat, counter)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+تنظیمات مشترک pytest
+Shared pytest configuration
+
+آزمون‌ها روی یک فایل SQLite موقت اجرا می‌شوند تا به SQL Server نیازی نباشد.
+"""
+import os
+import tempfile
+
+import pytest
+
+# باید قبل از import ماژول config تنظیم شود
+os.environ.setdefault(
+    'CONNECTION_STRING',
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='audit_tests_'), 'audit.db')
+)
+
+
+@pytest.fixture
+def seed_transactions():
+    """
+    جایگزینی رکوردهای جدول تراکنش‌ها با ردیف‌های داده‌شده
+    Replace the Transaction table with the given rows (dicts of column values)
+    
+    با replace=False ردیف‌ها به رکوردهای موجود اضافه می‌شوند.
+    """
+    from database import db, Base
+    from models import Transaction
+    
+    db._initialize()
+    Base.metadata.create_all(db.engine)
+    
+    def seed(rows, replace=True):
+        session = db.SessionLocal()
+        try:
+            if replace:
+                session.query(Transaction).delete()
+            session.add_all(Transaction(**row) for row in rows)
+            session.commit()
+        finally:
+            session.close()
+    
+    return seed
@@ -0,0 +1,271 @@
+"""
+Core-level read path for query source tables.
+Rows are fetched with a Core select() on the mapped table, so no ORM entity
+loading, identity map or attribute instrumentation is involved. Results are
+returned as lightweight rows (tuple-like, with attribute access), as one
+NumPy array per column, or as a typed pandas DataFrame (whole or in chunks).
+
+The ORM soft delete listener does not apply to Core statements, so the
+IsDeleted criterion is added explicitly.
+
+Money columns (Numeric with a scale, e.g. Numeric(18, 2)) are decoded by the
+driver as Decimal. A numeric mode converts them in SQL instead:
+- 'decimal': unchanged, exact Decimal values (default)
+- 'float':   CAST AS FLOAT, delivered as float / float64 (NULL kept)
+- 'minor':   ROUND(value * 10^scale) CAST AS BIGINT, exact integer minor
+             units (cents) as int / int64; NULL is delivered as 0
+"""
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Float, Numeric, cast, func, select
+from snapshot import column_kind
+
+# Rows fetched from the cursor per round trip while building arrays
+FETCH_BATCH_SIZE = 50000
+
+# Supported numeric modes for money columns
+NUMERIC_MODES = ('decimal', 'float', 'minor')
+
+
+def is_money_column(column: Any) -> bool:
+    """Check whether a column is a fixed-scale Numeric (money) column"""
+    col_type = column.type
+    return isinstance(col_type, Numeric) and not isinstance(col_type, Float) and bool(col_type.scale)
+
+
+def _money_expression(column: Any, numeric: str) -> Any:
+    """Select expression of a money column in the given numeric mode"""
+    if numeric == 'float':
+        return cast(column, Float).label(column.name)
+    if numeric == 'minor':
+        scaled = func.round(column * (10 ** column.type.scale), 0)
+        return func.coalesce(cast(scaled, BigInteger), 0).label(column.name)
+    return column
+
+
+def _kind(model: Any, name: str, numeric: str) -> str:
+    """Array kind of a selected column, taking the numeric mode into account"""
+    column = model.__table__.columns[name]
+    if numeric == 'minor' and is_money_column(column):
+        return 'int'
+    return column_kind(column)
+
+
+def core_select(
+    model: Any,
+    columns: Optional[Sequence[str]] = None,
+    criteria: Sequence[Any] = (),
+    numeric: str = 'decimal',
+    include_deleted: bool = False
+) -> Any:
+    """
+    Build a Core select of a model's table with soft-deleted rows excluded
+    
+    Args:
+        model: Mapped model class
+        columns: Column names to select (all columns if omitted)
+        criteria: Extra WHERE criteria (e.g. from filters.filter_criteria)
+        numeric: Numeric mode for money columns ('decimal', 'float' or 'minor')
+        include_deleted: Keep soft-deleted rows (e.g. to track deletions)
+    
+    Returns:
+        Select: Core select statement
+    
+    Raises:
+        ValueError: If a column does not exist on the model or the mode is unknown
+    """
+    if numeric not in NUMERIC_MODES:
+        raise ValueError(f"Invalid numeric mode '{numeric}'. Use one of: {', '.join(NUMERIC_MODES)}")
+    
+    table = model.__table__
+    names = list(columns) if columns else [column.name for column in table.columns]
+    for name in names:
+        if name not in table.columns:
+            raise ValueError(f"Column '{name}' does not exist on {model.__name__}")
+    
+    statement = select(*[
+        _money_expression(table.c[name], numeric) if is_money_column(table.c[name]) else table.c[name]
+        for name in names
+    ])
+    if 'IsDeleted' in table.columns and not include_deleted:
+        statement = statement.where(table.c.IsDeleted == False)
+    if criteria:
+        statement = statement.where(*criteria)
+    return statement
+
+
+def fetch_rows(connection: Any, statement: Any) -> List[Any]:
+    """
+    Execute a Core select and return all rows
+    
+    Args:
+        connection: SQLAlchemy connection (e.g. session.connection())
+        statement: Core select statement
+    
+    Returns:
+        list: Rows (tuple-like, columns accessible by attribute)
+    """
+    return connection.execute(statement).all()
+
+
+def _to_array(kind: str, values: List[Any]) -> np.ndarray:
+    """Convert fetched values of one column to a NumPy array"""
+    if kind == 'float':
+        # None becomes NaN; float input (numeric='float') needs no per-value conversion
+        return np.array(values, dtype=np.float64)
+    if kind == 'datetime':
+        return np.array(values, dtype='datetime64[us]')
+    if kind in ('int', 'bool'):
+        if any(v is None for v in values):
+            return np.array(values, dtype=object)
+        return np.array(values, dtype=np.int64 if kind == 'int' else np.bool_)
+    return np.array(values, dtype=object)
+
+
+def fetch_arrays(
+    connection: Any,
+    model: Any,
+    statement: Any,
+    batch_size: int = FETCH_BATCH_SIZE,
+    numeric: str = 'decimal'
+) -> Dict[str, np.ndarray]:
+    """
+    Execute a Core select and return one NumPy array per selected column
+    
+    Numeric columns are float64 (NaN for NULL), or int64 minor units for
+    money columns selected with numeric='minor'. Dates are datetime64[us]
+    (NaT for NULL), integer/boolean columns are int64/bool (object if they
+    contain NULLs) and strings are object arrays.
+    
+    Args:
+        connection: SQLAlchemy connection (e.g. session.connection())
+        model: Mapped model class the statement selects from
+        statement: Core select statement (see core_select)
+        batch_size: Rows fetched per round trip
+        numeric: Numeric mode the statement was built with
+    
+    Returns:
+        dict: Column name -> array
+    """
+    # Per-execution option: Connection.execution_options() would change the
+    # session's connection for every later statement
+    result = connection.execute(statement, execution_options={'stream_results': True})
+    names = list(result.keys())
+    kinds = [_kind(model, name, numeric) for name in names]
+    chunks: List[List[np.ndarray]] = [[] for _ in names]
+    
+    for partition in result.partitions(batch_size):
+        for index, kind in enumerate(kinds):
+            chunks[index].append(_to_array(kind, [row[index] for row in partition]))
+    
+    arrays: Dict[str, np.ndarray] = {}
+    for name, kind, column_chunks in zip(names, kinds, chunks):
+        if not column_chunks:
+            arrays[name] = _to_array(kind, [])
+        elif len(column_chunks) == 1:
+            arrays[name] = column_chunks[0]
+        else:
+            arrays[name] = np.concatenate(column_chunks)
+    return arrays
+
+
+def default_categorical(model: Any, names: Sequence[str]) -> List[str]:
+    """String columns loaded as pandas categoricals by default: the *Code columns"""
+    table_columns = model.__table__.columns
+    return [name for name in names if name.endswith('Code') and column_kind(table_columns[name]) == 'string']
+
+
+def _series(kind: str, values: np.ndarray, categorical: bool) -> Any:
+    """Wrap a fetched column array in a typed pandas Series/array"""
+    if kind == 'string' and categorical:
+        return pd.Categorical(values)
+    if values.dtype == object and kind == 'int':
+        # NULLs in an integer column: pandas nullable integer
+        return pd.array(values, dtype='Int64')
+    if values.dtype == object and kind == 'bool':
+        return pd.array(values, dtype='boolean')
+    return values
+
+
+def _frame(names: Sequence[str], kinds: Sequence[str], arrays: Sequence[np.ndarray], categorical: Sequence[str]) -> pd.DataFrame:
+    """Build a DataFrame from fetched column arrays"""
+    return pd.DataFrame(
+        {name: _series(kind, values, name in categorical) for name, kind, values in zip(names, kinds, arrays)},
+        columns=list(names)
+    )
+
+
+def fetch_frame(
+    connection: Any,
+    model: Any,
+    statement: Any,
+    numeric: str = 'decimal',
+    categorical: Optional[Sequence[str]] = None,
+    batch_size: int = FETCH_BATCH_SIZE
+) -> pd.DataFrame:
+    """
+    Execute a Core select and return a typed DataFrame
+    
+    Columns are typed as in fetch_arrays (float64 money or int64 minor units,
+    datetime64 dates, int64/bool with pandas nullable Int64/boolean when they
+    contain NULLs); string columns are object, or category for the
+    categorical columns.
+    
+    Args:
+        connection: SQLAlchemy connection (e.g. session.connection())
+        model: Mapped model class the statement selects from
+        statement: Core select statement (see core_select)
+        numeric: Numeric mode the statement was built with
+        categorical: String columns to load as category (default: *Code columns)
+        batch_size: Rows fetched per round trip
+    
+    Returns:
+        pd.DataFrame: One column per selected column
+    """
+    arrays = fetch_arrays(connection, model, statement, batch_size=batch_size, numeric=numeric)
+    names = list(arrays)
+    kinds = [_kind(model, name, numeric) for name in names]
+    if categorical is None:
+        categorical = default_categorical(model, names)
+    return _frame(names, kinds, list(arrays.values()), categorical)
+
+
+def fetch_frames(
+    connection: Any,
+    model: Any,
+    statement: Any,
+    chunksize: int,
+    numeric: str = 'decimal',
+    categorical: Optional[Sequence[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Execute a Core select and yield typed DataFrames of up to chunksize rows
+    
+    Rows are streamed through a server-side cursor, so memory use is bounded
+    by the chunk size. Categories are per chunk.
+    
+    Args:
+        connection: SQLAlchemy connection (e.g. session.connection())
+        model: Mapped model class the statement selects from
+        statement: Core select statement (see core_select)
+        chunksize: Rows per DataFrame
+        numeric: Numeric mode the statement was built with
+        categorical: String columns to load as category (default: *Code columns)
+    
+    Yields:
+        pd.DataFrame: Chunks in result order
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    
+    # Per-execution option, as in fetch_arrays
+    result = connection.execute(statement, execution_options={'stream_results': True})
+    names = list(result.keys())
+    kinds = [_kind(model, name, numeric) for name in names]
+    if categorical is None:
+        categorical = default_categorical(model, names)
+    
+    for partition in result.partitions(chunksize):
+        arrays = [_to_array(kind, [row[index] for row in partition]) for index, kind in enumerate(kinds)]
+        yield _frame(names, kinds, arrays, categorical)
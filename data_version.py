@@ -0,0 +1,200 @@
+"""
+Data version tokens for audited tables.
+A token changes whenever rows of a table are added, modified or soft deleted,
+so caches built from a table can be checked for staleness cheaply.
+
+The database part of a token is one small aggregate query per table: row
+count (including soft-deleted rows), max primary key and either max rowversion
+(when the table has a rowversion column) or max LastModificationTime /
+DeletionTime. Inserts change the count and max Id, soft deletes the
+DeletionTime, and updates the rowversion or LastModificationTime; an update
+that sets none of these is not detected.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import and_, case, func, or_, select
+
+# Column names treated as a rowversion when their type is not a rowversion type
+ROWVERSION_NAMES = ('RowVersion', 'rowversion')
+
+
+def versioned_models() -> List[Any]:
+    """
+    Get every mapped model of models.py
+    
+    Returns:
+        list: Mapped model classes sorted by table name
+    """
+    from database import Base
+    import models  # noqa: F401 - registers the mappers
+    
+    return sorted((mapper.class_ for mapper in Base.registry.mappers), key=lambda model: model.__tablename__)
+
+
+def rowversion_column(model: Any) -> Optional[Any]:
+    """
+    Get the rowversion column of a model, if it has one
+    
+    SQL Server ROWVERSION/TIMESTAMP columns change on every insert and update,
+    so their max alone tracks modifications and soft deletes.
+    """
+    from sqlalchemy.dialects.mssql import ROWVERSION, TIMESTAMP
+    
+    for column in model.__table__.columns:
+        if isinstance(column.type, (ROWVERSION, TIMESTAMP)) or column.name in ROWVERSION_NAMES:
+            return column
+    return None
+
+
+def _token_aggregates(model: Any, columns: Any = None) -> List[Any]:
+    """
+    Aggregate expressions making up the database part of a table's token
+    
+    Args:
+        model: Mapped model class
+        columns: Column collection to aggregate (default: the model's table;
+                 e.g. a subquery's columns of the same names)
+    """
+    columns = model.__table__.columns if columns is None else columns
+    aggregates = [func.count()]
+    primary_key = list(model.__table__.primary_key.columns)
+    if len(primary_key) == 1:
+        aggregates.append(func.max(columns[primary_key[0].name]))
+    
+    rowversion = rowversion_column(model)
+    if rowversion is not None:
+        aggregates.append(func.max(columns[rowversion.name]))
+        return aggregates
+    
+    for name in ('LastModificationTime', 'DeletionTime'):
+        if name in model.__table__.columns:
+            aggregates.append(func.max(columns[name]))
+    return aggregates
+
+
+class DataVersions:
+    """
+    Data version service for all audited tables
+    
+    Tokens are derived from the database only, so every process (web
+    workers, parallel runners, job workers) computes the same token for the
+    same data and caches shared between them stay consistent.
+    """
+    
+    def token(self, session: Any, model: Any, criteria: Sequence[Any] = ()) -> str:
+        """
+        Compute the data version token of a table in one small aggregate query
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class
+            criteria: Optional WHERE criteria restricting the token to part of the
+                table (e.g. one period partition, see periods.partition_criteria)
+        
+        Returns:
+            str: Version token, e.g. 'Transactions:20000000:20000417:2024-05-01T10:00:00:'
+        """
+        row = (
+            session.query(*_token_aggregates(model))
+            .select_from(model)
+            .filter(*criteria)
+            .execution_options(include_deleted=True)
+            .one()
+        )
+        return self._format(model, row)
+    
+    def partition_tokens(self, session: Any, model: Any, partitions: Sequence[Sequence[Any]]) -> List[str]:
+        """
+        Compute the tokens of several parts of a table in one grouped query
+        
+        Each row is labeled with the first part whose criteria it matches and
+        the aggregates are computed per label, so checking many period
+        partitions costs one query instead of one per partition.
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class
+            partitions: WHERE criteria of each part (e.g. periods.partition_criteria)
+        
+        Returns:
+            list: Version token per part, equal to token(session, model, criteria)
+        """
+        if not partitions:
+            return []
+        conditions = [and_(*criteria) for criteria in partitions]
+        labeled = (
+            select(case(*[(condition, index) for index, condition in enumerate(conditions)]).label('part'), model.__table__)
+            .where(or_(*conditions))
+            .subquery()
+        )
+        statement = (
+            select(labeled.c.part, *_token_aggregates(model, labeled.c))
+            .group_by(labeled.c.part)
+            .execution_options(include_deleted=True)
+        )
+        rows = {row[0]: row[1:] for row in session.execute(statement)}
+        # A part without rows has the aggregates of an empty table
+        empty = (0,) + (None,) * (len(_token_aggregates(model)) - 1)
+        return [self._format(model, rows.get(index, empty)) for index in range(len(partitions))]
+    
+    @staticmethod
+    def _format(model: Any, aggregates: Sequence[Any]) -> str:
+        """Version token from a table's aggregate values"""
+        return ':'.join([model.__tablename__] + [_token_part(value) for value in aggregates])
+    
+    def tokens(self, session: Any, models: Optional[Sequence[Any]] = None) -> Dict[str, str]:
+        """
+        Compute the tokens of several tables
+        
+        Args:
+            session: Read-only session
+            models: Models to check (default: every model, see versioned_models)
+        
+        Returns:
+            dict: Table name -> version token
+        """
+        return {model.__tablename__: self.token(session, model) for model in (models or versioned_models())}
+
+
+# Global data version service of the process
+data_versions = DataVersions()
+
+
+def table_version(session: Any, model: Any, criteria: Sequence[Any] = ()) -> str:
+    """
+    Compute the data version token of a table (see DataVersions.token)
+    
+    Args:
+        session: Read-only session
+        model: Mapped model class
+        criteria: Optional WHERE criteria restricting the token to part of the table
+    
+    Returns:
+        str: Version token
+    """
+    return data_versions.token(session, model, criteria)
+
+
+def partition_versions(session: Any, model: Any, partitions: Sequence[Sequence[Any]]) -> List[str]:
+    """
+    Compute the data version tokens of several parts of a table (see DataVersions.partition_tokens)
+    
+    Args:
+        session: Read-only session
+        model: Mapped model class
+        partitions: WHERE criteria of each part
+    
+    Returns:
+        list: Version token per part
+    """
+    return data_versions.partition_tokens(session, model, partitions)
+
+
+def _token_part(value: Any) -> str:
+    """Format one aggregate value for a version token"""
+    if value is None:
+        return ''
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
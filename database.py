@@ -2,11 +2,21 @@
 Database connection and session management module.
 Handles SQLAlchemy engine creation and session lifecycle.
 """
-from typing import Any, Optional
-from sqlalchemy import create_engine, Engine
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from sqlalchemy import create_engine, event, Connection, Engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 from config import Config
+from aggregation import AggregateResult, aggregate
+from core_fetch import core_select, fetch_arrays, fetch_frame, fetch_frames, fetch_rows
+from filters import filter_criteria
+from projection import projected_columns, reads
+from types_definitions import ColumnsDict, FiltersDict
 
 # Create the declarative base for model definitions
 Base = declarative_base()
@@ -17,16 +27,39 @@ class ReadOnlySession:
     Read-only session wrapper that prevents write operations.
     Only SELECT queries are allowed.
     """
-    def __init__(self, session: Session) -> None:
+    def __init__(
+        self,
+        session: Session,
+        columns: Optional[ColumnsDict] = None,
+        filters: Optional[FiltersDict] = None,
+        isolation_level: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> None:
         """
         Initialize read-only session wrapper
         
         Args:
             session: SQLAlchemy session to wrap
+            columns: Optional column projection declared by the query's define().
+                     query(Model) for a projected model returns lightweight rows
+                     with only these columns instead of full entities.
+            filters: Optional row predicates declared by the query's define(),
+                     with parameters already resolved (see filters.resolve_filters).
+                     They are added to the WHERE clause of query(Model) and stream().
+            isolation_level: Optional transaction isolation level of the session's
+                     connection, as accepted by the dialect (see dialect_isolation_level)
+            tenant: Tenant whose database the session reads (None = default database);
+                     namespaces the session's snapshots
         """
         self._session = session
+        self.tenant = tenant
+        self._columns: ColumnsDict = columns or {}
+        self._filters: FiltersDict = filters or {}
         # Disable autoflush to prevent automatic writes
         self._session.autoflush = False
+        if isolation_level:
+            # Must be set before the first statement starts the transaction
+            self._session.connection(execution_options={'isolation_level': isolation_level})
     
     def query(self, *args: Any, **kwargs: Any) -> Any:
         """
@@ -35,8 +68,19 @@ class ReadOnlySession:
         Returns:
             Query object
         """
+        if len(args) == 1 and not kwargs and isinstance(args[0], type):
+            model = args[0]
+            columns = projected_columns(model, self._columns)
+            return self._filtered(model, self._session.query(*(columns or [model])))
         return self._session.query(*args, **kwargs)
     
+    def _filtered(self, model: Any, query: Any) -> Any:
+        """Add the declared row predicates of a model to a query"""
+        predicates = self._filters.get(model.__name__)
+        if predicates:
+            query = query.filter(*filter_criteria(model, predicates))
+        return query
+    
     def execute(self, *args: Any, **kwargs: Any) -> Any:
         """
         Allow execute for SELECT queries
@@ -46,6 +90,285 @@ class ReadOnlySession:
         """
         return self._session.execute(*args, **kwargs)
     
+    def stream(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        batch_size: int = 1000,
+        batches: bool = False
+    ) -> Iterator[Any]:
+        """
+        Stream rows of a model without materializing the whole result
+        
+        Rows are fetched through a server-side cursor in chunks of batch_size,
+        so memory use stays constant regardless of table size. The soft delete
+        filter and the declared row predicates are applied as for query().
+        
+        Args:
+            model: Mapped model class to read
+            columns: Column names to fetch. Defaults to the projection declared
+                     in define(), or full entities if none was declared.
+            batch_size: Number of rows fetched from the cursor per round trip
+            batches: If True, yield lists of up to batch_size rows instead of single rows
+        
+        Yields:
+            Rows (or lists of rows when batches=True)
+        
+        Usage:
+            for t in session.stream(Transaction, ['Debit', 'Credit']):
+                ...
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+        
+        if columns:
+            entities: List[Any] = projected_columns(model, reads(model, *columns))
+        else:
+            entities = projected_columns(model, self._columns) or [model]
+        
+        query = self._filtered(model, self._session.query(*entities))
+        rows = iter(query.yield_per(batch_size))
+        if not batches:
+            yield from rows
+            return
+        
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+    
+    def _core_select(self, model: Any, columns: Optional[Sequence[str]], numeric: str) -> Any:
+        """Core select of a model with the declared projection and row predicates"""
+        names = list(columns) if columns else self._columns.get(model.__name__)
+        criteria = filter_criteria(model, self._filters.get(model.__name__, []))
+        return core_select(model, names, criteria, numeric=numeric)
+    
+    def fetch(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        numeric: str = 'decimal'
+    ) -> List[Any]:
+        """
+        Fetch rows of a model through Core, bypassing ORM entity loading
+        
+        Rows are tuple-like and expose columns as attributes (t.Debit), but
+        no identity map or instrumented entities are built. The soft delete
+        filter and the declared row predicates are applied as for query().
+        
+        Args:
+            model: Mapped model class to read
+            columns: Column names to fetch. Defaults to the projection declared
+                     in define(), or all columns if none was declared.
+            numeric: Money column decoding: 'decimal' (exact Decimal), 'float'
+                     (converted in SQL) or 'minor' (exact int cents, NULL as 0)
+        
+        Returns:
+            list: Rows
+        
+        Usage:
+            for t in session.fetch(Transaction, ['Debit', 'Credit']):
+                ...
+        """
+        return fetch_rows(self._session.connection(), self._core_select(model, columns, numeric))
+    
+    def fetch_arrays(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        numeric: str = 'float'
+    ) -> Dict[str, Any]:
+        """
+        Fetch columns of a model through Core as NumPy arrays
+        
+        Unlike snapshot(), the arrays are read for this call only and honour
+        the declared row predicates.
+        
+        Args:
+            model: Mapped model class to read
+            columns: Column names to fetch. Defaults to the projection declared
+                     in define(), or all columns if none was declared.
+            numeric: Money column decoding: 'float' (float64, converted in SQL),
+                     'minor' (exact int64 cents, NULL as 0) or 'decimal'
+        
+        Returns:
+            dict: Column name -> np.ndarray (see core_fetch.fetch_arrays)
+        """
+        statement = self._core_select(model, columns, numeric)
+        return fetch_arrays(self._session.connection(), model, statement, numeric=numeric)
+    
+    def load_frame(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        filters: Optional[Sequence[Any]] = None,
+        chunksize: Optional[int] = None,
+        numeric: str = 'float',
+        categorical: Optional[Sequence[str]] = None
+    ) -> Any:
+        """
+        Load columns of a model into a typed pandas DataFrame through Core
+        
+        Rows go straight from the cursor into column arrays, without ORM
+        entities. The soft delete filter and the declared row predicates are
+        applied as for query().
+        
+        Args:
+            model: Mapped model class to read
+            columns: Column names to load. Defaults to the projection declared
+                     in define(), or all columns if none was declared.
+            filters: Extra row predicates (filters.gt, between, ...) with literal values
+            chunksize: If given, return an iterator of DataFrames of up to chunksize rows
+            numeric: Money columns as 'float' (float64, converted in SQL) or
+                     'minor' (exact int64 cents, NULL as 0)
+            categorical: String columns loaded as category (default: *Code columns)
+        
+        Returns:
+            pd.DataFrame, or an iterator of DataFrames when chunksize is given
+        
+        Usage:
+            frame = session.load_frame(Transaction, ['DocumentDate', 'Credit'], filters=[gt('Credit', 0)])
+            monthly = frame.groupby(frame['DocumentDate'].dt.to_period('M'))['Credit'].sum()
+        """
+        names = list(columns) if columns else self._columns.get(model.__name__)
+        predicates = list(self._filters.get(model.__name__, [])) + list(filters or [])
+        statement = core_select(model, names, filter_criteria(model, predicates), numeric=numeric)
+        connection = self._session.connection()
+        if chunksize:
+            return fetch_frames(connection, model, statement, chunksize, numeric=numeric, categorical=categorical)
+        return fetch_frame(connection, model, statement, numeric=numeric, categorical=categorical)
+    
+    def snapshot(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        start: Any = None,
+        end: Any = None,
+        scheme: Optional[str] = None
+    ) -> Any:
+        """
+        Get the shared columnar snapshot of a model's table
+        
+        The snapshot is loaded once per data version and shared by all tests
+        in the process, so repeated reads of the same table skip the database.
+        Declared row predicates are not applied; filter the arrays instead.
+        
+        With start and/or end, only rows whose partition date (periods.PARTITION_COLUMNS)
+        lies in the range are returned, and only the period partitions the range
+        touches are loaded (see SnapshotManager.get_range).
+        
+        Args:
+            model: Mapped model class to read
+            columns: Column names needed. Defaults to the projection declared in define().
+            start: First date of the range (inclusive)
+            end: Last date of the range (inclusive)
+            scheme: Partition scheme ('month', 'fiscal_year', 'jalali_month', 'jalali_year'),
+                    defaults to PARTITION_SCHEME
+        
+        Returns:
+            ColumnarSnapshot: Per-column NumPy arrays (see snapshot.py)
+        
+        Raises:
+            ValueError: If no columns are given or declared for the model
+        """
+        from snapshot import snapshots
+        
+        names = list(columns) if columns else self._columns.get(model.__name__)
+        if not names:
+            raise ValueError(f"No columns given or declared in define() for {model.__name__}")
+        if start is not None or end is not None or scheme is not None:
+            return snapshots.get_range(self, model, names, start, end, scheme)
+        return snapshots.get(self, model, names)
+    
+    def aggregate(
+        self,
+        model: Any,
+        keys: Sequence[Any],
+        measures: Sequence[Any],
+        where: Optional[Sequence[Any]] = None,
+        totals: bool = False
+    ) -> AggregateResult:
+        """
+        Aggregate a model's rows per group in SQL (GROUP BY)
+        
+        Only one row per group is returned by the database. The soft delete
+        filter and the declared row predicates are applied as for query().
+        
+        Args:
+            model: Mapped model class to read
+            keys: Group keys (aggregation.key, year_key, month_key)
+            measures: Aggregates (aggregation.sum_of, count_rows, count_where, ...)
+            where: Extra row predicates (filters.gt, between, ...)
+            totals: Also return the measures over all rows (result.total)
+        
+        Returns:
+            AggregateResult: Group rows as dictionaries, and the totals row
+        
+        Usage:
+            result = session.aggregate(
+                Transaction,
+                keys=[key('AccountCode')],
+                measures=[sum_of('Debit'), count_rows()],
+                totals=True
+            )
+        """
+        predicates = list(self._filters.get(model.__name__, [])) + list(where or [])
+        return aggregate(self._session, model, keys, measures, where=predicates, totals=totals)
+    
+    def incremental(
+        self,
+        name: str,
+        model: Any,
+        init: Any,
+        fold: Any,
+        unfold: Any = None,
+        columns: Optional[Sequence[str]] = None,
+        keys: Optional[Sequence[Any]] = None,
+        measures: Optional[Sequence[Any]] = None,
+        where: Optional[Sequence[Any]] = None,
+        key: Sequence[Any] = (),
+        watermark: str = 'Id'
+    ) -> Any:
+        """
+        Get a test's state folded over a model's rows, reading only rows added since the last run
+        
+        With INCREMENTAL_STATE_DIR the state is stored with a watermark and each
+        run folds the rows above it; rows soft-deleted since are removed with
+        unfold(), and other changes below the watermark recompute the state
+        (see incremental.py). Without it, all rows are folded on every run.
+        The declared row predicates are applied as for query().
+        
+        Args:
+            name: Test id (one state per test, tenant and key)
+            model: Mapped model class to read
+            init: Returns an empty state
+            fold: fold(state, rows) adds live rows to the state
+            unfold: unfold(state, rows) removes soft-deleted rows (None = recompute on deletes)
+            columns: Columns of plain row reads
+            keys: Group keys of aggregate reads (aggregation.key, year_key, month_key)
+            measures: Mergeable measures of aggregate reads (sum_of, count_rows, count_where, ...)
+            where: Extra row predicates (filters.gt, between, ...)
+            key: Values the state depends on, e.g. parameters
+            watermark: NOT NULL column whose values only grow ('Id' or 'CreationTime')
+        
+        Returns:
+            The up-to-date state
+        
+        Usage:
+            counts = session.incremental(
+                'benford_first_digit_test', Transaction, init=Counter,
+                fold=count_digits, unfold=uncount_digits, columns=['Debit'], key=['Debit']
+            )
+        """
+        from incremental import evaluate
+        
+        predicates = list(self._filters.get(model.__name__, [])) + list(where or [])
+        return evaluate(
+            self._session, self.tenant, name, model, init, fold, unfold,
+            columns=columns, keys=keys, measures=measures, where=predicates, key=key, watermark=watermark
+        )
+    
     def get(self, *args: Any, **kwargs: Any) -> Any:
         """
         Allow get operations
@@ -92,14 +415,59 @@ class ReadOnlySession:
         raise PermissionError("Write operations are not allowed. Session is read-only.")
 
 
+def dialect_isolation_level(dialect_name: str, level: str) -> str:
+    """
+    Map an isolation level to the nearest level a dialect supports
+    
+    SNAPSHOT is native on SQL Server; PostgreSQL and MySQL provide snapshot
+    reads with REPEATABLE READ. SQLite only has SERIALIZABLE and READ UNCOMMITTED.
+    
+    Args:
+        dialect_name: Engine dialect name (e.g. 'mssql')
+        level: Normalized level (see Config.get_isolation_level)
+    
+    Returns:
+        str: Level to pass as the isolation_level execution option
+    """
+    if dialect_name == 'sqlite':
+        return 'READ UNCOMMITTED' if level == 'READ UNCOMMITTED' else 'SERIALIZABLE'
+    if level == 'SNAPSHOT' and dialect_name != 'mssql':
+        return 'REPEATABLE READ'
+    return level
+
+
 class Database:
     """Database connection manager"""
     
-    def __init__(self) -> None:
-        """Initialize database engine and session factory"""
+    def __init__(self, connection_string: Optional[str] = None, tenant: Optional[str] = None) -> None:
+        """
+        Initialize database engine and session factory
+        
+        Args:
+            connection_string: Database of a tenant (default: CONNECTION_STRING,
+                     with the read connection settings of Config)
+            tenant: Tenant id of the database (see tenants.py)
+        """
+        self.connection_string = connection_string
+        self.tenant = tenant
+        # Write engine (uploads, users); also used for reads unless a separate
+        # read connection is configured (Config.READ_CONNECTION_STRING / DB_READ_INTENT)
         self.engine: Optional[Engine] = None
         self.SessionLocal: Optional[sessionmaker] = None
+        self.read_engine: Optional[Engine] = None
+        self.ReadSessionLocal: Optional[sessionmaker] = None
+        # Connection of the consistent_snapshot() block of the current thread
+        self._shared = threading.local()
         self._initialized: bool = False
+        self._pid: Optional[int] = None
+        self._stats_lock = threading.Lock()
+        self._pool_events: Dict[str, int] = {}
+        self._reset_pool_events()
+        # Forked workers (e.g. pre-forking web servers) get their own pool
+        # (a weak reference, so closed tenant databases can be garbage collected)
+        if hasattr(os, 'register_at_fork'):
+            reference = weakref.WeakMethod(self._ensure_process_pool)
+            os.register_at_fork(after_in_child=lambda: reference() and reference()())
     
     def _initialize(self) -> None:
         """Create database engine and session factory (lazy initialization)"""
@@ -107,45 +475,296 @@ class Database:
             return
             
         try:
-            connection_string = Config.get_connection_string()
+            if self.connection_string:
+                connection_string = self.connection_string
+                read_connection_string = Config.get_read_connection_string(connection_string)
+            else:
+                connection_string = Config.get_connection_string()
+                read_connection_string = Config.get_read_connection_string()
             
-            # Create engine with connection pooling disabled for SQL Server
-            self.engine = create_engine(
-                connection_string,
-                poolclass=NullPool,
-                echo=False,  # Set to True to see SQL queries in console
-                future=True
-            )
+            self.engine = self._create_engine(connection_string)
+            
+            # Read-only test sessions go to the read connection if one is configured
+            if read_connection_string != connection_string:
+                self.read_engine = self._create_engine(read_connection_string)
+            else:
+                self.read_engine = self.engine
             
-            # Create session factory
+            # Create session factories
             self.SessionLocal = sessionmaker(
                 autocommit=False,
                 autoflush=False,
                 bind=self.engine
             )
+            self.ReadSessionLocal = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=self.read_engine
+            )
             
+            self._pid = os.getpid()
             self._initialized = True
             
         except Exception as e:
             print(f"✗ Error initializing database connection: {e}")
             raise
     
-    def get_session(self) -> ReadOnlySession:
+    def _create_engine(self, connection_string: str) -> Engine:
+        """Create an engine with the configured pool and pool statistics listeners"""
+        engine = create_engine(
+            connection_string,
+            echo=False,  # Set to True to see SQL queries in console
+            future=True,
+            **self._engine_pool_options()
+        )
+        self._attach_pool_listeners(engine)
+        if engine.dialect.name == 'sqlite' and Config.SQLITE_TUNING:
+            from embedded_backend import tune_sqlite
+            tune_sqlite(engine)
+        return engine
+    
+    @property
+    def has_read_engine(self) -> bool:
+        """Whether test sessions use a separate read engine"""
+        return self.read_engine is not None and self.read_engine is not self.engine
+    
+    @staticmethod
+    def _engine_pool_options() -> Dict[str, Any]:
+        """
+        Build create_engine pool arguments from Config
+        
+        Returns:
+            dict: Keyword arguments for create_engine
+        """
+        pool = Config.get_pool_options()
+        if pool['mode'] == 'queue':
+            return {
+                'poolclass': QueuePool,
+                'pool_size': pool['size'],
+                'max_overflow': pool['max_overflow'],
+                'pool_timeout': pool['timeout'],
+                'pool_recycle': pool['recycle'],
+                'pool_pre_ping': pool['pre_ping']
+            }
+        # Connection pooling disabled: every session opens its own connection
+        return {'poolclass': NullPool}
+    
+    def _reset_pool_events(self) -> None:
+        """Reset pool event counters"""
+        with self._stats_lock:
+            self._pool_events = {
+                'connects': 0,
+                'checkouts': 0,
+                'checkins': 0,
+                'invalidations': 0
+            }
+    
+    def _count_pool_event(self, name: str) -> None:
+        """Increment a pool event counter"""
+        with self._stats_lock:
+            self._pool_events[name] += 1
+    
+    def _attach_pool_listeners(self, engine: Engine) -> None:
+        """Register pool event listeners used for pool statistics"""
+        event.listen(engine, 'connect', lambda *args: self._count_pool_event('connects'))
+        event.listen(engine, 'checkout', lambda *args: self._count_pool_event('checkouts'))
+        event.listen(engine, 'checkin', lambda *args: self._count_pool_event('checkins'))
+        event.listen(engine, 'invalidate', lambda *args: self._count_pool_event('invalidations'))
+    
+    def _ensure_process_pool(self) -> None:
+        """
+        Give a forked child process its own connection pool.
+        
+        Connections inherited from the parent process must not be shared,
+        so the pool is replaced (without closing the parent's connections).
+        """
+        if self._initialized and self._pid != os.getpid():
+            if self.engine is not None:
+                self.engine.dispose(close=False)
+            if self.has_read_engine:
+                self.read_engine.dispose(close=False)
+            self._reset_pool_events()
+            self._pid = os.getpid()
+    
+    def pool_status(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics
+        
+        Returns:
+            dict: Pool mode, configured sizing, current usage and event counters
+        """
+        pool_options = Config.get_pool_options()
+        with self._stats_lock:
+            status: Dict[str, Any] = {
+                'initialized': self._initialized,
+                'mode': pool_options['mode'],
+                'pid': os.getpid(),
+                **self._pool_events
+            }
+        if self.engine is None:
+            return status
+        
+        pool = self.engine.pool
+        status['pool_class'] = type(pool).__name__
+        if isinstance(pool, QueuePool):
+            status.update({
+                'pool_size': pool.size(),
+                'max_overflow': pool_options['max_overflow'],
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow()
+            })
+        
+        status['read_engine'] = 'separate' if self.has_read_engine else 'shared'
+        if self.has_read_engine:
+            read_pool = self.read_engine.pool
+            status['read_pool_class'] = type(read_pool).__name__
+            if isinstance(read_pool, QueuePool):
+                status.update({
+                    'read_checked_in': read_pool.checkedin(),
+                    'read_checked_out': read_pool.checkedout(),
+                    'read_overflow': read_pool.overflow()
+                })
+        return status
+    
+    def get_session(
+        self,
+        columns: Optional[ColumnsDict] = None,
+        filters: Optional[FiltersDict] = None,
+        isolation_level: Optional[str] = None
+    ) -> ReadOnlySession:
         """
         Create and return a new read-only database session
         
+        The session is bound to the read engine (the read replica or
+        ApplicationIntent=ReadOnly connection when configured). Inside a
+        consistent_snapshot() block it joins the block's transaction instead,
+        and the isolation level of the block applies. There each session runs
+        in its own SAVEPOINT, so sessions opened together in the block must be
+        closed in reverse order.
+        
+        Args:
+            columns: Optional column projection declared by the query's define()
+            filters: Optional resolved row predicates declared by the query's define()
+            isolation_level: Optional isolation level (the 'isolation_level' key of
+                     define()); defaults to DB_ISOLATION_LEVEL
+        
         Returns:
             ReadOnlySession: Read-only SQLAlchemy session wrapper
             
         Raises:
             Exception: If database is not initialized
+            ValueError: If the isolation level is not supported
         """
+        shared: Optional[Connection] = getattr(self._shared, 'connection', None)
+        if shared is not None:
+            # Each session runs in its own SAVEPOINT, so a test that fails and
+            # rolls back doesn't end the shared transaction of the other tests
+            session = Session(bind=shared, autoflush=False, join_transaction_mode='create_savepoint')
+            return ReadOnlySession(session, columns=columns, filters=filters, tenant=self.tenant)
+        
         if not self._initialized:
             self._initialize()
+        self._ensure_process_pool()
+        if self.ReadSessionLocal is None:
+            raise Exception("Database not initialized")
+        level = Config.get_isolation_level(isolation_level)
+        if level:
+            level = dialect_isolation_level(self.read_engine.dialect.name, level)
+        session = self.ReadSessionLocal()
+        return ReadOnlySession(session, columns=columns, filters=filters, isolation_level=level, tenant=self.tenant)
+    
+    @contextmanager
+    def consistent_snapshot(self, isolation_level: Optional[str] = None) -> Iterator[Connection]:
+        """
+        Share one read transaction between all sessions opened in the block
+        
+        Every get_session() call of the current thread inside the block is
+        bound to the same connection and transaction, so a run of several
+        tests sees one consistent state of the data. With SNAPSHOT (SQL
+        Server, requires ALLOW_SNAPSHOT_ISOLATION ON) the scans take no
+        shared locks and don't block concurrent writes.
+        
+        Args:
+            isolation_level: Level of the shared transaction (default SNAPSHOT)
+        
+        Yields:
+            Connection: The shared connection
+        
+        Usage:
+            with db.consistent_snapshot():
+                for test_module in modules:
+                    session = get_db()
+                    ...
+        """
+        current: Optional[Connection] = getattr(self._shared, 'connection', None)
+        if current is not None:
+            # Nested block: keep using the outer transaction
+            yield current
+            return
+        
+        if not self._initialized:
+            self._initialize()
+        self._ensure_process_pool()
+        if self.read_engine is None:
+            raise Exception("Database not initialized")
+        level = dialect_isolation_level(
+            self.read_engine.dialect.name,
+            Config.get_isolation_level(isolation_level or 'SNAPSHOT')
+        )
+        
+        connection = self.read_engine.connect().execution_options(isolation_level=level)
+        transaction = connection.begin()
+        if connection.dialect.name == 'sqlite':
+            # pysqlite defers BEGIN until the first write; start the transaction
+            # now so reads share one snapshot and sessions' SAVEPOINTs nest in it
+            connection.exec_driver_sql('BEGIN')
+        self._shared.connection = connection
+        try:
+            yield connection
+        finally:
+            self._shared.connection = None
+            # Nothing was written; end the snapshot without committing
+            if transaction.is_active:
+                transaction.rollback()
+            connection.close()
+    
+    def get_write_session(self) -> Session:
+        """
+        Create and return a new writable session on the write (primary) engine
+        
+        Used for uploads and user management; audit queries use get_session().
+        
+        Returns:
+            Session: SQLAlchemy session (caller must commit/close it)
+            
+        Raises:
+            Exception: If database is not initialized
+        """
+        if not self._initialized:
+            self._initialize()
+        self._ensure_process_pool()
         if self.SessionLocal is None:
             raise Exception("Database not initialized")
-        session = self.SessionLocal()
-        return ReadOnlySession(session)
+        return self.SessionLocal()
+    
+    @property
+    def checked_out(self) -> int:
+        """Number of connections currently checked out of the engines' pools"""
+        with self._stats_lock:
+            return self._pool_events['checkouts'] - self._pool_events['checkins']
+    
+    def dispose(self) -> None:
+        """
+        Close the pooled connections of the engines
+        
+        Checked-out connections are closed when returned; the engines stay
+        usable and open new connections on demand.
+        """
+        if self.engine is not None:
+            self.engine.dispose()
+        if self.has_read_engine:
+            self.read_engine.dispose()
     
     def test_connection(self) -> bool:
         """
@@ -157,6 +776,7 @@ class Database:
         try:
             if not self._initialized:
                 self._initialize()
+            self._ensure_process_pool()
             from sqlalchemy import text
             if self.engine is None:
                 return False
@@ -170,11 +790,20 @@ class Database:
 # Global database instance
 db = Database()
 
-def get_db() -> ReadOnlySession:
+def get_db(
+    columns: Optional[ColumnsDict] = None,
+    filters: Optional[FiltersDict] = None,
+    isolation_level: Optional[str] = None
+) -> ReadOnlySession:
     """
     Dependency function to get database session.
     Use this in your queries to get a session.
     
+    Args:
+        columns: Optional column projection (the 'columns' key of define())
+        filters: Optional resolved row predicates (the 'filters' key of define())
+        isolation_level: Optional isolation level (the 'isolation_level' key of define())
+    
     Usage:
         session = get_db()
         try:
@@ -186,4 +815,4 @@ def get_db() -> ReadOnlySession:
     Returns:
         ReadOnlySession: Read-only SQLAlchemy session wrapper
     """
-    return db.get_session()
+    return db.get_session(columns=columns, filters=filters, isolation_level=isolation_level)
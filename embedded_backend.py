@@ -0,0 +1,396 @@
+"""
+Embedded SQLite backend for offline audits and benchmarks.
+Builds a single-file SQLite database from the Excel templates / sample data
+(Persian or English headers), Parquet or CSV extracts, or the Arrow/Parquet
+files of the table cache (table_cache.py), so every query in queries/ can
+run in-process without SQL Server.
+
+The database uses the regular models: with a sqlite CONNECTION_STRING the
+'af' schema args are dropped (models.get_schema_args), the soft delete
+listener and the read-only session work unchanged. With SQLITE_TUNING=true,
+engines created by database.Database for SQLite get analytical PRAGMAs too
+(see tune_sqlite).
+
+Usage:
+    python embedded_backend.py --build audit.db --source excel_sample_data
+    python embedded_backend.py --build audit.db --source data_cache --replace
+    CONNECTION_STRING=sqlite:///audit.db python query_runner.py benford_first_digit_test
+"""
+import os
+import argparse
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, String, Text, create_engine, event, text
+from sqlalchemy.engine import Engine
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# Rows inserted per executemany round trip
+INSERT_BATCH_SIZE = 10000
+
+# File types accepted as table sources
+SOURCE_EXTENSIONS = ('.xlsx', '.xls', '.parquet', '.arrow', '.csv')
+
+# PRAGMAs applied to every SQLite connection (larger page cache, memory-mapped
+# reads, in-memory temp B-trees for GROUP BY / ORDER BY)
+SQLITE_PRAGMAS = {
+    'cache_size': -65536,       # 64 MB
+    'mmap_size': 268435456,     # 256 MB
+    'temp_store': 'MEMORY',
+    'synchronous': 'NORMAL'
+}
+
+# Excel headers (Persian templates / sample data) -> model columns
+# ستون‌های فایل‌های اکسل (قالب‌ها و داده‌های نمونه) به ستون‌های جداول
+HEADER_ALIASES: Dict[str, Dict[str, str]] = {
+    'Transactions': {
+        'تاریخ': 'DocumentDate',
+        'شماره سند': 'DocumentNumber',
+        'کد حساب': 'AccountCode',
+        'بدهکار': 'Debit',
+        'بستانکار': 'Credit',
+        'شرح': 'Description'
+    },
+    'CheckPayables': {
+        'تاریخ صدور': 'DocumentPaymentDate',
+        'تاریخ سررسید': 'CheckDate',
+        'شماره چک': 'CheckNumber',
+        'مبلغ': 'CheckAmount',
+        'دریافت کننده': 'PayeeName'
+    },
+    'CheckReceivables': {
+        'شناسه': 'Id',
+        'شماره برگه دریافت': 'DocumentReceiptNumber',
+        'تاریخ برگه دریافت': 'DocumentReceiptDate',
+        'شماره چک': 'CheckNumber',
+        'مبلغ چک': 'CheckAmount',
+        'تاریخ چک': 'CheckDate',
+        'کد واگذارکننده': 'DrawerCode',
+        'نام واگذارکننده': 'DrawerName',
+        'حذف شده': 'IsDeleted',
+        'زمان ایجاد': 'CreationTime'
+    },
+    'InventoryIssues': {
+        'تاریخ': 'IssueDate',
+        'کد کالا': 'ItemCode',
+        'نام کالا': 'ItemName',
+        'تعداد': 'Quantity',
+        'قیمت واحد': 'UnitPrice',
+        'مبلغ کل': 'Amount'
+    },
+    'PayrollTransactions': {
+        'ماه': 'Month',
+        'کد پرسنلی': 'EmployeeCode',
+        'نام': 'EmployeeFullName',
+        'حقوق پایه': 'BaseSalary',
+        'اضافه کار': 'OvertimePay',
+        'پاداش': 'IrregularBenefits',
+        'کسورات': 'OtherDeductions',
+        'خالص پرداختی': 'NetPayment'
+    },
+    'SalesTransactions': {
+        'تاریخ': 'InvoiceDate',
+        'شماره فاکتور': 'InvoiceNumber',
+        'کد مشتری': 'CustomerCode',
+        'نام مشتری': 'CustomerName',
+        'کد کالا': 'ItemCode',
+        'نام کالا': 'ItemName',
+        'تعداد': 'Quantity',
+        'قیمت واحد': 'UnitPrice',
+        'مبلغ کل': 'Amount'
+    }
+}
+
+
+def sqlite_url(path: str) -> str:
+    """SQLAlchemy URL of a SQLite database file"""
+    return f'sqlite:///{os.path.abspath(path)}'
+
+
+def tune_sqlite(engine: Engine) -> None:
+    """
+    Apply analytical PRAGMAs to every new connection of a SQLite engine
+    
+    File databases are switched to WAL journaling, so test sessions can
+    read while an upload writes.
+    """
+    file_database = engine.url.database not in (None, '', ':memory:')
+    
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if file_database:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def create_embedded_engine(path: str) -> Engine:
+    """
+    Create an engine on a SQLite file for the audited models
+    
+    The 'af' schema is translated away, so models imported with a SQL
+    Server CONNECTION_STRING map to the SQLite tables as well.
+    """
+    engine = create_engine(sqlite_url(path), future=True)
+    tune_sqlite(engine)
+    return engine.execution_options(schema_translate_map={'af': None})
+
+
+def read_source(path: str) -> Any:
+    """
+    Read a table source file into a DataFrame
+    
+    Args:
+        path: .xlsx/.xls, .parquet, .arrow (Arrow IPC, as written by table_cache) or .csv
+    
+    Returns:
+        DataFrame: Raw file contents
+    
+    Raises:
+        ImportError: If pandas (or pyarrow for Arrow files) is not installed
+        ValueError: If the file type is not supported
+    """
+    if not PANDAS_AVAILABLE:
+        raise ImportError("pandas is required to load the embedded backend")
+    
+    extension = Path(path).suffix.lower()
+    if extension in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    if extension == '.csv':
+        return pd.read_csv(path)
+    if extension == '.arrow':
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required to read Arrow files")
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    raise ValueError(f"Unsupported source file '{path}'. Use one of: {', '.join(SOURCE_EXTENSIONS)}")
+
+
+def _convert(column: Any, value: Any) -> Any:
+    """Convert one cell to the Python type of a column (NaN/NaT/'' -> None)"""
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    
+    col_type = column.type
+    if isinstance(col_type, Boolean):
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'بله')
+        return bool(value)
+    if isinstance(col_type, (DateTime, Date)):
+        parsed = pd.to_datetime(value, errors='coerce')
+        if pd.isna(parsed):
+            return None
+        return parsed.date() if isinstance(col_type, Date) and not isinstance(col_type, DateTime) else parsed.to_pydatetime()
+    if isinstance(col_type, Integer):
+        return int(value)
+    if isinstance(col_type, Numeric):
+        return float(value)
+    if isinstance(col_type, (String, Text)):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        text_value = str(value)
+        return text_value if text_value != '' else None
+    return value
+
+
+def _required_default(column: Any, loaded_at: datetime) -> Any:
+    """Neutral value of a NOT NULL column the source does not provide"""
+    col_type = column.type
+    if isinstance(col_type, Boolean):
+        return False
+    if isinstance(col_type, (Integer, Numeric)):
+        return 0
+    if isinstance(col_type, (DateTime, Date)):
+        return loaded_at
+    return ''
+
+
+def normalize_frame(model: Any, frame: Any) -> List[Dict[str, Any]]:
+    """
+    Map a source DataFrame to insertable records of a model
+    
+    Headers are matched by column name or by the Persian aliases of the
+    templates; unknown columns are ignored. A second header row (the Persian
+    labels of the bilingual templates) is skipped. NOT NULL columns the
+    source lacks get a neutral value (0, False, '' or the load time for dates).
+    
+    Args:
+        model: Mapped model class
+        frame: DataFrame from read_source()
+    
+    Returns:
+        list: One dict per row with model column names
+    """
+    table = model.__table__
+    aliases = HEADER_ALIASES.get(model.__tablename__, {})
+    renamed = {
+        header: aliases.get(str(header).strip(), str(header).strip())
+        for header in frame.columns
+    }
+    frame = frame.rename(columns=renamed)
+    frame = frame[[name for name in dict.fromkeys(frame.columns) if name in table.columns]]
+    
+    if len(frame):
+        labels = [value.strip() for value in frame.iloc[0] if isinstance(value, str)]
+        if labels and all(label in aliases for label in labels):
+            frame = frame.iloc[1:]
+    
+    loaded_at = datetime.now()
+    required = [
+        column for column in table.columns
+        if not column.nullable and not column.primary_key and column.default is None
+    ]
+    # Empty cells of columns with a default are left out so the default applies
+    defaulted = {column.name for column in table.columns if column.default is not None}
+    
+    records = []
+    columns = [table.columns[name] for name in frame.columns]
+    for row in frame.itertuples(index=False, name=None):
+        record = {column.name: _convert(column, value) for column, value in zip(columns, row)}
+        for name in [name for name, value in record.items() if value is None and name in defaulted]:
+            del record[name]
+        for column in required:
+            if record.get(column.name) is None:
+                record[column.name] = _required_default(column, loaded_at)
+        if 'IsDeleted' in table.columns and record.get('IsDeleted') is None:
+            record['IsDeleted'] = False
+        if 'Uuid' in table.columns and not record.get('Uuid'):
+            record['Uuid'] = str(uuid.uuid4())
+        records.append(record)
+    return records
+
+
+def load_table(engine: Engine, model: Any, records: Sequence[Dict[str, Any]], replace: bool = False) -> int:
+    """
+    Insert records into a model's table with batched executemany
+    
+    Args:
+        engine: Engine from create_embedded_engine()
+        model: Mapped model class
+        records: Rows from normalize_frame()
+        replace: Delete the existing rows first
+    
+    Returns:
+        int: Number of inserted rows
+    """
+    table = model.__table__
+    with engine.begin() as connection:
+        if replace:
+            connection.execute(table.delete())
+        # Group by key set: executemany needs the same columns in every row
+        for start in range(0, len(records), INSERT_BATCH_SIZE):
+            batch = records[start:start + INSERT_BATCH_SIZE]
+            groups: Dict[tuple, List[Dict[str, Any]]] = {}
+            for record in batch:
+                groups.setdefault(tuple(record), []).append(record)
+            for rows in groups.values():
+                connection.execute(table.insert(), rows)
+    return len(records)
+
+
+def discover_sources(directory: str) -> Dict[str, str]:
+    """
+    Find table source files in a directory
+    
+    A file belongs to a table when its name is the table name, optionally
+    followed by '_' and a suffix (Transactions.parquet, Transactions_SampleData.xlsx).
+    Templates (*_Template.*) are skipped since they contain headers only.
+    
+    Returns:
+        dict: Table name -> file path
+    """
+    from table_cache import cached_models
+    
+    tables = {model.__tablename__ for model in cached_models()}
+    sources: Dict[str, str] = {}
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() not in SOURCE_EXTENSIONS or path.stem.endswith('_Template'):
+            continue
+        name = path.stem.split('_', 1)[0]
+        if name in tables:
+            sources[name] = str(path)
+    return sources
+
+
+def build_database(path: str, sources: Dict[str, str], replace: bool = False) -> Dict[str, int]:
+    """
+    Create (or extend) a SQLite database from table source files
+    
+    Args:
+        path: SQLite database file
+        sources: Table name -> source file (see discover_sources)
+        replace: Replace the rows of tables that have a source
+    
+    Returns:
+        dict: Table name -> rows loaded
+    """
+    from database import Base
+    from table_cache import cached_models
+    
+    models_by_table = {model.__tablename__: model for model in cached_models()}
+    engine = create_embedded_engine(path)
+    try:
+        with engine.begin() as connection:
+            Base.metadata.create_all(connection)
+        
+        loaded = {}
+        for table_name, source in sources.items():
+            model = models_by_table[table_name]
+            loaded[table_name] = load_table(engine, model, normalize_frame(model, read_source(source)), replace=replace)
+        
+        # Planner statistics for the loaded data
+        with engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+        return loaded
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    """Main function - Entry point for the script"""
+    parser = argparse.ArgumentParser(description='Build an embedded SQLite audit database')
+    parser.add_argument('--build', type=str, required=True, help='SQLite database file to create or extend')
+    parser.add_argument('--source', type=str, action='append', default=[],
+                        help='Directory with table files (repeatable; default: excel_sample_data)')
+    parser.add_argument('--replace', action='store_true', help='Replace existing rows of loaded tables')
+    args = parser.parse_args()
+    
+    # models must be imported with the SQLite connection (no 'af' schema, String UUIDs)
+    from config import Config
+    Config.CONNECTION_STRING = sqlite_url(args.build)
+    
+    directories = args.source or [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'excel_sample_data')]
+    sources: Dict[str, str] = {}
+    for directory in directories:
+        sources.update(discover_sources(directory))
+    
+    loaded = build_database(args.build, sources, replace=args.replace)
+    print(json.dumps({
+        'database': os.path.abspath(args.build),
+        'connection_string': sqlite_url(args.build),
+        'loaded': loaded
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
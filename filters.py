@@ -0,0 +1,279 @@
+"""
+Row filter helpers for query source tables.
+Lets define() declare the row predicates execute() applies, so they are
+compiled into the SQL WHERE clause instead of being checked in Python.
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, List, Optional, Sequence, Union
+from sqlalchemy import Date, DateTime, Integer, Numeric
+from types_definitions import FiltersDict, ParamRefDict, PredicateDict
+
+ColumnRef = Union[str, ParamRefDict]
+
+
+def param(
+    key: str,
+    default: Any = None,
+    choices: Optional[Sequence[Any]] = None,
+    otherwise: Any = None
+) -> ParamRefDict:
+    """
+    Reference an input parameter inside a predicate
+    
+    The value is read with get_parameter() when the query runs. A predicate
+    whose parameter resolves to None is skipped.
+    
+    A parameter used as the column of a predicate must list its choices, so
+    free-text input never becomes a column name. A value outside the choices
+    resolves to `otherwise`, mirroring how execute() maps the parameter.
+    
+    Args:
+        key: Parameter key (as declared in define()'s parameters)
+        default: Value used when the parameter is not provided
+        choices: Allowed values (column names for a column parameter)
+        otherwise: Value used when the parameter is not one of the choices
+    
+    Returns:
+        dict: Parameter reference
+    
+    Example:
+        gt('Debit', param('minAmount', 0))
+        gt(param('columnName', 'Debit', choices=['Debit', 'Credit'], otherwise='Credit'), 0)
+    """
+    reference: ParamRefDict = {'param': key, 'default': default}
+    if choices is not None:
+        reference['choices'] = list(choices)
+        reference['otherwise'] = otherwise
+    return reference
+
+
+def _predicate(column: ColumnRef, op: str, value: Any = None) -> PredicateDict:
+    """Build a predicate dictionary"""
+    return {'column': column, 'op': op, 'value': value}
+
+
+def gt(column: ColumnRef, value: Any) -> PredicateDict:
+    """column > value"""
+    return _predicate(column, 'gt', value)
+
+
+def ge(column: ColumnRef, value: Any) -> PredicateDict:
+    """column >= value"""
+    return _predicate(column, 'ge', value)
+
+
+def lt(column: ColumnRef, value: Any) -> PredicateDict:
+    """column < value"""
+    return _predicate(column, 'lt', value)
+
+
+def le(column: ColumnRef, value: Any) -> PredicateDict:
+    """column <= value"""
+    return _predicate(column, 'le', value)
+
+
+def eq(column: ColumnRef, value: Any) -> PredicateDict:
+    """column = value"""
+    return _predicate(column, 'eq', value)
+
+
+def ne(column: ColumnRef, value: Any) -> PredicateDict:
+    """column <> value"""
+    return _predicate(column, 'ne', value)
+
+
+def between(column: ColumnRef, low: Any, high: Any) -> PredicateDict:
+    """low <= column <= high (skipped if either bound resolves to None)"""
+    return _predicate(column, 'between', [low, high])
+
+
+def not_null(column: ColumnRef) -> PredicateDict:
+    """column IS NOT NULL"""
+    return _predicate(column, 'not_null')
+
+
+def in_(column: ColumnRef, values: Any) -> PredicateDict:
+    """column IN (values)"""
+    return _predicate(column, 'in', values if _is_param(values) else list(values))
+
+
+def where(model: Any, *predicates: PredicateDict) -> FiltersDict:
+    """
+    Declare the row predicates of a model that a query reads
+    
+    All predicates are combined with AND. Column names are validated here,
+    including every choice of a column taken from a parameter.
+    
+    Args:
+        model: Mapped model class (e.g. Transaction)
+        *predicates: Predicates created with gt(), between(), in_(), ...
+    
+    Returns:
+        dict: Filters for a single model
+    
+    Raises:
+        ValueError: If no predicates are given, a column does not exist on the
+                    model or a column parameter does not declare its choices
+    
+    Example:
+        'filters': where(Transaction, gt(param('columnName', 'Debit', choices=['Debit', 'Credit']), 0))
+    """
+    if not predicates:
+        raise ValueError(f"At least one predicate must be declared for {model.__name__}")
+    
+    table_columns = model.__table__.columns
+    for predicate in predicates:
+        column = predicate['column']
+        if _is_param(column):
+            if 'choices' not in column:
+                raise ValueError(f"Column parameter '{column['param']}' must declare its choices")
+            names = [*column['choices'], column['otherwise']]
+        else:
+            names = [column]
+        for name in names:
+            if name is not None and name not in table_columns:
+                raise ValueError(f"Column '{name}' does not exist on {model.__name__}")
+    
+    return {model.__name__: list(predicates)}
+
+
+def merge_filters(*specs: FiltersDict) -> FiltersDict:
+    """
+    Merge filters of several models into one declaration
+    
+    Args:
+        *specs: Filters created with where()
+    
+    Returns:
+        dict: Combined filters (model name -> predicates)
+    """
+    merged: FiltersDict = {}
+    for spec in specs:
+        for model_name, predicates in spec.items():
+            merged.setdefault(model_name, []).extend(predicates)
+    return merged
+
+
+def _is_param(value: Any) -> bool:
+    """Check whether a value is a parameter reference"""
+    return isinstance(value, dict) and 'param' in value
+
+
+def resolve_filters(
+    filters: Optional[FiltersDict],
+    get_value: Callable[[str, Any], Any]
+) -> FiltersDict:
+    """
+    Replace parameter references with the values of the current run
+    
+    Args:
+        filters: Filters declared by define()
+        get_value: Parameter getter, e.g. query_runner.get_parameter
+    
+    Returns:
+        dict: Filters with literal values only. Predicates with a value
+              (or column) resolving to None are dropped.
+    """
+    def resolve(value: Any) -> Any:
+        if _is_param(value):
+            resolved_value = get_value(value['param'], value.get('default'))
+            if 'choices' in value and resolved_value not in value['choices']:
+                return value['otherwise']
+            return resolved_value
+        return value
+    
+    resolved: FiltersDict = {}
+    for model_name, predicates in (filters or {}).items():
+        for predicate in predicates:
+            column = resolve(predicate['column'])
+            value = resolve(predicate.get('value'))
+            if predicate['op'] == 'between':
+                value = [resolve(bound) for bound in value]
+                if None in value:
+                    continue
+            elif predicate['op'] != 'not_null' and value is None:
+                continue
+            if column is None:
+                continue
+            resolved.setdefault(model_name, []).append(_predicate(column, predicate['op'], value))
+    return resolved
+
+
+def _coerce(model: Any, column: Any, value: Any) -> Any:
+    """
+    Convert a parameter value (often a string from the UI) to the column type
+    
+    Raises:
+        ValueError: If the value cannot be converted
+    """
+    if not isinstance(value, str):
+        return value
+    
+    column_type = column.type
+    try:
+        if isinstance(column_type, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(column_type, Date):
+            return date.fromisoformat(value[:10])
+        if isinstance(column_type, Integer):
+            return int(value)
+        if isinstance(column_type, Numeric):
+            return Decimal(value)
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Invalid value '{value}' for {model.__name__}.{column.name}")
+    return value
+
+
+def filter_criteria(model: Any, predicates: List[PredicateDict]) -> List[Any]:
+    """
+    Compile resolved predicates to SQLAlchemy WHERE criteria
+    
+    Args:
+        model: Mapped model class
+        predicates: Resolved predicates of the model (see resolve_filters)
+    
+    Returns:
+        list: Criteria to pass to Query.filter()
+    
+    Raises:
+        ValueError: If a column does not exist or a value has the wrong type
+    """
+    criteria = []
+    table_columns = model.__table__.columns
+    for predicate in predicates:
+        name = predicate['column']
+        if name not in table_columns:
+            raise ValueError(f"Column '{name}' does not exist on {model.__name__}")
+    
+        attribute = getattr(model, name)
+        column = table_columns[name]
+        op = predicate['op']
+        value = predicate.get('value')
+    
+        if op == 'not_null':
+            criteria.append(attribute.isnot(None))
+        elif op == 'between':
+            low, high = (_coerce(model, column, bound) for bound in value)
+            criteria.append(attribute.between(low, high))
+        elif op == 'in':
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(',') if item.strip()]
+            criteria.append(attribute.in_([_coerce(model, column, item) for item in value]))
+        else:
+            value = _coerce(model, column, value)
+            if op == 'gt':
+                criteria.append(attribute > value)
+            elif op == 'ge':
+                criteria.append(attribute >= value)
+            elif op == 'lt':
+                criteria.append(attribute < value)
+            elif op == 'le':
+                criteria.append(attribute <= value)
+            elif op == 'eq':
+                criteria.append(attribute == value)
+            elif op == 'ne':
+                criteria.append(attribute != value)
+            else:
+                raise ValueError(f"Unknown filter operator '{op}'")
+    return criteria
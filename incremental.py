@@ -0,0 +1,453 @@
+"""
+Incremental evaluation of tests over growing tables.
+The audited ledgers mostly grow, so a test whose result is a fold over rows
+(Benford digit counts, footing sums per account, ...) can keep its state
+between runs and read only the rows added since: each evaluation stores the
+state with a watermark, the largest value of a NOT NULL column that only grows
+(Id by default, or CreationTime), and the next run folds only the rows above it.
+
+Rows at or below the watermark are checked with one aggregate query per run:
+- soft deletes: rows deleted since the last run (DeletionTime after the last
+  one seen) are read and taken out of the state with the test's unfold();
+  tests without unfold() are recomputed
+- anything that cannot be merged (rows committed late below the watermark,
+  hard deletes, rows modified after being folded according to
+  LastModificationTime, restored rows) triggers a full recomputation
+
+A stored state also records the source digest of the modules defining the
+test's init/fold/unfold, so editing the test (e.g. the fix-test-error flow)
+recomputes it.
+
+A test reads either plain rows (columns) or partial aggregates per group
+(keys and measures, see aggregation.py), merged into its state by fold().
+
+States are stored per test, tenant and state key (the parameter values that
+shape the state) in INCREMENTAL_STATE_DIR; without it every evaluation folds
+all rows, so tests have one code path either way.
+
+Usage:
+    digit_counts = session.incremental(
+        'benford_first_digit_test', Transaction,
+        init=Counter, fold=count_digits, unfold=uncount_digits,
+        columns=['Debit'], key=['Debit']
+    )
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import case, func, select
+from aggregation import aggregate_select, count_rows, key as group_key, max_of
+from config import Config
+from core_fetch import core_select
+from filters import filter_criteria
+from result_cache import module_version
+from types_definitions import GroupKeyDict, MeasureDict, PredicateDict
+
+FILE_SUFFIX = '.state'
+
+# Layout version of stored records; records of another version are recomputed
+RECORD_FORMAT = 1
+
+# Rows fetched per round trip when reading plain rows
+BATCH_SIZE = 5000
+
+# Bookkeeping columns of aggregate reads
+_DELETED = '_incremental_deleted'
+_ROWS = '_incremental_rows'
+_MARK = '_incremental_mark'
+_DELETED_AT = '_incremental_deleted_at'
+_MODIFIED = '_incremental_modified'
+
+
+def _latest(current: Any, value: Any) -> Any:
+    """Larger of two values, ignoring NULLs"""
+    if value is None:
+        return current
+    if current is None or value > current:
+        return value
+    return current
+
+
+class _Stats:
+    """Counters and maxima of the rows of one read"""
+    
+    def __init__(self) -> None:
+        self.rows = 0
+        self.deleted = 0
+        self.mark: Any = None
+        self.deleted_at: Any = None
+        self.modified: Any = None
+
+
+class _Reader:
+    """Reads of one incremental test: plain rows or partial aggregates of a model"""
+    
+    def __init__(
+        self,
+        model: Any,
+        columns: Optional[Sequence[str]],
+        keys: Optional[Sequence[GroupKeyDict]],
+        measures: Optional[Sequence[MeasureDict]],
+        where: Sequence[PredicateDict],
+        watermark: str
+    ) -> None:
+        table = model.__table__
+        if (columns is None) == (measures is None):
+            raise ValueError("Give either columns or measures (with optional keys)")
+        if watermark not in table.columns:
+            raise ValueError(f"Column '{watermark}' does not exist on {model.__name__}")
+        if table.c[watermark].nullable:
+            # Rows with a NULL watermark would never be above it
+            raise ValueError(f"Watermark column '{watermark}' of {model.__name__} must be NOT NULL")
+        
+        self.model = model
+        self.table = table
+        self.columns = list(columns) if columns is not None else None
+        self.keys = list(keys or [])
+        self.measures = list(measures or [])
+        self.where = list(where)
+        self.watermark = watermark
+        self.column = table.c[watermark]
+        self.soft_delete = 'IsDeleted' in table.columns
+        self.deletion_time = table.c.DeletionTime if 'DeletionTime' in table.columns else None
+        self.modification_time = table.c.LastModificationTime if 'LastModificationTime' in table.columns else None
+    
+    def read(self, session: Any, criteria: List[Any], stats: _Stats, live_only: bool = False) -> Iterator[Tuple[List[Any], List[Any]]]:
+        """
+        Read the rows matching the criteria
+        
+        Args:
+            session: SQLAlchemy session (not the read-only wrapper)
+            criteria: Extra WHERE criteria (watermark range, deleted rows)
+            stats: Counters updated while reading
+            live_only: Skip soft-deleted rows in SQL (no deletion tracking needed)
+        
+        Yields:
+            (live rows, soft-deleted rows) per batch; rows for columns reads,
+            dictionaries per group for aggregate reads
+        """
+        if live_only and self.soft_delete:
+            criteria = criteria + [self.table.c.IsDeleted == False]
+        if self.columns is not None:
+            yield from self._read_rows(session, criteria, stats)
+        else:
+            yield self._read_groups(session, criteria, stats)
+    
+    def _read_rows(self, session: Any, criteria: List[Any], stats: _Stats) -> Iterator[Tuple[List[Any], List[Any]]]:
+        tracked = [self.watermark, 'IsDeleted', 'DeletionTime', 'LastModificationTime']
+        names = self.columns + [name for name in tracked if name in self.table.columns and name not in self.columns]
+        statement = core_select(
+            self.model, names, filter_criteria(self.model, self.where) + criteria, include_deleted=True
+        )
+        result = session.execute(statement, execution_options={'include_deleted': True, 'yield_per': BATCH_SIZE})
+        for batch in result.partitions():
+            live: List[Any] = []
+            deleted: List[Any] = []
+            for row in batch:
+                values = row._mapping
+                stats.rows += 1
+                stats.mark = _latest(stats.mark, values[self.watermark])
+                if self.soft_delete and values['IsDeleted']:
+                    deleted.append(row)
+                    stats.deleted += 1
+                    if self.deletion_time is not None:
+                        stats.deleted_at = _latest(stats.deleted_at, values['DeletionTime'])
+                else:
+                    live.append(row)
+                    if self.modification_time is not None:
+                        stats.modified = _latest(stats.modified, values['LastModificationTime'])
+            yield live, deleted
+    
+    def _read_groups(self, session: Any, criteria: List[Any], stats: _Stats) -> Tuple[List[Any], List[Any]]:
+        keys = self.keys + ([group_key('IsDeleted', _DELETED)] if self.soft_delete else [])
+        measures = self.measures + [count_rows(_ROWS), max_of(self.watermark, _MARK)]
+        if self.deletion_time is not None:
+            measures.append(max_of('DeletionTime', _DELETED_AT))
+        if self.modification_time is not None:
+            measures.append(max_of('LastModificationTime', _MODIFIED))
+        statement = aggregate_select(self.model, keys, measures, self.where).where(*criteria)
+        
+        live: List[Any] = []
+        deleted: List[Any] = []
+        for row in session.execute(statement, execution_options={'include_deleted': True}):
+            values = dict(row._mapping)
+            count = values.pop(_ROWS)
+            if not count:
+                continue
+            stats.rows += count
+            stats.mark = _latest(stats.mark, values.pop(_MARK))
+            deleted_at = values.pop(_DELETED_AT, None)
+            modified = values.pop(_MODIFIED, None)
+            if values.pop(_DELETED, False):
+                deleted.append(values)
+                stats.deleted += count
+                stats.deleted_at = _latest(stats.deleted_at, deleted_at)
+            else:
+                live.append(values)
+                stats.modified = _latest(stats.modified, modified)
+        return live, deleted
+    
+    def check(self, session: Any, mark: Any) -> Dict[str, Any]:
+        """
+        Count the rows at or below a watermark in one aggregate query
+        
+        Returns:
+            dict: 'rows' (including soft-deleted rows), 'deleted', and 'modified'
+                  (latest LastModificationTime of the live rows)
+        """
+        aggregates = [func.count().label('rows')]
+        if self.soft_delete:
+            aggregates.append(func.coalesce(func.sum(case((self.table.c.IsDeleted == True, 1), else_=0)), 0).label('deleted'))
+            if self.modification_time is not None:
+                aggregates.append(func.max(case((self.table.c.IsDeleted == False, self.modification_time))).label('modified'))
+        elif self.modification_time is not None:
+            aggregates.append(func.max(self.modification_time).label('modified'))
+        statement = select(*aggregates).select_from(self.table).where(
+            *filter_criteria(self.model, self.where), self.column <= mark
+        )
+        values = dict(session.execute(statement, execution_options={'include_deleted': True}).one()._mapping)
+        values.setdefault('deleted', 0)
+        values.setdefault('modified', None)
+        return values
+
+
+class IncrementalStore:
+    """Persisted states and watermarks of incremental tests"""
+    
+    def __init__(self, directory: Optional[str] = None) -> None:
+        """
+        Initialize the store
+        
+        Args:
+            directory: State directory (default: INCREMENTAL_STATE_DIR, empty = no persisted states)
+        """
+        state_dir = directory if directory is not None else Config.INCREMENTAL_STATE_DIR
+        self.directory = Path(state_dir) if state_dir else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            'full': 0, 'incremental': 0, 'recomputed': 0, 'rows_folded': 0, 'rows_unfolded': 0
+        }
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether states are persisted"""
+        return self.directory is not None
+    
+    def count(self, name: str, amount: int = 1) -> None:
+        """Increment a statistics counter"""
+        with self._lock:
+            self.stats[name] += amount
+    
+    def _path(self, name: str, tenant: Optional[str], key: Sequence[Any], watermark: str) -> Path:
+        """State file of a test; tenants' states are kept in a subdirectory per tenant"""
+        material = json.dumps([list(key), watermark], sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(material.encode('utf-8')).hexdigest()[:20]
+        directory = self.directory / tenant if tenant else self.directory
+        return directory / f'{name}-{digest}{FILE_SUFFIX}'
+    
+    def load(self, name: str, tenant: Optional[str], key: Sequence[Any], watermark: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the stored record of a test
+        
+        Returns:
+            dict: Watermark, row counters and state, or None if there is no usable record
+        """
+        try:
+            record = pickle.loads(self._path(name, tenant, key, watermark).read_bytes())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Unreadable (e.g. written by another version of the test); recomputed
+            return None
+        if not isinstance(record, dict) or record.get('format') != RECORD_FORMAT:
+            return None
+        return record
+    
+    def save(self, name: str, tenant: Optional[str], key: Sequence[Any], watermark: str, record: Dict[str, Any]) -> None:
+        """Store the record of a test (written to a temporary file and renamed into place)"""
+        path = self._path(name, tenant, key, watermark)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp.write_bytes(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(temp, path)
+    
+    def clear(self, name: Optional[str] = None) -> int:
+        """
+        Remove stored states, so the next runs recompute from the first row
+        
+        Args:
+            name: Test whose states are removed (None = all tests)
+        
+        Returns:
+            int: Number of removed state files
+        """
+        if self.directory is None:
+            return 0
+        removed = 0
+        for path in self.directory.rglob(f'{name or "*"}-*{FILE_SUFFIX}'):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Get store statistics
+        
+        Returns:
+            dict: Full/incremental/recomputed evaluations, folded and unfolded rows, stored states
+        """
+        with self._lock:
+            status: Dict[str, Any] = dict(self.stats)
+        status['enabled'] = self.enabled
+        if self.directory is not None:
+            status['directory'] = str(self.directory)
+            status['states'] = sum(1 for _ in self.directory.rglob(f'*{FILE_SUFFIX}'))
+        return status
+
+
+# Global state store of the process
+states = IncrementalStore()
+
+
+def _code_version(*functions: Any) -> Optional[str]:
+    """Source digest of the modules defining the given functions (None if none has a source file)"""
+    digests = {
+        module_version(sys.modules.get(getattr(function, '__module__', None) or ''))
+        for function in functions if function is not None
+    }
+    digests.discard(None)
+    if not digests:
+        return None
+    return hashlib.sha256(' '.join(sorted(digests)).encode('utf-8')).hexdigest()
+
+
+def _catch_up(session: Any, reader: _Reader, record: Dict[str, Any], unfold: Optional[Callable[[Any, List[Any]], None]], store: IncrementalStore) -> bool:
+    """
+    Bring a stored state up to date with the rows at or below its watermark
+    
+    Returns:
+        bool: False if the state cannot be updated and must be recomputed
+    """
+    check = reader.check(session, record['mark'])
+    modified = check['modified'] is not None and (record['modified'] is None or check['modified'] > record['modified'])
+    if check['rows'] != record['rows'] or check['deleted'] < record['deleted'] or modified:
+        return False
+    
+    removed = check['deleted'] - record['deleted']
+    if not removed:
+        return True
+    if unfold is None or reader.deletion_time is None:
+        return False
+    
+    # Only the rows deleted since the last run are read; deleted rows without
+    # DeletionTime cannot be told apart and are caught by the count below
+    criteria = [reader.column <= record['mark'], reader.table.c.IsDeleted == True]
+    if record['deleted_at'] is not None:
+        criteria.append(reader.deletion_time > record['deleted_at'])
+    else:
+        criteria.append(reader.deletion_time.isnot(None))
+    stats = _Stats()
+    for _, deleted in reader.read(session, criteria, stats):
+        if deleted:
+            unfold(record['state'], deleted)
+    if stats.deleted != removed:
+        # Deletions without or with the same DeletionTime as already seen ones
+        return False
+    record['deleted'] += removed
+    record['deleted_at'] = _latest(record['deleted_at'], stats.deleted_at)
+    store.count('rows_unfolded', removed)
+    return True
+
+
+def evaluate(
+    session: Any,
+    tenant: Optional[str],
+    name: str,
+    model: Any,
+    init: Callable[[], Any],
+    fold: Callable[[Any, List[Any]], None],
+    unfold: Optional[Callable[[Any, List[Any]], None]] = None,
+    columns: Optional[Sequence[str]] = None,
+    keys: Optional[Sequence[GroupKeyDict]] = None,
+    measures: Optional[Sequence[MeasureDict]] = None,
+    where: Optional[Sequence[PredicateDict]] = None,
+    key: Sequence[Any] = (),
+    watermark: str = 'Id',
+    store: Optional[IncrementalStore] = None
+) -> Any:
+    """
+    Evaluate an incremental test's state, folding only rows added since its last run
+    
+    Args:
+        session: SQLAlchemy session (not the read-only wrapper)
+        tenant: Tenant database of the session (namespaces the state)
+        name: Test id
+        model: Mapped model class to read
+        init: Returns an empty state
+        fold: Adds a batch of live rows (or group dictionaries) to a state
+        unfold: Removes a batch of soft-deleted rows from a state (None = recompute on deletes)
+        columns: Columns of the rows passed to fold/unfold (plain row reads)
+        keys: Group keys of aggregate reads (see aggregation.py)
+        measures: Measures of aggregate reads; must be mergeable (sums, counts, min, max)
+        where: Row predicates (see filters.py)
+        key: Values the state depends on (e.g. parameters); each key has its own state
+        watermark: NOT NULL column whose values only grow ('Id', 'CreationTime')
+        store: State store (default: the global store)
+    
+    Returns:
+        The state, up to date with the table
+    
+    Raises:
+        ValueError: If the reads or the watermark column are invalid
+    """
+    store = store or states
+    reader = _Reader(model, columns, keys, measures, where or [], watermark)
+    
+    if not store.enabled:
+        state = init()
+        stats = _Stats()
+        for live, _ in reader.read(session, [], stats, live_only=True):
+            if live:
+                fold(state, live)
+        store.count('full')
+        store.count('rows_folded', stats.rows)
+        return state
+    
+    code = _code_version(init, fold, unfold)
+    record = store.load(name, tenant, key, watermark)
+    if record is not None and (record.get('code') != code or not _catch_up(session, reader, record, unfold, store)):
+        # State folded by another version of the test's code, or changed rows
+        store.count('recomputed')
+        record = None
+    if record is None:
+        record = {
+            'format': RECORD_FORMAT, 'code': code, 'mark': None, 'rows': 0, 'deleted': 0,
+            'deleted_at': None, 'modified': None, 'state': init()
+        }
+        store.count('full')
+    else:
+        store.count('incremental')
+    
+    # Rows above the watermark (every row on a full run)
+    criteria = [] if record['mark'] is None else [reader.column > record['mark']]
+    stats = _Stats()
+    for live, _ in reader.read(session, criteria, stats):
+        if live:
+            fold(record['state'], live)
+    record['mark'] = _latest(record['mark'], stats.mark)
+    record['rows'] += stats.rows
+    record['deleted'] += stats.deleted
+    record['deleted_at'] = _latest(record['deleted_at'], stats.deleted_at)
+    record['modified'] = _latest(record['modified'], stats.modified)
+    store.count('rows_folded', stats.rows - stats.deleted)
+    
+    if record['mark'] is not None:
+        store.save(name, tenant, key, watermark, record)
+    return record['state']
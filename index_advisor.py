@@ -0,0 +1,538 @@
+"""
+Index advisor derived from the SQL the audit tests emit.
+
+Runs the queries of the catalog (queries/*.py), captures every SELECT they
+send to the database, and derives the columns each test filters on
+(equality / range), groups and orders by, and reads. From these access
+patterns it recommends indexes:
+- seek indexes: equality columns first, then a range, GROUP BY or ORDER BY column
+- covering indexes: the other columns a test reads are INCLUDEd, so the
+  base table is not touched
+- filtered indexes: when the soft delete predicate (IsDeleted = 0) is
+  present the index only holds live rows
+
+DDL is emitted for SQL Server, PostgreSQL or SQLite (SQLite has no INCLUDE,
+the covered columns are appended to the key). With --benchmark the captured
+statements are replayed against a copy of the configured SQLite database
+before and after creating the recommended indexes.
+
+Usage:
+    python index_advisor.py
+    python index_advisor.py --dialect mssql --output indexes.sql
+    python index_advisor.py --benchmark --repeat 5
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, event, text
+
+# Dialects with INCLUDE columns and filtered (partial) indexes
+INCLUDE_DIALECTS = ('mssql', 'postgresql')
+FILTER_DIALECTS = ('mssql', 'postgresql', 'sqlite')
+
+# Soft delete column; an equality on it becomes the index filter
+SOFT_DELETE_COLUMN = 'IsDeleted'
+
+# Scan-only covering indexes are recommended only if they hold at most this
+# share of the table's columns (otherwise scanning the table is as cheap)
+MAX_COVERING_SHARE = 0.6
+
+# Identifier length limit of index names (SQL Server allows 128)
+MAX_INDEX_NAME = 128
+
+_IDENTIFIER = r'(?:\[(\w+)\]|"(\w+)"|`(\w+)`|(\w+))'
+# [schema.]table.column, e.g. af.[Transactions].[AccountCode] on SQL Server
+_COLUMN_REF = re.compile(r'(?:' + _IDENTIFIER + r'\.)?' + _IDENTIFIER + r'\.' + _IDENTIFIER)
+_OPERATOR = re.compile(r'\s*(=|!=|<>|>=|<=|>|<|BETWEEN\b|NOT\s+IN\b|IN\b|IS\b|LIKE\b|NOT\s+LIKE\b)', re.IGNORECASE)
+_CLAUSES = ('WHERE', 'GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT', 'OFFSET', 'FETCH')
+_CLAUSE_PATTERN = re.compile(r'\b(' + '|'.join(c.replace(' ', r'\s+') for c in _CLAUSES) + r')\b', re.IGNORECASE)
+
+
+class AccessPattern:
+    """
+    Columns one statement uses on one table
+    
+    Attributes:
+        test_id: Test that emitted the statement
+        table: Table name
+        equality: Columns compared with = or IN
+        ranges: Columns compared with <, >, BETWEEN
+        group_by: GROUP BY columns
+        order_by: ORDER BY columns
+        referenced: All columns of the table the statement reads
+        soft_delete: Whether the statement filters IsDeleted = 0
+    """
+    
+    def __init__(self, test_id: str, table: str) -> None:
+        self.test_id = test_id
+        self.table = table
+        self.equality: List[str] = []
+        self.ranges: List[str] = []
+        self.group_by: List[str] = []
+        self.order_by: List[str] = []
+        self.referenced: List[str] = []
+        self.soft_delete = False
+    
+    def seek_columns(self) -> List[str]:
+        """Index key columns: equalities, then one range, GROUP BY or ORDER BY column"""
+        columns = sorted(set(self.equality))
+        for candidate in self.ranges[:1] or self.group_by or self.order_by:
+            if candidate not in columns:
+                columns.append(candidate)
+        return columns
+
+
+class IndexRecommendation:
+    """
+    Recommended index
+    
+    Attributes:
+        table: Table name
+        key: Key columns, in order
+        include: Covered (non-key) columns
+        filtered: Whether the index only holds live rows (IsDeleted = 0)
+        schema: Schema of the table (None: the database's default schema)
+        tests: Tests served by the index
+    """
+    
+    def __init__(self, table: str, key: Sequence[str], include: Iterable[str], filtered: bool,
+                 schema: Optional[str] = None) -> None:
+        self.table = table
+        self.schema = schema
+        self.key = list(key)
+        self.include: List[str] = []
+        self.filtered = filtered
+        self.tests: List[str] = []
+        self.add_include(include)
+    
+    def add_include(self, columns: Iterable[str]) -> None:
+        """Add covered columns (the soft delete column, if any, is kept last)"""
+        include = [c for c in dict.fromkeys(list(self.include) + list(columns)) if c not in self.key]
+        self.include = sorted(include, key=lambda c: c == SOFT_DELETE_COLUMN)
+    
+    @property
+    def name(self) -> str:
+        """Index name, e.g. IX_Transactions_AccountCode_Active"""
+        name = '_'.join(['IX', self.table] + self.key + (['Active'] if self.filtered else []))
+        if self.include:
+            name += '_Cov'
+        if len(name) > MAX_INDEX_NAME:
+            digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+            name = name[:MAX_INDEX_NAME - 9] + '_' + digest
+        return name
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Recommendation as a JSON-serializable dictionary"""
+        return {
+            'name': self.name,
+            'schema': self.schema,
+            'table': self.table,
+            'key': self.key,
+            'include': self.include,
+            'filter': f'{SOFT_DELETE_COLUMN} = 0' if self.filtered else None,
+            'tests': sorted(set(self.tests))
+        }
+
+
+def _identifier(match: Tuple[Optional[str], ...]) -> str:
+    """First non-empty group of a quoted or bare identifier match"""
+    return next(group for group in match if group)
+
+
+def _split_clauses(sql: str) -> Dict[str, str]:
+    """Split a SELECT statement into its top-level clauses (SELECT/FROM, WHERE, ...)"""
+    clauses: Dict[str, str] = {}
+    current = 'SELECT'
+    position = 0
+    scanned = 0
+    depth = 0
+    for match in _CLAUSE_PATTERN.finditer(sql):
+        # Only split on keywords outside parentheses (subqueries stay in their clause)
+        depth += sql.count('(', scanned, match.start()) - sql.count(')', scanned, match.start())
+        scanned = match.start()
+        if depth:
+            continue
+        clauses[current] = clauses.get(current, '') + sql[position:match.start()]
+        current = ' '.join(match.group(1).upper().split())
+        position = match.end()
+    clauses[current] = clauses.get(current, '') + sql[position:]
+    return clauses
+
+
+def _column_refs(sql: str, tables: Dict[str, Sequence[str]]) -> List[Tuple[str, str, int]]:
+    """
+    Find [schema.]table.column references of known tables (aliases like
+    Transactions_1 included); tables are matched by name, without the schema
+    """
+    refs = []
+    for match in _COLUMN_REF.finditer(sql):
+        table = _identifier(match.groups()[4:8])
+        column = _identifier(match.groups()[8:])
+        if table not in tables:
+            base = re.sub(r'_\d+$', '', table)
+            if base not in tables:
+                continue
+            table = base
+        if column in tables[table]:
+            refs.append((table, column, match.end()))
+    return refs
+
+
+def analyze_statement(test_id: str, sql: str, tables: Dict[str, Sequence[str]]) -> List[AccessPattern]:
+    """
+    Derive the access pattern of each table a SELECT statement reads
+    
+    Args:
+        test_id: Test that emitted the statement
+        sql: SQL text as sent to the database
+        tables: Table name -> column names (from Base.metadata)
+    
+    Returns:
+        list: One AccessPattern per table referenced by the statement
+    """
+    sql = ' '.join(sql.split())
+    clauses = _split_clauses(sql)
+    patterns: Dict[str, AccessPattern] = {}
+    
+    def pattern(table: str) -> AccessPattern:
+        if table not in patterns:
+            patterns[table] = AccessPattern(test_id, table)
+        return patterns[table]
+    
+    def add(columns: List[str], column: str) -> None:
+        if column not in columns:
+            columns.append(column)
+    
+    for table, column, _ in _column_refs(sql, tables):
+        add(pattern(table).referenced, column)
+    
+    # Predicates in WHERE and JOIN ... ON
+    predicate_text = clauses.get('WHERE', '') + ' ' + ' '.join(re.findall(r'\bON\b(.*?)(?=\bJOIN\b|$)', clauses['SELECT'], re.IGNORECASE))
+    for table, column, end in _column_refs(predicate_text, tables):
+        operator = _OPERATOR.match(predicate_text, end)
+        if not operator:
+            continue
+        op = ' '.join(operator.group(1).upper().split())
+        target = pattern(table)
+        if column == SOFT_DELETE_COLUMN and op == '=':
+            target.soft_delete = True
+        elif op in ('=', 'IN'):
+            add(target.equality, column)
+        elif op in ('<', '>', '<=', '>=', 'BETWEEN'):
+            add(target.ranges, column)
+    
+    for table, column, _ in _column_refs(clauses.get('GROUP BY', ''), tables):
+        add(pattern(table).group_by, column)
+    for table, column, _ in _column_refs(clauses.get('ORDER BY', ''), tables):
+        add(pattern(table).order_by, column)
+    
+    return list(patterns.values())
+
+
+def recommend(patterns: Sequence[AccessPattern], tables: Dict[str, Sequence[str]],
+              primary_keys: Dict[str, Sequence[str]],
+              schemas: Optional[Dict[str, Optional[str]]] = None) -> List[IndexRecommendation]:
+    """
+    Recommend indexes for the captured access patterns
+    
+    Seek patterns (with equality, range, GROUP BY or ORDER BY columns) get an
+    index keyed on those columns; recommendations whose key is a prefix of
+    another one with the same filter are merged. Pure scans of a table are
+    merged into one narrow covering index per table when it is markedly
+    narrower than the table.
+    
+    Args:
+        patterns: Access patterns from analyze_statement()
+        tables: Table name -> column names
+        primary_keys: Table name -> primary key columns
+        schemas: Table name -> schema (e.g. 'af'); missing tables use the default schema
+    
+    Returns:
+        list: Recommendations, most used first
+    """
+    schemas = schemas or {}
+    seeks: List[IndexRecommendation] = []
+    scans: Dict[Tuple[str, bool], List[AccessPattern]] = {}
+    
+    for access in patterns:
+        key = access.seek_columns()
+        if key and key != list(primary_keys.get(access.table, [])):
+            recommendation = IndexRecommendation(
+                access.table, key, access.referenced, access.soft_delete, schemas.get(access.table)
+            )
+            recommendation.tests.append(access.test_id)
+            seeks.append(recommendation)
+        elif access.soft_delete and not key:
+            scans.setdefault((access.table, access.soft_delete), []).append(access)
+    
+    # Merge seek indexes whose key is a prefix of another index's key
+    merged: List[IndexRecommendation] = []
+    for recommendation in sorted(seeks, key=lambda r: -len(r.key)):
+        for existing in merged:
+            if (existing.table == recommendation.table and existing.filtered == recommendation.filtered
+                    and existing.key[:len(recommendation.key)] == recommendation.key):
+                existing.add_include(recommendation.include)
+                existing.tests.extend(recommendation.tests)
+                break
+        else:
+            merged.append(recommendation)
+    
+    # One narrow covering index per table for the scans that read few columns
+    for (table, filtered), accesses in scans.items():
+        columns = Counter(column for access in accesses for column in access.referenced)
+        width = len(tables[table])
+        if not columns or len(columns) > width * MAX_COVERING_SHARE:
+            narrow = [a for a in accesses if len(a.referenced) <= width * MAX_COVERING_SHARE]
+            columns = Counter(column for access in narrow for column in access.referenced)
+            accesses = narrow
+            if not columns or len(columns) > width * MAX_COVERING_SHARE:
+                continue
+        leading = columns.most_common(1)[0][0]
+        recommendation = IndexRecommendation(
+            table, [leading], sorted(columns, key=lambda c: (-columns[c], c)), filtered, schemas.get(table)
+        )
+        recommendation.tests.extend(access.test_id for access in accesses)
+        # A seek index with the same leading column also covers the scans
+        for existing in merged:
+            if existing.table == table and existing.filtered == filtered and existing.key[0] == leading:
+                existing.add_include(recommendation.include)
+                existing.tests.extend(recommendation.tests)
+                break
+        else:
+            merged.append(recommendation)
+    
+    return sorted(merged, key=lambda r: (-len(set(r.tests)), r.table, r.key))
+
+
+def _quote(name: str, dialect: str) -> str:
+    """Quote an identifier for a dialect"""
+    return f'[{name}]' if dialect == 'mssql' else f'"{name}"'
+
+
+def index_ddl(recommendation: IndexRecommendation, dialect: str) -> str:
+    """
+    CREATE INDEX statement of a recommendation
+    
+    Args:
+        recommendation: Recommended index
+        dialect: 'mssql', 'postgresql' or 'sqlite'
+    
+    Returns:
+        str: DDL statement
+    """
+    q = lambda name: _quote(name, dialect)
+    key = recommendation.key
+    include = recommendation.include
+    if dialect not in INCLUDE_DIALECTS:
+        # No INCLUDE clause: covered columns become trailing key columns
+        key, include = key + include, []
+    
+    # SQLite has no schemas; SQL Server defaults to dbo
+    schema = recommendation.schema or ('dbo' if dialect == 'mssql' else None)
+    table = q(recommendation.table)
+    if schema and dialect != 'sqlite':
+        table = f'{q(schema)}.{table}'
+    kind = 'NONCLUSTERED INDEX' if dialect == 'mssql' else 'INDEX'
+    ddl = f'CREATE {kind} {q(recommendation.name)} ON {table} ({", ".join(q(c) for c in key)})'
+    if include:
+        ddl += f' INCLUDE ({", ".join(q(c) for c in include)})'
+    if recommendation.filtered and dialect in FILTER_DIALECTS:
+        live = 'false' if dialect == 'postgresql' else '0'
+        ddl += f' WHERE {q(SOFT_DELETE_COLUMN)} = {live}'
+    return ddl + ';'
+
+
+def catalog_test_ids() -> List[str]:
+    """Query modules of the catalog (queries/*.py with an execute function)"""
+    queries_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+    return sorted(
+        file[:-3] for file in os.listdir(queries_dir)
+        if file.endswith('.py') and not file.startswith('__')
+    )
+
+
+def capture_statements(test_ids: Sequence[str]) -> List[Tuple[str, str, Any]]:
+    """
+    Run tests and capture the SELECT statements they send to the database
+    
+    Args:
+        test_ids: Query module names
+    
+    Returns:
+        list: (test_id, sql, parameters) per executed statement
+    """
+    import query_runner
+    from database import db
+    
+    db._initialize()
+    captured: List[Tuple[str, str, Any]] = []
+    current = {'test': None}
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current['test'] and statement.lstrip().upper().startswith('SELECT'):
+            captured.append((current['test'], statement, parameters))
+    
+    engines = {id(e): e for e in (db.engine, db.read_engine) if e is not None}
+    for engine in engines.values():
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for test_id in test_ids:
+            try:
+                module = importlib.import_module(f'queries.{test_id}')
+                if not hasattr(module, 'execute'):
+                    continue
+                definitions = module.define() if hasattr(module, 'define') else None
+                session = query_runner.open_session(definitions)
+                current['test'] = test_id
+                try:
+                    module.execute(session)
+                finally:
+                    current['test'] = None
+                    session.close()
+            except Exception as e:
+                print(f'⚠ {test_id}: {type(e).__name__}: {e}', file=sys.stderr)
+    finally:
+        for engine in engines.values():
+            event.remove(engine, 'before_cursor_execute', capture)
+    return captured
+
+
+def benchmark(database_path: str, captured: Sequence[Tuple[str, str, Any]],
+              recommendations: Sequence[IndexRecommendation], repeat: int = 3) -> Dict[str, Any]:
+    """
+    Replay captured statements on a copy of a SQLite database, before and after indexing
+    
+    Args:
+        database_path: SQLite database file (it is copied, not modified)
+        captured: Statements from capture_statements()
+        recommendations: Indexes to create on the copy
+        repeat: Runs per statement (the best is kept)
+    
+    Returns:
+        dict: Per-test and total seconds before/after, and index usage from the query plans
+    """
+    work_dir = tempfile.mkdtemp(prefix='index_advisor_')
+    copy_path = os.path.join(work_dir, 'benchmark.db')
+    shutil.copyfile(database_path, copy_path)
+    engine = create_engine(f'sqlite:///{copy_path}')
+    
+    def run_all() -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        with engine.connect() as connection:
+            for test_id, sql, parameters in captured:
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    connection.exec_driver_sql(sql, parameters).fetchall()
+                    best = min(best, time.perf_counter() - start)
+                timings[test_id] = timings.get(test_id, 0.0) + best
+        return timings
+    
+    try:
+        before = run_all()
+        with engine.begin() as connection:
+            for recommendation in recommendations:
+                connection.exec_driver_sql(index_ddl(recommendation, 'sqlite'))
+            connection.execute(text('ANALYZE'))
+        after = run_all()
+        
+        names = {r.name for r in recommendations}
+        used = 0
+        with engine.connect() as connection:
+            for _, sql, parameters in captured:
+                plan = ' '.join(str(row[-1]) for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parameters))
+                used += any(name in plan for name in names)
+    finally:
+        engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        'statements': len(captured),
+        'statements_using_new_indexes': used,
+        'total_before_ms': round(sum(before.values()) * 1000, 3),
+        'total_after_ms': round(sum(after.values()) * 1000, 3),
+        'tests': {
+            test_id: {
+                'before_ms': round(before[test_id] * 1000, 3),
+                'after_ms': round(after[test_id] * 1000, 3)
+            }
+            for test_id in sorted(before)
+        }
+    }
+
+
+def main() -> None:
+    """Main function - Entry point for the script"""
+    from config import Config
+    from database import Base
+    import models  # noqa: F401  (registers the tables)
+    
+    parser = argparse.ArgumentParser(description='Recommend indexes from the SQL emitted by audit tests')
+    parser.add_argument('--tests', type=str, default=None, help='Comma-separated test ids (default: whole catalog)')
+    parser.add_argument('--dialect', type=str, default=None, choices=('mssql', 'postgresql', 'sqlite'),
+                        help='DDL dialect (default: dialect of CONNECTION_STRING)')
+    parser.add_argument('--output', type=str, default=None, help='Write the DDL to this file')
+    parser.add_argument('--benchmark', action='store_true', help='Replay the tests on a copy of the SQLite database with and without the indexes')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per statement in the benchmark')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+    
+    test_ids = [t.strip() for t in args.tests.split(',')] if args.tests else catalog_test_ids()
+    # Keyed by table name: with a schema (get_schema_args) the metadata key is 'af.Transactions'
+    metadata_tables = Base.metadata.tables.values()
+    tables = {table.name: list(table.columns.keys()) for table in metadata_tables}
+    primary_keys = {table.name: [c.name for c in table.primary_key.columns] for table in metadata_tables}
+    schemas = {table.name: table.schema for table in metadata_tables}
+    
+    captured = capture_statements(test_ids)
+    patterns = [p for test_id, sql, _ in captured for p in analyze_statement(test_id, sql, tables)]
+    recommendations = recommend(patterns, tables, primary_keys, schemas)
+    
+    url = Config.get_read_connection_string()
+    backend = url.split(':', 1)[0].split('+', 1)[0]
+    dialect = args.dialect or (backend if backend in ('mssql', 'postgresql', 'sqlite') else 'mssql')
+    ddl = [index_ddl(r, dialect) for r in recommendations]
+    
+    report: Dict[str, Any] = {
+        'tests': len(test_ids),
+        'statements': len(captured),
+        'recommendations': [dict(r.to_dict(), ddl=statement) for r, statement in zip(recommendations, ddl)]
+    }
+    
+    if args.benchmark:
+        if backend != 'sqlite':
+            raise SystemExit('--benchmark needs a SQLite CONNECTION_STRING (a local stand-in of the data)')
+        from sqlalchemy.engine import make_url
+        report['benchmark'] = benchmark(make_url(url).database, captured, recommendations, repeat=args.repeat)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(ddl) + '\n')
+    
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    
+    print(f'{report["statements"]} statements from {report["tests"]} tests')
+    for recommendation in report['recommendations']:
+        print(f'\n-- {len(recommendation["tests"])} tests: {", ".join(recommendation["tests"][:5])}'
+              f'{" ..." if len(recommendation["tests"]) > 5 else ""}')
+        print(recommendation['ddl'])
+    if 'benchmark' in report:
+        result = report['benchmark']
+        print(f'\nBenchmark (SQLite copy): {result["total_before_ms"]} ms -> {result["total_after_ms"]} ms, '
+              f'{result["statements_using_new_indexes"]}/{result["statements"]} statements use a new index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+"""
+Background jobs for long-running test executions.
+Submitting a job (one test, or a battery of tests) returns a job id at once;
+its status and progress, its result and its cancellation are then requested
+with that id, so no HTTP request has to stay open while a test runs.
+
+Jobs are kept in a SQLite queue, without an external broker: the file
+JOB_DB_PATH is shared by all web processes on the host, or, when empty, each
+process keeps its own in-memory queue. Every process using the queue runs a
+dispatcher thread executing at most JOB_WORKERS jobs at a time, each in a
+worker process (parallel_runner.WorkerProcess), so a cancelled test or one
+running longer than TEST_TIMEOUT_SECONDS is killed without affecting the
+others. At most JOB_QUEUE_DEPTH jobs may wait; further submissions are
+refused with QueueFullError. Finished jobs are removed after
+JOB_RETENTION_HOURS.
+
+A running job whose dispatcher stops renewing its heartbeat (e.g. its web
+process was restarted) is marked failed by the other processes.
+
+States: queued -> running -> succeeded | failed | cancelled
+"""
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Sequence
+from config import Config
+from parallel_runner import WorkerProcess, worker_context
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+# Seconds between heartbeats of running jobs, and without one before a job is failed
+HEARTBEAT_SECONDS = 5
+STALE_SECONDS = 60
+
+# Seconds the dispatcher waits for outcomes before checking for new jobs and cancellations
+POLL_SECONDS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    test_ids TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    tenant TEXT,
+    result_limit INTEGER,
+    owner TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    current_test TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    outcomes BLOB
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when JOB_QUEUE_DEPTH jobs are already waiting"""
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value).isoformat(timespec='seconds') if value else None
+
+
+class _ActiveJob:
+    """A job being run by this process's dispatcher"""
+    
+    def __init__(self, job_id: str, test_ids: List[str], task: Any, worker: WorkerProcess) -> None:
+        self.job_id = job_id
+        self.test_ids = test_ids
+        # (parameters, tenant, limit) of run_one
+        self.task = task
+        self.worker = worker
+        self.outcomes: Dict[str, Dict[str, Any]] = {}
+    
+    def submit_next(self) -> None:
+        """Send the next test of the job to its worker"""
+        test_id = self.test_ids[len(self.outcomes)]
+        self.worker.submit(test_id, (test_id, *self.task))
+
+
+class JobQueue:
+    """SQLite-backed job queue with a bounded pool of worker processes"""
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        workers: Optional[int] = None,
+        depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+        start_method: Optional[str] = None,
+        retention_hours: Optional[float] = None
+    ) -> None:
+        """
+        Initialize the queue (the dispatcher starts with the first submission)
+        
+        Args:
+            path: SQLite file of the queue (default: JOB_DB_PATH, empty = in-memory queue of the process)
+            workers: Jobs run at the same time by this process (default: JOB_WORKERS)
+            depth: Maximum number of waiting jobs (default: JOB_QUEUE_DEPTH)
+            timeout: Seconds a test may run (default: TEST_TIMEOUT_SECONDS, 0 = no limit)
+            start_method: multiprocessing start method of the workers (default: see parallel_runner.worker_context)
+            retention_hours: Hours finished jobs are kept (default: JOB_RETENTION_HOURS)
+        """
+        self.path = path if path is not None else Config.JOB_DB_PATH
+        self.workers = max(1, workers if workers is not None else Config.JOB_WORKERS)
+        self.depth = depth if depth is not None else Config.JOB_QUEUE_DEPTH
+        self.timeout = timeout if timeout is not None else Config.TEST_TIMEOUT_SECONDS
+        self.retention_hours = retention_hours if retention_hours is not None else Config.JOB_RETENTION_HOURS
+        self.context = worker_context(start_method)
+        
+        # One connection used under a lock (autocommit; claims use BEGIN IMMEDIATE)
+        self._db = sqlite3.connect(self.path or ':memory:', timeout=30, check_same_thread=False, isolation_level=None)
+        if self.path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _execute(self, sql: str, parameters: Sequence[Any] = ()) -> List[Any]:
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+    
+    def submit(
+        self,
+        test_ids: Sequence[str],
+        parameters: Optional[Dict[str, Any]] = None,
+        tenant: Optional[str] = None,
+        limit: Optional[int] = None,
+        owner: Optional[str] = None
+    ) -> str:
+        """
+        Queue a job
+        
+        Args:
+            test_ids: Tests to run, one after another
+            parameters: Input parameters of the tests
+            tenant: Tenant database to read (None = CONNECTION_STRING)
+            limit: Keep only the first rows of each test's results (None = all)
+            owner: Id of the submitting user
+        
+        Returns:
+            str: Job id
+        
+        Raises:
+            QueueFullError: If JOB_QUEUE_DEPTH jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute(
+                    'DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?',
+                    (now - self.retention_hours * 3600,)
+                )
+                waiting = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if waiting >= self.depth:
+                    raise QueueFullError(f'{waiting} jobs are waiting (JOB_QUEUE_DEPTH={self.depth})')
+                self._db.execute(
+                    'INSERT INTO jobs (id, status, test_ids, parameters, tenant, result_limit, owner, created) '
+                    "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                    (job_id, json.dumps(list(test_ids)), json.dumps(parameters or {}, ensure_ascii=False, default=str),
+                     tenant, limit, owner, now)
+                )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        self.start()
+        self._wake.set()
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the status and progress of a job
+        
+        Returns:
+            dict: Status, progress (tests done of total), current test, times and
+                  error, or None if the job does not exist
+        """
+        rows = self._execute(
+            'SELECT id, status, test_ids, tenant, owner, created, started, finished, done, current_test, '
+            'cancel_requested, error FROM jobs WHERE id = ?', (job_id,)
+        )
+        if not rows:
+            return None
+        (job_id, status, test_ids, tenant, owner, created, started, finished,
+         done, current_test, cancel_requested, error) = rows[0]
+        test_ids = json.loads(test_ids)
+        total = len(test_ids)
+        job = {
+            'job_id': job_id,
+            'status': status,
+            'test_ids': test_ids,
+            'tenant': tenant,
+            'owner': owner,
+            'progress': {'done': done, 'total': total, 'percent': round(done * 100 / total, 1) if total else 100.0},
+            'current_test': current_test if status == 'running' else None,
+            'cancel_requested': bool(cancel_requested),
+            'created': _timestamp(created),
+            'started': _timestamp(started),
+            'finished': _timestamp(finished),
+            'elapsed': round((finished or time.time()) - started, 3) if started else None,
+            'error': error
+        }
+        if status == 'queued':
+            job['queue_position'] = self._execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created <= ?", (created,)
+            )[0][0]
+        return job
+    
+    def result(self, job_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Get the outcomes of a job's tests (see parallel_runner.run_one)
+        
+        Returns:
+            dict: Test id -> outcome of the tests run so far, or None if the job does not exist
+        """
+        rows = self._execute('SELECT outcomes FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+        return pickle.loads(rows[0][0]) if rows[0][0] else {}
+    
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job: a waiting job is dropped, a running job's worker is killed
+        
+        Returns:
+            str: Status of the job after the request, or None if it does not exist
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'", (now, job_id)
+            )
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            rows = self._db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchall()
+        self._wake.set()
+        return rows[0][0] if rows else None
+    
+    def recent(self, owner: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        List the most recent jobs
+        
+        Args:
+            owner: Only the jobs of this user (None = all jobs)
+            limit: Maximum number of jobs
+        """
+        if owner is None:
+            rows = self._execute('SELECT id FROM jobs ORDER BY created DESC LIMIT ?', (limit,))
+        else:
+            rows = self._execute('SELECT id FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?', (owner, limit))
+        return [job for job in (self.get(row[0]) for row in rows) if job is not None]
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Get the queue's configuration and the number of jobs per status
+        """
+        counts = dict(self._execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+        return {
+            'path': self.path or ':memory:',
+            'workers': self.workers,
+            'depth': self.depth,
+            'timeout': self.timeout,
+            'dispatcher_running': self._thread is not None and self._thread.is_alive(),
+            'jobs': {status: counts.get(status, 0) for status in ('queued', 'running') + FINISHED}
+        }
+    
+    def start(self) -> None:
+        """Start the dispatcher thread of this process (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the dispatcher; running jobs are killed and marked failed"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def _claim(self) -> Optional[Any]:
+        """Take the oldest waiting job (atomic across processes)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    "SELECT id, test_ids, parameters, tenant, result_limit FROM jobs "
+                    "WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    first = next(iter(json.loads(row[1])), None)
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, current_test = ? WHERE id = ?",
+                        (now, now, first, row[0])
+                    )
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return row
+    
+    def _finish(self, active: _ActiveJob, status: str, error: Optional[str] = None) -> None:
+        self._execute(
+            'UPDATE jobs SET status = ?, finished = ?, done = ?, current_test = NULL, error = ?, outcomes = ? WHERE id = ?',
+            (status, time.time(), len(active.outcomes), error,
+             pickle.dumps(active.outcomes, protocol=pickle.HIGHEST_PROTOCOL), active.job_id)
+        )
+    
+    def _dispatch(self) -> None:
+        """Dispatcher thread: run waiting jobs in the worker pool until stopped"""
+        active: Dict[str, _ActiveJob] = {}
+        idle: List[WorkerProcess] = []
+        last_heartbeat = 0.0
+        try:
+            while not self._stopping.is_set():
+                while len(active) < self.workers:
+                    row = self._claim()
+                    if row is None:
+                        break
+                    job_id, test_ids, parameters, tenant, limit = row
+                    job = _ActiveJob(job_id, json.loads(test_ids), (json.loads(parameters), tenant, limit),
+                                     idle.pop() if idle else WorkerProcess(self.context))
+                    if not job.test_ids:
+                        idle.append(job.worker)
+                        self._finish(job, 'succeeded')
+                        continue
+                    job.submit_next()
+                    active[job_id] = job
+                
+                now = time.time()
+                if now - last_heartbeat >= HEARTBEAT_SECONDS:
+                    self._heartbeat(list(active), now)
+                    last_heartbeat = now
+                
+                if active:
+                    placeholders = ','.join('?' * len(active))
+                    cancelled = self._execute(
+                        f'SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})', list(active)
+                    )
+                    for (job_id,) in cancelled:
+                        job = active.pop(job_id)
+                        job.worker.stop(kill=True)
+                        self._finish(job, 'cancelled')
+                
+                if not active:
+                    self._wake.wait(POLL_SECONDS)
+                    self._wake.clear()
+                    continue
+                workers = [job.worker for job in active.values()]
+                wait([worker.connection for worker in workers] + [worker.process.sentinel for worker in workers], POLL_SECONDS)
+                
+                for job in list(active.values()):
+                    outcome = job.worker.outcome(self.timeout)
+                    if outcome is None:
+                        continue
+                    lost = outcome.pop('worker_lost', False)
+                    job.outcomes[job.worker.test_id] = outcome
+                    if lost:
+                        job.worker.stop(kill=True)
+                    if len(job.outcomes) < len(job.test_ids):
+                        if lost:
+                            job.worker = WorkerProcess(self.context)
+                        job.submit_next()
+                        self._execute(
+                            'UPDATE jobs SET done = ?, current_test = ?, outcomes = ? WHERE id = ?',
+                            (len(job.outcomes), job.worker.test_id,
+                             pickle.dumps(job.outcomes, protocol=pickle.HIGHEST_PROTOCOL), job.job_id)
+                        )
+                        continue
+                    del active[job.job_id]
+                    if not lost:
+                        idle.append(job.worker)
+                    failed = len(job.test_ids) == 1 and not outcome['success']
+                    self._finish(job, 'failed' if failed else 'succeeded', outcome.get('error') if failed else None)
+        finally:
+            for job in active.values():
+                job.worker.stop(kill=True)
+                self._finish(job, 'failed', 'Job dispatcher stopped')
+            for worker in idle:
+                worker.stop()
+    
+    def _heartbeat(self, job_ids: List[str], now: float) -> None:
+        """Renew the heartbeat of this process's running jobs and fail jobs of stopped dispatchers"""
+        with self._lock:
+            if job_ids:
+                placeholders = ','.join('?' * len(job_ids))
+                self._db.execute(f'UPDATE jobs SET heartbeat = ? WHERE id IN ({placeholders})', [now, *job_ids])
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = 'Job dispatcher stopped responding' "
+                "WHERE status = 'running' AND heartbeat < ?",
+                (now, now - STALE_SECONDS)
+            )
+
+
+# Global job queue of the process
+jobs = JobQueue()
@@ -10,7 +10,7 @@ Instructions:
 """
 from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, Date, BigInteger, Numeric, event
 from sqlalchemy.dialects.mssql import UNIQUEIDENTIFIER as MSSQL_UNIQUEIDENTIFIER
-from sqlalchemy.orm import relationship, Query
+from sqlalchemy.orm import relationship, Session, with_loader_criteria
 from database import Base
 from config import Config
 from datetime import datetime
@@ -57,6 +57,10 @@ class SoftDeleteMixin:
     Automatically filters out records where IsDeleted = True
     """
     
+    # Declared on the mixin so the soft delete criterion below can be built
+    # against it; each model defines its own IsDeleted column, which takes precedence
+    IsDeleted = Column(Boolean, nullable=False, default=False)
+    
     @classmethod
     def query_active(cls, session):
         """
@@ -73,9 +77,20 @@ class SoftDeleteMixin:
 
 
 # Configure automatic soft delete filtering for all queries
-# This event listener will automatically add IsDeleted = False filter to all queries
-@event.listens_for(Query, "before_compile", retval=True)
-def filter_soft_deletes(query):
+# This event listener will automatically add IsDeleted = False filter to all ORM queries
+# (session.query() and session.execute(select(...)), including column-only selects).
+# The criterion is attached with with_loader_criteria, which is part of the statement's
+# cache key, so the compiled SQL is reused across executions instead of being rebuilt.
+# The option is built once; the lambda is evaluated per mapped class when compiling.
+SOFT_DELETE_CRITERIA = with_loader_criteria(
+    SoftDeleteMixin,
+    lambda cls: cls.IsDeleted == False,
+    include_aliases=True
+)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def filter_soft_deletes(execute_state):
     """
     Automatically filter out soft-deleted records from all queries.
     To include deleted records, use query.execution_options(include_deleted=True)
@@ -87,16 +102,13 @@ def filter_soft_deletes(query):
         # To include deleted records explicitly
         all_results = session.query(Transaction).execution_options(include_deleted=True).all()
     """
-    # Check if we should include deleted records
-    for entity in query.column_descriptions:
-        entity_class = entity['entity']
-        if entity_class is not None and hasattr(entity_class, 'IsDeleted'):
-            # Check execution options
-            if not query._execution_options.get('include_deleted', False):
-                # Add filter for non-deleted records
-                query = query.enable_assertions(False).filter(entity_class.IsDeleted == False)
-    
-    return query
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get('include_deleted', False)
+    ):
+        execute_state.statement = execute_state.statement.options(SOFT_DELETE_CRITERIA)
 
 
 # Your Database Models
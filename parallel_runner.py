@@ -0,0 +1,295 @@
+"""
+Parallel execution of a battery of audit tests in worker processes.
+Each test runs in one of a bounded set of worker processes, so CPU-bound
+tests (clustering, isolation forest, seasonal analyses) use all cores. A test
+that exceeds its timeout or crashes its worker (segfault, out of memory) only
+fails itself: the worker is killed and replaced, and the other tests go on.
+Results are returned in the order the tests were given (catalog order).
+
+Each worker opens its own sessions, so tests of a parallel run do not share
+one transaction (see Database.consistent_snapshot) or one in-process snapshot
+cache; configure SHARED_SNAPSHOT_DIR to share snapshots between the workers.
+
+Usage:
+    python parallel_runner.py --workers 8 --timeout 300
+    python parallel_runner.py --workers 4 benford_first_digit_test duplicate_names_test
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Sequence
+from config import Config
+
+
+def test_module_path(test_id: str) -> str:
+    """Module of a test id ('custom_tests_<name>' for custom tests)"""
+    if test_id.startswith('custom_tests_'):
+        return f"queries.custom_tests.{test_id[len('custom_tests_'):]}"
+    return f'queries.{test_id}'
+
+
+def worker_context(start_method: Optional[str] = None) -> Any:
+    """
+    multiprocessing context of the worker processes
+    
+    The web server runs request and dispatcher threads, and forking a threaded
+    process can leave a lock held forever in the child, so without a configured
+    start method the workers are started with forkserver (or spawn where
+    forkserver is unavailable) rather than the platform default fork.
+    
+    Args:
+        start_method: 'fork', 'spawn' or 'forkserver' (default: PARALLEL_START_METHOD)
+    
+    Returns:
+        multiprocessing context
+    """
+    start_method = start_method or Config.PARALLEL_START_METHOD
+    if not start_method:
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(start_method)
+
+
+def run_one(test_id: str, parameters: Optional[Dict[str, Any]], tenant: Optional[str], limit: Optional[int]) -> Dict[str, Any]:
+    """
+    Run one test in the current process
+    
+    Args:
+        test_id: Test id (module name in queries/)
+        parameters: Input parameters of the run (query_runner.INPUT_PARAMETERS)
+        tenant: Tenant database to read (None = CONNECTION_STRING)
+        limit: Return only the first rows of the results (None = all)
+    
+    Returns:
+        dict: {'success': True, 'count', 'results'} or {'success': False, 'error'}
+    """
+    import query_runner
+    from result_cache import execute_cached
+    
+    started = time.monotonic()
+    try:
+        query_runner.INPUT_PARAMETERS = parameters or {}
+        module = importlib.import_module(test_module_path(test_id))
+        definitions = module.define() if hasattr(module, 'define') else None
+        session = query_runner.open_session(definitions, tenant)
+        try:
+            results = execute_cached(test_id, module, session, parameters, tenant)
+        finally:
+            session.close()
+        return {
+            'success': True,
+            'count': len(results),
+            'results': results if limit is None else results[:limit],
+            'elapsed': round(time.monotonic() - started, 3)
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc(),
+            'elapsed': round(time.monotonic() - started, 3)
+        }
+
+
+def _worker_main(connection: Any) -> None:
+    """Worker process: run the tests received on the connection until None arrives"""
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        outcome = run_one(*task)
+        try:
+            connection.send(outcome)
+        except Exception as e:
+            # e.g. results that cannot be pickled
+            connection.send({'success': False, 'error': f'Result could not be returned: {e}'})
+
+
+class WorkerProcess:
+    """One worker process and the test it is running"""
+    
+    def __init__(self, context: Any) -> None:
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.test_id: Optional[str] = None
+        self.started = 0.0
+    
+    def submit(self, test_id: str, task: Any) -> None:
+        self.test_id = test_id
+        self.started = time.monotonic()
+        self.connection.send(task)
+    
+    def stop(self, kill: bool = False) -> None:
+        """Stop the process (kill: without waiting for the current test)"""
+        if not kill:
+            try:
+                self.connection.send(None)
+            except (OSError, ValueError):
+                kill = True
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.connection.close()
+    
+    def outcome(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Outcome of the current test if it finished, crashed or timed out
+        
+        Args:
+            timeout: Seconds the test may run (None/0 = no limit)
+        
+        Returns:
+            dict: See run_one; 'worker_lost' is True if the process must be
+                  replaced (timed out or exited), None while the test runs
+        """
+        elapsed = round(time.monotonic() - self.started, 3)
+        if self.connection.poll():
+            try:
+                return self.connection.recv()
+            except (EOFError, OSError):
+                pass
+        elif self.process.is_alive():
+            if timeout and elapsed >= timeout:
+                return {
+                    'success': False,
+                    'error': f'Test timed out after {timeout} seconds',
+                    'elapsed': elapsed,
+                    'worker_lost': True
+                }
+            return None
+        return {
+            'success': False,
+            'error': f'Worker process exited unexpectedly (exit code {self.process.exitcode})',
+            'elapsed': elapsed,
+            'worker_lost': True
+        }
+
+
+class ParallelRunner:
+    """Runs tests in a bounded pool of worker processes"""
+    
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        start_method: Optional[str] = None
+    ) -> None:
+        """
+        Initialize the runner
+        
+        Args:
+            workers: Number of worker processes (default: RUN_ALL_WORKERS, or the CPU count if 0)
+            timeout: Seconds a test may run before its worker is killed (default: TEST_TIMEOUT_SECONDS, 0 = no limit)
+            start_method: multiprocessing start method ('fork', 'spawn', 'forkserver';
+                default: PARALLEL_START_METHOD, or forkserver/spawn; see worker_context)
+        """
+        self.workers = max(1, workers or Config.RUN_ALL_WORKERS or os.cpu_count() or 1)
+        self.timeout = timeout if timeout is not None else Config.TEST_TIMEOUT_SECONDS
+        self.context = worker_context(start_method)
+    
+    def run(
+        self,
+        test_ids: Sequence[str],
+        parameters: Optional[Dict[str, Any]] = None,
+        tenant: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run tests in parallel
+        
+        Args:
+            test_ids: Tests to run, in catalog order
+            parameters: Input parameters passed to every test
+            tenant: Tenant database to read (None = CONNECTION_STRING)
+            limit: Return only the first rows of each test's results (None = all)
+        
+        Returns:
+            dict: Test id -> outcome (see run_one), in the order of test_ids; a test
+                  that timed out or crashed its worker has success False
+        """
+        outcomes: Dict[str, Dict[str, Any]] = {}
+        pending = list(test_ids)
+        pending.reverse()
+        idle: List[WorkerProcess] = []
+        busy: List[WorkerProcess] = []
+        try:
+            while pending or busy:
+                while pending and len(busy) < self.workers:
+                    worker = idle.pop() if idle else WorkerProcess(self.context)
+                    test_id = pending.pop()
+                    worker.submit(test_id, (test_id, parameters, tenant, limit))
+                    busy.append(worker)
+                
+                wait_for = None
+                if self.timeout:
+                    oldest = min(worker.started for worker in busy)
+                    wait_for = max(0.0, oldest + self.timeout - time.monotonic())
+                wait([worker.connection for worker in busy] + [worker.process.sentinel for worker in busy], wait_for)
+                
+                for worker in list(busy):
+                    outcome = worker.outcome(self.timeout)
+                    if outcome is None:
+                        continue
+                    busy.remove(worker)
+                    lost = outcome.pop('worker_lost', False)
+                    outcomes[worker.test_id] = outcome
+                    if lost:
+                        worker.stop(kill=True)
+                    else:
+                        idle.append(worker)
+        finally:
+            for worker in busy:
+                worker.stop(kill=True)
+            for worker in idle:
+                worker.stop()
+        
+        return {test_id: outcomes[test_id] for test_id in test_ids}
+
+
+def main() -> None:
+    """Run tests from the command line and print the outcomes as JSON"""
+    parser = argparse.ArgumentParser(description='Run audit tests in parallel worker processes')
+    parser.add_argument('tests', nargs='*', help='Test ids (default: every *_test.py in queries/)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: RUN_ALL_WORKERS or CPU count)')
+    parser.add_argument('--timeout', type=float, default=None, help='Per-test timeout in seconds (default: TEST_TIMEOUT_SECONDS)')
+    parser.add_argument('--tenant', type=str, default=None, help='Tenant (company) database to run against')
+    parser.add_argument('--params', type=str, default=None, help='JSON string with parameter values')
+    parser.add_argument('--limit', type=int, default=None, help='Return only the first rows of each test')
+    args = parser.parse_args()
+    
+    test_ids = args.tests
+    if not test_ids:
+        queries_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+        test_ids = sorted(name[:-3] for name in os.listdir(queries_dir) if name.endswith('_test.py'))
+    try:
+        parameters = json.loads(args.params) if args.params else {}
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON parameters: {e}"}, ensure_ascii=False))
+        sys.exit(1)
+    
+    runner = ParallelRunner(args.workers, args.timeout)
+    started = time.monotonic()
+    outcomes = runner.run(test_ids, parameters=parameters, tenant=args.tenant, limit=args.limit)
+    print(json.dumps({
+        'workers': runner.workers,
+        'elapsed': round(time.monotonic() - started, 3),
+        'results': outcomes
+    }, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
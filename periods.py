@@ -0,0 +1,238 @@
+"""
+Period partitions of audited tables.
+A table is partitioned by its document date column into calendar months,
+fiscal years, or Jalali (Persian calendar) months / fiscal years, so caches
+can be kept per period and a date-bounded test reads only the periods it needs.
+
+Schemes:
+- 'month':        Gregorian calendar months
+- 'fiscal_year':  Gregorian fiscal years starting in FISCAL_YEAR_START_MONTH
+- 'jalali_month': Jalali months (فروردین، اردیبهشت، ...)
+- 'jalali_year':  Jalali fiscal years starting in JALALI_FISCAL_YEAR_START_MONTH
+                  (1 = فروردین, the usual Iranian fiscal year)
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional, Tuple, Union
+from config import Config
+
+PARTITION_SCHEMES = ('month', 'fiscal_year', 'jalali_month', 'jalali_year')
+
+# Date column each table is partitioned by
+# ستون تاریخ مبنای تفکیک دوره‌ای هر جدول
+PARTITION_COLUMNS = {
+    'Transactions': 'DocumentDate',
+    'CheckPayables': 'DocumentPaymentDate',
+    'CheckReceivables': 'DocumentReceiptDate',
+    'AssetAdditions': 'FormDate',
+    'AssetDisposals': 'FormDate',
+    'AssetEndOfPeriods': 'UtilizationDate',
+    'InventoryIssues': 'IssueDate',
+    'PurchaseReceipts': 'ReceiptDate',
+    'PayrollTransactions': 'VoucherDate',
+    'SalesReturns': 'ReturnDate',
+    'SalesTransactions': 'InvoiceDate'
+}
+
+DateLike = Union[date, datetime, str]
+
+
+class Period:
+    """
+    One partition: the half-open date range [start, end)
+    
+    Attributes:
+        key: Period label, e.g. '2024-03', 'FY2024', '1403-01', 'FY1403'
+        start: First instant of the period
+        end: First instant after the period
+    """
+    
+    def __init__(self, key: str, start: datetime, end: datetime) -> None:
+        self.key = key
+        self.start = start
+        self.end = end
+    
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Period) and (self.key, self.start, self.end) == (other.key, other.start, other.end)
+    
+    def __hash__(self) -> int:
+        return hash((self.key, self.start))
+    
+    def __repr__(self) -> str:
+        return f"Period('{self.key}', {self.start:%Y-%m-%d}, {self.end:%Y-%m-%d})"
+
+
+def gregorian_to_jalali(gy: int, gm: int, gd: int) -> Tuple[int, int, int]:
+    """
+    Convert a Gregorian date to Jalali (year, month, day)
+    
+    Example:
+        gregorian_to_jalali(2024, 3, 20) -> (1403, 1, 1)
+    """
+    days_before_month = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    gy2 = gy + 1 if gm > 2 else gy
+    days = (355666 + 365 * gy + (gy2 + 3) // 4 - (gy2 + 99) // 100 + (gy2 + 399) // 400
+            + gd + days_before_month[gm - 1])
+    jy = -1595 + 33 * (days // 12053)
+    days %= 12053
+    jy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        jy += (days - 1) // 365
+        days = (days - 1) % 365
+    if days < 186:
+        return jy, 1 + days // 31, 1 + days % 31
+    return jy, 7 + (days - 186) // 30, 1 + (days - 186) % 30
+
+
+def jalali_to_gregorian(jy: int, jm: int, jd: int) -> Tuple[int, int, int]:
+    """
+    Convert a Jalali date to Gregorian (year, month, day)
+    
+    Example:
+        jalali_to_gregorian(1403, 1, 1) -> (2024, 3, 20)
+    """
+    jy += 1595
+    days = (-355668 + 365 * jy + (jy // 33) * 8 + ((jy % 33) + 3) // 4 + jd
+            + ((jm - 1) * 31 if jm < 7 else (jm - 7) * 30 + 186))
+    gy = 400 * (days // 146097)
+    days %= 146097
+    if days > 36524:
+        days -= 1
+        gy += 100 * (days // 36524)
+        days %= 36524
+        if days >= 365:
+            days += 1
+    gy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        gy += (days - 1) // 365
+        days = (days - 1) % 365
+    gd = days + 1
+    leap = (gy % 4 == 0 and gy % 100 != 0) or gy % 400 == 0
+    month_days = [31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    gm = 0
+    while gd > month_days[gm]:
+        gd -= month_days[gm]
+        gm += 1
+    return gy, gm + 1, gd
+
+
+def to_datetime(value: DateLike) -> datetime:
+    """
+    Convert a date, datetime or ISO string to a datetime
+    
+    Raises:
+        ValueError: If a string is not an ISO date
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value).strip())
+
+
+def _jalali_start(jy: int, jm: int) -> datetime:
+    """First instant of a Jalali month (months beyond 12 roll over into the next years)"""
+    jy, jm = jy + (jm - 1) // 12, (jm - 1) % 12 + 1
+    return datetime(*jalali_to_gregorian(jy, jm, 1))
+
+
+def scheme_name(scheme: Optional[str] = None) -> str:
+    """
+    Validate a partition scheme name (defaults to PARTITION_SCHEME)
+    
+    Raises:
+        ValueError: If the scheme is not supported
+    """
+    scheme = (scheme or Config.PARTITION_SCHEME).strip().lower()
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"Unsupported partition scheme '{scheme}'. Use one of: {', '.join(PARTITION_SCHEMES)}")
+    return scheme
+
+
+def period_of(value: DateLike, scheme: Optional[str] = None) -> Period:
+    """
+    Get the period containing a date
+    
+    Args:
+        value: Date, datetime or ISO string
+        scheme: Partition scheme (defaults to PARTITION_SCHEME)
+    
+    Returns:
+        Period: The containing period
+    """
+    scheme = scheme_name(scheme)
+    moment = to_datetime(value)
+    
+    if scheme == 'month':
+        start = datetime(moment.year, moment.month, 1)
+        end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+        return Period(f'{moment:%Y-%m}', start, end)
+    
+    if scheme == 'fiscal_year':
+        first_month = Config.FISCAL_YEAR_START_MONTH
+        year = moment.year if moment.month >= first_month else moment.year - 1
+        return Period(f'FY{year}', datetime(year, first_month, 1), datetime(year + 1, first_month, 1))
+    
+    jy, jm, _ = gregorian_to_jalali(moment.year, moment.month, moment.day)
+    if scheme == 'jalali_month':
+        return Period(f'{jy}-{jm:02d}', _jalali_start(jy, jm), _jalali_start(jy, jm + 1))
+    
+    first_month = Config.JALALI_FISCAL_YEAR_START_MONTH
+    year = jy if jm >= first_month else jy - 1
+    return Period(f'FY{year}', _jalali_start(year, first_month), _jalali_start(year + 1, first_month))
+
+
+def periods_between(start: DateLike, end: DateLike, scheme: Optional[str] = None) -> List[Period]:
+    """
+    Get the periods overlapping the date range start..end (both inclusive)
+    
+    Args:
+        start: First date of the range
+        end: Last date of the range
+        scheme: Partition scheme (defaults to PARTITION_SCHEME)
+    
+    Returns:
+        list: Periods in chronological order (empty if end < start)
+    """
+    first = to_datetime(start)
+    last = to_datetime(end)
+    periods: List[Period] = []
+    period = period_of(first, scheme)
+    while period.start <= last:
+        periods.append(period)
+        period = period_of(period.end, scheme)
+    return periods
+
+
+def range_end(end: DateLike) -> datetime:
+    """
+    Exclusive upper bound of an inclusive range end
+    
+    A date (or a date-only string) includes the whole day; a datetime is
+    included up to that instant.
+    """
+    if isinstance(end, datetime):
+        return end + timedelta(microseconds=1)
+    if isinstance(end, str) and len(end.strip()) > 10:
+        return to_datetime(end) + timedelta(microseconds=1)
+    return to_datetime(end) + timedelta(days=1)
+
+
+def partition_column(model: Any) -> str:
+    """
+    Get the date column a model is partitioned by
+    
+    Raises:
+        ValueError: If the model has no partition column
+    """
+    column = PARTITION_COLUMNS.get(model.__tablename__)
+    if column is None:
+        raise ValueError(f"{model.__name__} has no partition date column")
+    return column
+
+
+def partition_criteria(model: Any, period: Period) -> List[Any]:
+    """SQL criteria selecting the rows of a model in a period"""
+    column = getattr(model, partition_column(model))
+    return [column >= period.start, column < period.end]
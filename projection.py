@@ -0,0 +1,78 @@
+"""
+Column projection helpers for query source tables.
+Lets define() declare which model columns execute() reads, so the runner
+loads lightweight rows instead of fully hydrated ORM entities.
+"""
+from typing import Any, List
+from types_definitions import ColumnsDict
+
+
+def reads(model: Any, *column_names: str) -> ColumnsDict:
+    """
+    Declare the columns of a model that a query reads
+    
+    Args:
+        model: Mapped model class (e.g. Transaction)
+        *column_names: Names of the mapped columns used by execute()
+    
+    Returns:
+        dict: Projection for a single model
+    
+    Raises:
+        ValueError: If no columns are given or a column does not exist on the model
+    
+    Example:
+        'columns': reads(Transaction, 'Id', 'Debit', 'Credit')
+    """
+    if not column_names:
+        raise ValueError(f"At least one column must be declared for {model.__name__}")
+    
+    table_columns = model.__table__.columns
+    for name in column_names:
+        if name not in table_columns:
+            raise ValueError(f"Column '{name}' does not exist on {model.__name__}")
+    
+    return {model.__name__: list(column_names)}
+
+
+def projection(*specs: ColumnsDict) -> ColumnsDict:
+    """
+    Merge projections of several models into one declaration
+    
+    Args:
+        *specs: Projections created with reads()
+    
+    Returns:
+        dict: Combined projection (model name -> column names)
+    
+    Example:
+        'columns': projection(
+            reads(CheckPayables, 'CheckNumber', 'CheckAmount'),
+            reads(CheckReceivables, 'CheckNumber', 'CheckAmount')
+        )
+    """
+    merged: ColumnsDict = {}
+    for spec in specs:
+        for model_name, column_names in spec.items():
+            target = merged.setdefault(model_name, [])
+            for name in column_names:
+                if name not in target:
+                    target.append(name)
+    return merged
+
+
+def projected_columns(model: Any, columns: ColumnsDict) -> List[Any]:
+    """
+    Get the mapped column attributes declared for a model
+    
+    Args:
+        model: Mapped model class
+        columns: Projection declared by define()
+    
+    Returns:
+        list: Column attributes to select, or empty list if the model is not projected
+    """
+    if not isinstance(model, type):
+        return []
+    names = columns.get(model.__name__, [])
+    return [getattr(model, name) for name in names]
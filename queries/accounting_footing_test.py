@@ -9,11 +9,15 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string, param_date
 from schema import col, schema
+from aggregation import count_rows, count_where, key, month_key, sum_of, year_key
+from filters import ge, gt, le
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
 from datetime import datetime
-from collections import defaultdict
+
+# جمع‌ها و شمارش‌های هر گروه
+MEASURES = ('debit_sum', 'credit_sum', 'debit_count', 'credit_count', 'total_count')
 
 
 def define() -> QueryDefinition:
@@ -49,59 +53,82 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     end_date_str = get_parameter('endDate')
     group_by = get_parameter('groupBy', 'AccountCode')
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    
-    # اعمال فیلتر تاریخی
+    # فیلتر تاریخی
+    where = []
     if start_date_str:
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            query = query.filter(Transaction.DocumentDate >= start_date)
+            where.append(ge('DocumentDate', start_date))
         except (ValueError, TypeError):
             pass
     
     if end_date_str:
         try:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            query = query.filter(Transaction.DocumentDate <= end_date)
+            where.append(le('DocumentDate', end_date))
         except (ValueError, TypeError):
             pass
     
-    results = query.all()
-    
-    # گروه‌بندی داده‌ها
-    groups = defaultdict(lambda: {
-        'debit_sum': 0.0,
-        'credit_sum': 0.0,
-        'debit_count': 0,
-        'credit_count': 0,
-        'total_count': 0
-    })
-    
-    for t in results:
-        # تعیین کلید گروه
-        group_key = ''
+    # کلید گروه‌بندی
+    if group_by == 'AccountCode':
+        keys = [key('AccountCode')]
+    elif group_by == 'DocumentType':
+        keys = [key('DocumentType')]
+    elif group_by == 'Date':
+        keys = [year_key('DocumentDate', 'Year'), month_key('DocumentDate', 'Month')]
+    else:
+        keys = []
+    
+    def group_of(values: Dict[str, Any]) -> str:
+        """تعیین کلید گروه (مقادیر خالی و NULL در یک گروه «نامشخص» قرار می‌گیرند)"""
         if group_by == 'AccountCode':
-            group_key = t.AccountCode or 'نامشخص'
-        elif group_by == 'DocumentType':
-            group_key = t.DocumentType or 'نامشخص'
-        elif group_by == 'Date':
-            group_key = t.DocumentDate.strftime('%Y-%m') if t.DocumentDate else 'نامشخص'
-        else:
-            group_key = 'همه'
-        
-        # محاسبه مبالغ
-        debit = float(t.Debit) if t.Debit else 0.0
-        credit = float(t.Credit) if t.Credit else 0.0
-        
-        groups[group_key]['debit_sum'] += debit
-        groups[group_key]['credit_sum'] += credit
-        groups[group_key]['total_count'] += 1
-        
-        if debit > 0:
-            groups[group_key]['debit_count'] += 1
-        if credit > 0:
-            groups[group_key]['credit_count'] += 1
+            return values['AccountCode'] or 'نامشخص'
+        if group_by == 'DocumentType':
+            return values['DocumentType'] or 'نامشخص'
+        if group_by == 'Date':
+            return f"{values['Year']:04d}-{values['Month']:02d}" if values['Year'] else 'نامشخص'
+        return 'همه'
+    
+    def merge(sign: int) -> Any:
+        """افزودن (یا کم کردن) جمع‌های جزئی هر گروه به وضعیت آزمون"""
+        def apply(state: Dict[str, Dict[str, Any]], rows: List[Dict[str, Any]]) -> None:
+            for values in rows:
+                totals = state.setdefault(group_of(values), dict.fromkeys(MEASURES, 0))
+                for name in MEASURES:
+                    totals[name] += sign * values[name]
+        return apply
+    
+    # جمع و شمارش هر گروه در دیتابیس (GROUP BY)، به صورت افزایشی: در هر اجرا فقط
+    # رکوردهای جدید جمع زده و جمع رکوردهای حذف‌شده کم می‌شود (incremental.py)
+    state = session.incremental(
+        'accounting_footing_test',
+        Transaction,
+        init=dict,
+        fold=merge(1),
+        unfold=merge(-1),
+        keys=keys,
+        measures=[
+            sum_of('Debit', 'debit_sum'),
+            sum_of('Credit', 'credit_sum'),
+            count_where(gt('Debit', 0), 'debit_count'),
+            count_where(gt('Credit', 0), 'credit_count'),
+            count_rows('total_count')
+        ],
+        where=where,
+        key=[start_date_str, end_date_str, group_by]
+    )
+    
+    groups = {
+        group_key: {
+            'debit_sum': float(values['debit_sum']),
+            'credit_sum': float(values['credit_sum']),
+            'debit_count': values['debit_count'],
+            'credit_count': values['credit_count'],
+            'total_count': values['total_count']
+        }
+        for group_key, values in sorted(state.items())
+        if values['total_count'] > 0
+    }
     
     # آماده‌سازی خروجی
     data = []
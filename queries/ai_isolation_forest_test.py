@@ -9,6 +9,8 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_number, param_string
 from schema import col, schema
+from projection import reads
+from filters import gt, param, where
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -47,7 +49,12 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Id', 'DocumentDate', 'AccountCode', 'Debit', 'Credit'),
+        'filters': where(
+            Transaction,
+            gt(param('columnName', 'Debit', choices=['Debit', 'Credit'], otherwise='Credit'), param('minAmount', 0))
+        )
     }
 
 
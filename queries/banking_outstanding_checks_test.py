@@ -9,6 +9,7 @@ from typing import List, Dict, Any
 from models import CheckPayables
 from parameters import param_number
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -33,7 +34,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(CheckPayables, 'DocumentPaymentDate', 'CheckNumber', 'CheckAmount', 'CheckDate', 'PayeeCode', 'PayeeName')
     }
 
 
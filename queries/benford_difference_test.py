@@ -8,6 +8,7 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -35,7 +36,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit')
     }
 
 
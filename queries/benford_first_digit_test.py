@@ -9,6 +9,8 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string, param_number
 from schema import col, schema
+from projection import reads
+from filters import gt, param, where
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -49,7 +51,9 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit'),
+        'filters': where(Transaction, gt(param('columnName', 'Debit', choices=['Debit', 'Credit']), 0))
     }
 
 
@@ -68,27 +72,47 @@ def get_first_digit(value: float) -> int:
     return int(abs_val)
 
 
+def count_digits(digit_counts: Counter, rows: List[Any]) -> None:
+    """افزودن رقم اول مقادیر مثبت (ستون اول رکوردها) به شمارش"""
+    for row in rows:
+        value = row[0]
+        if value and value > 0:
+            digit_counts[get_first_digit(value)] += 1
+
+
+def uncount_digits(digit_counts: Counter, rows: List[Any]) -> None:
+    """کم کردن رقم اول رکوردهای حذف‌شده از شمارش"""
+    removed: Counter = Counter()
+    count_digits(removed, rows)
+    digit_counts.subtract(removed)
+
+
 def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     """اجرای آزمون بنفورد رقم اول"""
     
     column_name = get_parameter('columnName', 'Debit')
     chi_threshold = get_parameter('chiSquareThreshold', 15.51)
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    results = query.all()
+    if column_name == 'Debit':
+        column = Transaction.Debit.key
+    elif column_name == 'Credit':
+        column = Transaction.Credit.key
+    else:
+        return []
     
-    # استخراج رقم اول
-    first_digits = []
-    for t in results:
-        if column_name == 'Debit' and t.Debit and t.Debit > 0:
-            first_digits.append(get_first_digit(t.Debit))
-        elif column_name == 'Credit' and t.Credit and t.Credit > 0:
-            first_digits.append(get_first_digit(t.Credit))
+    # شمارش فراوانی رقم اول به صورت افزایشی: فقط رکوردهای جدید از اجرای قبلی خوانده
+    # می‌شوند و رکوردهای حذف‌شده از شمارش کم می‌شوند (incremental.py)
+    digit_counts: Counter = session.incremental(
+        'benford_first_digit_test',
+        Transaction,
+        init=Counter,
+        fold=count_digits,
+        unfold=uncount_digits,
+        columns=[column],
+        key=[column]
+    )
     
-    # شمارش فراوانی
-    digit_counts = Counter(first_digits)
-    total_count = len(first_digits)
+    total_count = sum(digit_counts.values())
     
     if total_count == 0:
         return []
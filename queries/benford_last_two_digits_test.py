@@ -9,6 +9,8 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string, param_number
 from schema import col, schema
+from projection import reads
+from filters import gt, param, where
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -33,7 +35,9 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit'),
+        'filters': where(Transaction, gt(param('columnName', 'Debit', choices=['Debit', 'Credit']), 0))
     }
 
 
@@ -57,9 +61,8 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     column_name = get_parameter('columnName', 'Debit')
     deviation_threshold = get_parameter('deviationThreshold', 50)
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    results = query.all()
+    # دریافت داده‌ها (مسیر Core بدون ساخت موجودیت‌های ORM)
+    results = session.fetch(Transaction)
     
     # استخراج دو رقم آخر
     last_digits = []
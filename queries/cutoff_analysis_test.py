@@ -9,10 +9,12 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_date, param_number
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
 from datetime import datetime, timedelta
+import numpy as np
 
 
 def define() -> QueryDefinition:
@@ -38,7 +40,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Id', 'DocumentDate', 'AccountCode', 'Debit', 'Credit', 'Description')
     }
 
 
@@ -60,35 +63,35 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     start_date = year_end - timedelta(days=days_before)
     end_date = year_end + timedelta(days=days_after)
     
-    # دریافت تراکنش‌های در بازه
-    query = session.query(Transaction).filter(
-        Transaction.DocumentDate >= start_date,
-        Transaction.DocumentDate <= end_date
-    )
-    results = query.all()
+    # تراکنش‌های بازه از snapshot ستونی دوره‌ای: فقط دوره‌هایی که بازه را پوشش می‌دهند
+    # بارگذاری می‌شوند و هر روز بازه (شامل روز پایان) به طور کامل در نظر گرفته می‌شود
+    snapshot = session.snapshot(Transaction, start=start_date, end=end_date)
+    dates = snapshot.column('DocumentDate')
+    debits = np.nan_to_num(snapshot.column('Debit'))
+    credits = np.nan_to_num(snapshot.column('Credit'))
+    amounts = np.maximum(debits, credits)
+    
+    # فیلتر بر اساس حداقل مبلغ
+    selected = np.flatnonzero(~np.isnat(dates) & (amounts >= float(min_amount)))
+    
+    # فاصله روز سند از تاریخ برش
+    days_from_cutoff = (dates.astype('datetime64[D]') - np.datetime64(year_end, 'D')).astype(np.int64)
+    ids = snapshot.column('Id')
+    account_codes = snapshot.decode('AccountCode')
+    descriptions = snapshot.decode('Description')
     
     data = []
     
-    for t in results:
-        if not t.DocumentDate:
-            continue
-        
-        # محاسبه مبلغ
-        debit = float(t.Debit) if t.Debit else 0.0
-        credit = float(t.Credit) if t.Credit else 0.0
-        amount = max(debit, credit)
-        
-        # فیلتر بر اساس حداقل مبلغ
-        if amount < min_amount:
-            continue
-        
-        # محاسبه فاصله از تاریخ برش
-        days_diff = (t.DocumentDate - year_end).days
+    for index in selected:
+        debit = float(debits[index])
+        credit = float(credits[index])
+        amount = float(amounts[index])
+        days_diff = int(days_from_cutoff[index])
         
         # تعیین دوره
-        if t.DocumentDate < year_end:
+        if days_diff < 0:
             period = 'قبل از برش'
-        elif t.DocumentDate == year_end:
+        elif days_diff == 0:
             period = 'روز برش'
         else:
             period = 'بعد از برش'
@@ -104,10 +107,10 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
             risk_level = 'متوسط'
         
         row = {
-            'TransactionId': t.Id,
-            'Date': t.DocumentDate.strftime('%Y-%m-%d'),
-            'AccountCode': t.AccountCode or '',
-            'Description': t.Description or '',
+            'TransactionId': int(ids[index]),
+            'Date': str(dates[index].astype('datetime64[D]')),
+            'AccountCode': account_codes[index] or '',
+            'Description': descriptions[index] or '',
             'Debit': debit,
             'Credit': credit,
             'DaysFromCutoff': days_diff,
@@ -8,6 +8,7 @@ from typing import List, Dict, Any
 from models import CheckPayables, CheckReceivables
 from parameters import param_string, param_number
 from schema import col, schema
+from projection import reads, projection
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -34,7 +35,11 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': projection(
+            reads(CheckPayables, 'CheckNumber', 'CheckAmount', 'CheckDate', 'PayeeName'),
+            reads(CheckReceivables, 'CheckNumber', 'CheckAmount', 'CheckDate', 'DrawerName')
+        )
     }
 
 
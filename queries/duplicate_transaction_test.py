@@ -8,6 +8,7 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_number
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -34,7 +35,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Id', 'DocumentDate', 'DocumentNumber', 'AccountCode', 'Debit', 'Credit', 'Description')
     }
 
 
@@ -9,10 +9,11 @@ from typing import List, Dict, Any
 from models import PayrollTransactions
 from parameters import param_number
 from schema import col, schema
+from aggregation import count_rows, key, max_of, min_of, sum_of
+from filters import gt, ne, not_null
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
-from collections import defaultdict
 from datetime import datetime
 
 
@@ -44,36 +45,33 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     
     max_days = get_parameter('maxEmploymentDays', 90)
     
-    # دریافت داده‌ها از جدول PayrollTransactions
-    query = session.query(PayrollTransactions)
-    results = query.all()
-    
-    # گروه‌بندی بر اساس کارمند
-    employee_payments = defaultdict(lambda: {
-        'dates': [],
-        'amounts': []
-    })
-    
-    for t in results:
-        if t.EmployeeCode and t.NetPayment and t.NetPayment > 0:
-            if t.VoucherDate:
-                employee_payments[t.EmployeeCode]['dates'].append(t.VoucherDate)
-                employee_payments[t.EmployeeCode]['amounts'].append(float(t.NetPayment))
+    # اولین و آخرین پرداخت، تعداد و جمع پرداخت‌های هر کارمند در دیتابیس (GROUP BY)
+    result = session.aggregate(
+        PayrollTransactions,
+        keys=[key('EmployeeCode')],
+        measures=[
+            min_of('VoucherDate', 'first_date'),
+            max_of('VoucherDate', 'last_date'),
+            count_rows('payments'),
+            sum_of('NetPayment', 'amount')
+        ],
+        where=[ne('EmployeeCode', ''), gt('NetPayment', 0), not_null('VoucherDate')]
+    )
     
     # تحلیل کارکنان
     data = []
     
-    for emp_id, payments in employee_payments.items():
-        if payments['dates']:
-            dates = sorted(payments['dates'])
-            first_date = dates[0]
-            last_date = dates[-1]
+    for payments in result:
+        if payments['EmployeeCode']:
+            emp_id = payments['EmployeeCode']
+            first_date = payments['first_date']
+            last_date = payments['last_date']
             
             employment_days = (last_date - first_date).days
             
             if employment_days <= max_days:
-                total_payments = len(payments['amounts'])
-                total_amount = sum(payments['amounts'])
+                total_payments = payments['payments']
+                total_amount = float(payments['amount'])
                 avg_payment = total_amount / total_payments if total_payments > 0 else 0
                 
                 # تعیین سطح مشکوک بودن
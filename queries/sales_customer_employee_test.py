@@ -8,6 +8,7 @@ Customer-Employee Match Test
 from typing import List, Dict, Any
 from models import SalesTransactions, PayrollTransactions
 from schema import col, schema
+from projection import reads
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
 
@@ -29,7 +30,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(SalesTransactions, 'InvoiceNumber', 'InvoiceDate', 'CustomerCode', 'Amount')
     }
 
 
@@ -9,10 +9,11 @@ from typing import List, Dict, Any
 from models import SalesTransactions
 from parameters import param_string
 from schema import col, schema
+from aggregation import count_rows, key, sum_of
+from filters import ne, not_null
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
-from collections import defaultdict
 
 
 def define() -> QueryDefinition:
@@ -42,27 +43,26 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     
     analysis_type = get_parameter('analysisType', 'Customer')
     
-    # دریافت داده‌ها از جدول SalesTransactions
-    query = session.query(SalesTransactions)
-    results = query.all()
+    # تعیین ستون گروه‌بندی بر اساس نوع تحلیل
+    if analysis_type == 'Customer':
+        entity_column = 'CustomerCode'
+    elif analysis_type == 'Item':
+        entity_column = 'ItemCode'
+    else:
+        return []
     
-    # گروه‌بندی بر اساس نوع تحلیل
-    entity_sales = defaultdict(lambda: {'amount': 0, 'count': 0})
+    # جمع مبلغ و تعداد هر مشتری/کالا در دیتابیس (GROUP BY)
+    result = session.aggregate(
+        SalesTransactions,
+        keys=[key(entity_column, 'entity_id')],
+        measures=[sum_of('Amount', 'amount'), count_rows('count')],
+        where=[not_null(entity_column), ne(entity_column, '')]
+    )
     
-    for t in results:
-        entity_id = None
-        
-        if analysis_type == 'Customer':
-            entity_id = t.CustomerCode
-        elif analysis_type == 'Item':
-            entity_id = t.ItemCode
-        
-        if entity_id:
-            # استفاده از Amount که در SalesTransactions موجود است
-            amount = float(t.Amount) if t.Amount else 0
-            
-            entity_sales[entity_id]['amount'] += amount
-            entity_sales[entity_id]['count'] += 1
+    entity_sales = {
+        row['entity_id']: {'amount': float(row['amount']), 'count': row['count']}
+        for row in result
+    }
     
     if not entity_sales:
         return []
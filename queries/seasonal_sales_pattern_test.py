@@ -13,10 +13,13 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_select, param_number
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
+from filters import gt, not_null
 from database import ReadOnlySession
 from collections import defaultdict
+from decimal import Decimal
 import statistics
 
 
@@ -50,7 +53,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'DocumentDate', 'Credit')
     }
 
 
@@ -63,20 +67,20 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     seasonal_period = int(get_parameter('seasonalPeriod', 12))
     limit = get_parameter('limit', 100)
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    results = query.all()
+    # دریافت داده‌ها به صورت DataFrame (مسیر Core، بدون اشیای ORM)
+    # مبالغ به ریز واحد (سنت) صحیح تا جمع ماهانه دقیق بماند
+    frame = session.load_frame(
+        Transaction, ['DocumentDate', 'Credit'],
+        filters=[not_null('DocumentDate'), gt('Credit', 0)],
+        numeric='minor'
+    )
     
     # گروه‌بندی بر اساس دوره
-    period_sales = defaultdict(lambda: {'amount': 0, 'count': 0})
-    
-    for t in results:
-        if t.DocumentDate:
-            period = t.DocumentDate.strftime('%Y-%m')
-            
-            if t.Credit and t.Credit > 0:
-                period_sales[period]['amount'] += t.Credit
-                period_sales[period]['count'] += 1
+    monthly = frame.groupby(frame['DocumentDate'].dt.strftime('%Y-%m'))['Credit'].agg(['sum', 'count'])
+    period_sales = {
+        period: {'amount': Decimal(int(row['sum'])).scaleb(-2), 'count': int(row['count'])}
+        for period, row in monthly.iterrows()
+    }
     
     if len(period_sales) < seasonal_period:
         return []
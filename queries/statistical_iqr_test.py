@@ -9,6 +9,7 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_number, param_string
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -35,7 +36,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit')
     }
 
 
@@ -45,9 +47,8 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     column_name = get_parameter('columnName', 'Debit')
     iqr_multiplier = get_parameter('iqrMultiplier', 1.5)
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    results = query.all()
+    # دریافت داده‌ها (مسیر Core، مبالغ به صورت float در خود SQL تبدیل می‌شوند)
+    results = session.fetch(Transaction, numeric='float')
     
     # استخراج مقادیر
     amounts = []
@@ -13,6 +13,7 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string, param_number, param_select
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -51,7 +52,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Id', 'DocumentDate', 'DocumentNumber', 'AccountCode', 'Debit', 'Credit', 'Description')
     }
 
 
@@ -63,8 +65,8 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     limit_method = get_parameter('limitMethod', 'mean-based')
     limit = get_parameter('limit', 100)
     
-    query = session.query(Transaction)
-    results = query.all()
+    # دریافت داده‌ها (مسیر Core، مبالغ به صورت float در خود SQL تبدیل می‌شوند)
+    results = session.fetch(Transaction, numeric='float')
     
     # استخراج مبالغ
     amounts = []
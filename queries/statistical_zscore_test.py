@@ -9,10 +9,11 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_number, param_string
 from schema import col, schema
+from projection import reads
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
-import statistics
+import numpy as np
 
 
 def define() -> QueryDefinition:
@@ -33,7 +34,8 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit')
     }
 
 
@@ -43,47 +45,36 @@ def execute(session: ReadOnlySession) -> List[Dict[str, Any]]:
     column_name = get_parameter('columnName', 'Debit')
     z_threshold = get_parameter('zScoreThreshold', 3.0)
     
-    # دریافت داده‌ها
-    query = session.query(Transaction)
-    results = query.all()
-    
-    # استخراج مقادیر
-    amounts = []
-    transaction_map = {}
-    
-    for t in results:
-        amount = t.Debit if column_name == 'Debit' else t.Credit
-        if amount and amount > 0:
-            amounts.append(amount)
-            transaction_map[amount] = t
+    # خواندن ستون مبلغ از snapshot ستونی مشترک جدول تراکنش‌ها
+    snapshot = session.snapshot(Transaction)
+    values = snapshot.column('Debit' if column_name == 'Debit' else 'Credit')
+    amounts = values[values > 0]
     
     if len(amounts) < 2:
         return []
     
     # محاسبه میانگین و انحراف معیار
-    mean = float(statistics.mean(amounts))
-    stdev = float(statistics.stdev(amounts))
+    mean = float(np.mean(amounts))
+    stdev = float(np.std(amounts, ddof=1))
     
     if stdev == 0:
         return []
     
     # یافتن اقلام با Z-Score بالا
+    z_scores = (amounts - mean) / stdev
+    outliers = np.abs(z_scores) >= z_threshold
+    
     data = []
-    for amount in amounts:
-        amount_float = float(amount)
-        z_score = (amount_float - mean) / stdev
-        
-        if abs(z_score) >= z_threshold:
-            t = transaction_map[amount]
-            row = {
-                'TransactionID': str(t.TransactionID) if hasattr(t, 'TransactionID') else '',
-                'Amount': round(amount_float, 2),
-                'ZScore': round(z_score, 4),
-                'Mean': round(mean, 2),
-                'StdDev': round(stdev, 2),
-                'DeviationFromMean': round(amount_float - mean, 2)
-            }
-            data.append(row)
+    for amount, z_score in zip(amounts[outliers], z_scores[outliers]):
+        row = {
+            'TransactionID': '',
+            'Amount': round(float(amount), 2),
+            'ZScore': round(float(z_score), 4),
+            'Mean': round(mean, 2),
+            'StdDev': round(stdev, 2),
+            'DeviationFromMean': round(float(amount) - mean, 2)
+        }
+        data.append(row)
     
     # مرتب‌سازی بر اساس Z-Score
     data.sort(key=lambda x: abs(x['ZScore']), reverse=True)
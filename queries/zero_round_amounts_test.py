@@ -9,6 +9,8 @@ from typing import List, Dict, Any
 from models import Transaction
 from parameters import param_string, param_number
 from schema import col, schema
+from projection import reads
+from filters import ge, param, where
 from query_runner import get_parameter
 from types_definitions import QueryDefinition
 from database import ReadOnlySession
@@ -31,7 +33,12 @@ def define() -> QueryDefinition:
     
     return {
         'parameters': parameters,
-        'schema': result_schema
+        'schema': result_schema,
+        'columns': reads(Transaction, 'Debit', 'Credit'),
+        'filters': where(
+            Transaction,
+            ge(param('columnName', 'Debit', choices=['Debit', 'Credit'], otherwise='Credit'), param('minAmount', 1000.0))
+        )
     }
 
 
@@ -8,12 +8,17 @@ import json
 import sys
 import argparse
 from typing import Tuple, Any, Optional, Dict
-from database import get_db, db
+from database import get_db, db, ReadOnlySession
+from filters import resolve_filters
 from output import display_table, display_parameters_only
+from types_definitions import QueryDefinition
 
 # Input parameters passed from command line (as JSON string)
 INPUT_PARAMETERS: Optional[Dict[str, Any]] = None
 
+# Tenant (company database) selected with --tenant; None = CONNECTION_STRING
+TENANT: Optional[str] = None
+
 
 def parse_arguments() -> Tuple[str, bool]:
     """
@@ -22,7 +27,7 @@ def parse_arguments() -> Tuple[str, bool]:
     Returns:
         tuple: (query_name, get_parameters_only)
     """
-    global INPUT_PARAMETERS
+    global INPUT_PARAMETERS, TENANT
     
     parser = argparse.ArgumentParser(description='SQL Server Query Runner')
     parser.add_argument('--get-parameters', action='store_true', 
@@ -31,12 +36,15 @@ def parse_arguments() -> Tuple[str, bool]:
                        help='Query name to execute (filename without .py)')
     parser.add_argument('--list-queries', action='store_true',
                        help='List all available queries')
+    parser.add_argument('--tenant', type=str, default=None,
+                       help='Tenant (company) database to run against (see TENANT_CONNECTION_STRINGS)')
     parser.add_argument('params', nargs='?', default=None,
                        help='JSON string with parameter values')
     
     args = parser.parse_args()
     
     get_parameters_only = args.get_parameters
+    TENANT = args.tenant
     
     # Handle list queries
     if args.list_queries:
@@ -69,6 +77,60 @@ def get_parameter(key: str, default: Any = None) -> Any:
     return INPUT_PARAMETERS.get(key, default) if INPUT_PARAMETERS else default
 
 
+def open_session(definitions: Optional[QueryDefinition], tenant: Optional[str] = None) -> ReadOnlySession:
+    """
+    Open a read-only session for running a query
+    
+    Applies the source columns ('columns'), row predicates ('filters') and
+    transaction isolation level ('isolation_level') declared by the query's define(). Filter parameters are resolved from
+    the current INPUT_PARAMETERS, so set them before calling this.
+    
+    Args:
+        definitions: Result of the query's define(), or None
+        tenant: Tenant whose database to read (see tenants.py); None = CONNECTION_STRING
+        
+    Returns:
+        ReadOnlySession: Read-only SQLAlchemy session wrapper
+    
+    Raises:
+        ValueError: If the tenant is invalid or not configured
+    """
+    if tenant:
+        from tenants import database_for
+        open_db = database_for(tenant).get_session
+    else:
+        open_db = get_db
+    
+    if not definitions:
+        return open_db()
+    return open_db(
+        columns=definitions.get('columns'),
+        filters=resolve_filters(definitions.get('filters'), get_parameter),
+        isolation_level=definitions.get('isolation_level')
+    )
+
+
+async def open_async_session(definitions: Optional[QueryDefinition]) -> Any:
+    """
+    Open an async read-only session for running a query (see open_session)
+    
+    Args:
+        definitions: Result of the query's define(), or None
+        
+    Returns:
+        AsyncReadOnlySession: Async read-only session wrapper
+    """
+    from async_database import async_db
+    
+    if not definitions:
+        return await async_db.get_session()
+    return await async_db.get_session(
+        columns=definitions.get('columns'),
+        filters=resolve_filters(definitions.get('filters'), get_parameter),
+        isolation_level=definitions.get('isolation_level')
+    )
+
+
 def list_available_queries() -> None:
     """
     List all available query files in the queries folder
@@ -137,7 +199,8 @@ def load_and_execute_query(query_name: str, get_parameters_only: bool = False) -
             # Execute the query
             if hasattr(query_module, 'execute'):
                 # Create session and pass to execute
-                session = get_db()
+                # (with the source columns and row filters declared in define(), if any)
+                session = open_session(definitions, TENANT)
                 try:
                     # Execute returns data only
                     data = query_module.execute(session)
@@ -175,7 +238,16 @@ def main() -> None:
     # If only getting parameters, skip connection test
     if not get_parameters_only:
         # Test database connection first
-        if not db.test_connection():
+        if TENANT:
+            from tenants import database_for
+            try:
+                database = database_for(TENANT)
+            except ValueError as e:
+                print(json.dumps({"error": str(e)}, indent=2, ensure_ascii=False))
+                return
+        else:
+            database = db
+        if not database.test_connection():
             print(json.dumps({"error": "Cannot connect to database"}, indent=2, ensure_ascii=False))
             return
     
@@ -0,0 +1,324 @@
+"""
+Cache of test results keyed by test, parameters and data version.
+A test's result is stored under a key made of the test id, its canonicalised
+input parameters, the tenant and the data version tokens (data_version.py) of
+the tables it reads, so a re-run with the same parameters on unchanged data
+(e.g. an export right after a run) returns the stored result instead of
+executing the test again. Any write to an input table changes its token and
+therefore the key; so does any edit of the test's source file (e.g. by the
+fix-test-error flow), and keys also change daily, as some tests measure ages
+against today.
+
+Two tiers, each a size-bounded LRU:
+- memory: pickled results in the process (RESULT_CACHE_MEMORY_MB)
+- disk:   one pickle file per result in RESULT_CACHE_DIR (RESULT_CACHE_DISK_MB),
+          shared by all processes on the host
+
+Tests whose results are not reproducible (e.g. random samples) can opt out
+with 'cache': False in define().
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import Config
+from data_version import data_versions, versioned_models
+
+FILE_SUFFIX = '.result'
+
+# Source file -> (mtime_ns, size, digest), so unchanged files are hashed once
+_source_digests: Dict[str, Any] = {}
+
+
+def input_models(module: Any, definitions: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """
+    Get the tables a test reads
+    
+    Args:
+        module: Query module
+        definitions: Result of the module's define(), or None
+    
+    Returns:
+        list: Mapped models the module imports or declares columns of; every
+              model if none can be found
+    """
+    models = {model.__name__: model for model in versioned_models()}
+    names = set((definitions or {}).get('columns') or {})
+    names.update(name for name, value in vars(module).items() if isinstance(value, type) and models.get(name) is value)
+    found = [models[name] for name in sorted(names) if name in models]
+    return found or list(models.values())
+
+
+def module_version(module: Any) -> Optional[str]:
+    """
+    Version of a test's code: digest of its source file
+    
+    The same in every process, and changed by any edit of the file, so results
+    of a rewritten and reloaded test are not served from the cache.
+    
+    Args:
+        module: Query module
+    
+    Returns:
+        str: Hex digest, or None for a module without a source file
+    """
+    path = getattr(module, '__file__', None)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+        entry = _source_digests.get(path)
+        if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, 'rb') as handle:
+                entry = (stat.st_mtime_ns, stat.st_size, hashlib.sha256(handle.read()).hexdigest())
+            _source_digests[path] = entry
+        return entry[2]
+    except OSError:
+        return None
+
+
+def result_key(
+    test_id: str,
+    parameters: Optional[Dict[str, Any]],
+    versions: Dict[str, str],
+    tenant: Optional[str] = None,
+    code: Optional[str] = None
+) -> str:
+    """
+    Cache key of a test run
+    
+    Args:
+        test_id: Test id
+        parameters: Input parameters (key order and empty values don't matter)
+        versions: Table name -> data version token of the test's input tables
+        tenant: Tenant database of the run
+        code: Version of the test's code (module_version)
+    
+    Returns:
+        str: Hex digest
+    """
+    canonical = {key: value for key, value in (parameters or {}).items() if value not in (None, '')}
+    # Tests measuring ages against today (e.g. outstanding checks) change daily
+    material = json.dumps(
+        [test_id, tenant, code, canonical, sorted(versions.items()), date.today().isoformat()],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory, disk) LRU cache of test results"""
+    
+    def __init__(
+        self,
+        memory_bytes: Optional[int] = None,
+        directory: Optional[str] = None,
+        disk_bytes: Optional[int] = None
+    ) -> None:
+        """
+        Initialize the cache
+        
+        Args:
+            memory_bytes: Size limit of the memory tier (default: RESULT_CACHE_MEMORY_MB, 0 = no memory tier)
+            directory: Directory of the disk tier (default: RESULT_CACHE_DIR, empty = no disk tier)
+            disk_bytes: Size limit of the disk tier (default: RESULT_CACHE_DISK_MB)
+        """
+        self.memory_bytes = memory_bytes if memory_bytes is not None else Config.RESULT_CACHE_MEMORY_MB * 1024 * 1024
+        self.disk_bytes = disk_bytes if disk_bytes is not None else Config.RESULT_CACHE_DISK_MB * 1024 * 1024
+        cache_dir = directory if directory is not None else Config.RESULT_CACHE_DIR
+        self.directory = Path(cache_dir) if cache_dir else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0,
+            'memory_evictions': 0, 'disk_evictions': 0
+        }
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether any tier is configured"""
+        return self.memory_bytes > 0 or self.directory is not None
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}{FILE_SUFFIX}'
+    
+    def get(self, key: str) -> Any:
+        """
+        Get a cached result
+        
+        Returns:
+            The result (a fresh copy), or None on a miss
+        """
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return pickle.loads(payload)
+        
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                payload = path.read_bytes()
+                # Mark as recently used for the disk LRU
+                os.utime(path)
+            except FileNotFoundError:
+                payload = None
+            if payload is not None:
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                self._remember(key, payload)
+                return pickle.loads(payload)
+        
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+    
+    def put(self, key: str, result: Any) -> None:
+        """Store a result in every tier (results that cannot be pickled are not cached)"""
+        try:
+            payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        with self._lock:
+            self.stats['stores'] += 1
+        self._remember(key, payload)
+        if self.directory is not None and len(payload) <= self.disk_bytes:
+            path = self._path(key)
+            temp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            temp.write_bytes(payload)
+            os.replace(temp, path)
+            self._evict_disk()
+    
+    def _remember(self, key: str, payload: bytes) -> None:
+        """Add a payload to the memory tier, evicting least recently used results"""
+        if len(payload) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = payload
+            self._memory_size += len(payload)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self.stats['memory_evictions'] += 1
+    
+    def _evict_disk(self) -> None:
+        """Remove the least recently used files until the disk tier fits its limit"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(FILE_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.stats['disk_evictions'] += 1
+    
+    def clear(self) -> None:
+        """Remove every cached result from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.directory is not None:
+            for path in self.directory.glob(f'*{FILE_SUFFIX}'):
+                path.unlink(missing_ok=True)
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+        
+        Returns:
+            dict: Hit/miss counters, hit ratio and tier sizes
+        """
+        with self._lock:
+            status: Dict[str, Any] = {
+                **self.stats,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'memory_limit_bytes': self.memory_bytes
+            }
+        lookups = status['memory_hits'] + status['disk_hits'] + status['misses']
+        status['hit_ratio'] = round((status['memory_hits'] + status['disk_hits']) / lookups, 3) if lookups else None
+        if self.directory is not None:
+            files = list(self.directory.glob(f'*{FILE_SUFFIX}'))
+            status.update({
+                'directory': str(self.directory),
+                'disk_entries': len(files),
+                'disk_bytes': sum(path.stat().st_size for path in files if path.exists()),
+                'disk_limit_bytes': self.disk_bytes
+            })
+        return status
+
+
+# Global result cache of the process
+results = ResultCache()
+
+
+def execute_cached(
+    test_id: str,
+    module: Any,
+    session: Any,
+    parameters: Optional[Dict[str, Any]] = None,
+    tenant: Optional[str] = None,
+    versions: Optional[Dict[str, str]] = None,
+    cache: Optional[ResultCache] = None
+) -> Any:
+    """
+    Run a test's execute(session), or return its cached result
+    
+    Args:
+        test_id: Test id
+        module: Query module
+        session: Read-only session of the test (also used for the version check)
+        parameters: Input parameters of the run
+        tenant: Tenant database of the session
+        versions: Optional table name -> token memo shared by the tests of one run,
+                  so each table is version-checked once per run
+        cache: Cache to use (default: the global cache)
+    
+    Returns:
+        The test's results
+    """
+    cache = cache or results
+    definitions = module.define() if hasattr(module, 'define') else None
+    if not cache.enabled or (definitions or {}).get('cache') is False:
+        return module.execute(session)
+    
+    memo = versions if versions is not None else {}
+    tokens: Dict[str, str] = {}
+    for model in input_models(module, definitions):
+        name = model.__tablename__
+        if name not in memo:
+            memo[name] = data_versions.token(session, model)
+        tokens[name] = memo[name]
+    
+    key = result_key(test_id, parameters, tokens, tenant, module_version(module))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = module.execute(session)
+    cache.put(key, result)
+    return result
@@ -0,0 +1,293 @@
+"""
+Columnar snapshots shared between processes.
+A snapshot published to the store is written once as one .npy file per
+column (plus dictionary and NULL-mask files) and opened by every process with
+np.load(mmap_mode='r'), so all web workers and process-pool executors use
+read-only, zero-copy views of one physical copy in the OS page cache. Put
+SHARED_SNAPSHOT_DIR on a RAM-backed file system (e.g. /dev/shm) to keep
+it off disk.
+
+Layout:
+    <SHARED_SNAPSHOT_DIR>/<snapshot key>/<token digest>/
+        meta.json                 model name and data version token
+        <column>.npy              values (codes for dictionary-encoded columns)
+        <column>.categories.npy   distinct values of a dictionary-encoded column
+        <column>.nulls.npy        NULL mask of an int/bool column
+        refs/<pid>                one reference file per process using the version
+        .publish.lock             held (O_EXCL) by the one process building the version
+
+Files are written to a temporary name and renamed into place, so readers
+never see partial columns; while one process builds a version, the others
+wait on its publish lock and then map the published files. A version without live references (reference
+files of exited processes are ignored) is removed by collect(), except the
+newest version of each key.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from config import Config
+from snapshot import ColumnarSnapshot
+
+META_FILE = 'meta.json'
+REFS_DIR = 'refs'
+LOCK_FILE = '.publish.lock'
+
+# Seconds to wait for another process to publish a version before giving up
+PUBLISH_LOCK_TIMEOUT = 600
+
+
+def _safe_name(key: str) -> str:
+    """Directory name of a snapshot key (e.g. 'Transaction@month:2024-03')"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+
+def _process_alive(pid: int) -> bool:
+    """Check whether a process holding a reference still runs"""
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows; keep its references
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_array(path: Path) -> np.ndarray:
+    """Memory-map a .npy file read-only (empty arrays cannot be mapped)"""
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        return np.load(path, allow_pickle=False)
+
+
+class SharedSnapshotStore:
+    """Memory-mapped snapshot files shared by all processes on the host"""
+    
+    def __init__(self, directory: Optional[str] = None) -> None:
+        """
+        Initialize the store
+        
+        Args:
+            directory: Store directory (default: Config.SHARED_SNAPSHOT_DIR)
+        
+        Raises:
+            ValueError: If no directory is configured
+        """
+        store_dir = directory or Config.SHARED_SNAPSHOT_DIR
+        if not store_dir:
+            raise ValueError("SHARED_SNAPSHOT_DIR is not configured")
+        self.directory = Path(store_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._references: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {'published': 0, 'attached': 0, 'collected': 0}
+        atexit.register(self.release_all)
+    
+    def version_dir(self, key: str, token: str) -> Path:
+        """Directory of one data version of a snapshot key"""
+        digest = hashlib.sha1(token.encode('utf-8')).hexdigest()[:20]
+        return self.directory / _safe_name(key) / digest
+    
+    def _ref_path(self, key: str, token: str) -> Path:
+        return self.version_dir(key, token) / REFS_DIR / str(os.getpid())
+    
+    def acquire(self, key: str, token: str) -> None:
+        """Register this process as a user of a version (idempotent)"""
+        path = self._ref_path(key, token)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        with self._lock:
+            self._references.add((key, token))
+    
+    def release(self, key: str, token: str) -> None:
+        """
+        Drop this process's reference to a version and collect unused versions of the key
+        
+        Mapped arrays stay valid after their files are removed (POSIX).
+        """
+        self._ref_path(key, token).unlink(missing_ok=True)
+        with self._lock:
+            self._references.discard((key, token))
+        self.collect(key)
+    
+    def release_all(self) -> None:
+        """Drop every reference held by this process"""
+        with self._lock:
+            references = list(self._references)
+        for key, token in references:
+            self._ref_path(key, token).unlink(missing_ok=True)
+        with self._lock:
+            self._references.clear()
+    
+    def attach(self, key: str, token: str, columns: Sequence[str]) -> Optional[ColumnarSnapshot]:
+        """
+        Open a published version as a snapshot of memory-mapped arrays
+        
+        Args:
+            key: Snapshot key (model name, or model and period partition)
+            token: Data version token
+            columns: Columns that must be present
+        
+        Returns:
+            ColumnarSnapshot with every published column of the version, or None
+            if the version or one of the columns is not published
+        """
+        path = self.version_dir(key, token)
+        if not all((path / f'{name}.npy').exists() for name in columns):
+            return None
+        
+        self.acquire(key, token)
+        try:
+            meta = json.loads((path / META_FILE).read_text(encoding='utf-8'))
+            if meta['token'] != token:
+                raise ValueError("token digest collision")
+            
+            arrays: Dict[str, np.ndarray] = {}
+            categories: Dict[str, np.ndarray] = {}
+            nulls: Dict[str, np.ndarray] = {}
+            for file in path.glob('*.npy'):
+                name, _, suffix = file.name[:-len('.npy')].partition('.')
+                if suffix == 'categories':
+                    # Dictionaries are small; decoding needs object values
+                    categories[name] = np.load(file, allow_pickle=False).astype(object)
+                elif suffix == 'nulls':
+                    nulls[name] = _load_array(file)
+                elif not suffix:
+                    arrays[name] = _load_array(file)
+        except (FileNotFoundError, KeyError, ValueError):
+            # Collected or partly published by another process
+            self.release(key, token)
+            return None
+        
+        self.stats['attached'] += 1
+        return ColumnarSnapshot(meta['model_name'], token, arrays, categories, nulls)
+    
+    @contextmanager
+    def publishing(self, key: str, token: str) -> Iterator[None]:
+        """
+        Hold the publish lock of a version (one builder per version across processes)
+        
+        A lock left by an exited process is taken over.
+        
+        Raises:
+            TimeoutError: If another process holds the lock longer than PUBLISH_LOCK_TIMEOUT
+        """
+        path = self.version_dir(key, token)
+        path.mkdir(parents=True, exist_ok=True)
+        lock = path / LOCK_FILE
+        deadline = time.monotonic() + PUBLISH_LOCK_TIMEOUT
+        while True:
+            try:
+                descriptor = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    owner = int(lock.read_text() or 0)
+                except (OSError, ValueError):
+                    owner = 0
+                if owner and not _process_alive(owner):
+                    lock.unlink(missing_ok=True)
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for snapshot {key} to be published")
+                time.sleep(0.05)
+                continue
+            os.write(descriptor, str(os.getpid()).encode('ascii'))
+            os.close(descriptor)
+            break
+        try:
+            yield
+        finally:
+            lock.unlink(missing_ok=True)
+    
+    def publish(self, key: str, snapshot: ColumnarSnapshot) -> None:
+        """
+        Write the columns of a snapshot that are not published yet
+        
+        Call inside publishing(key, snapshot.token), so a column's dictionary
+        and codes always come from the same build.
+        """
+        path = self.version_dir(key, snapshot.token)
+        path.mkdir(parents=True, exist_ok=True)
+        if not (path / META_FILE).exists():
+            meta = {'model_name': snapshot.model_name, 'token': snapshot.token}
+            self._write_bytes(path / META_FILE, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        
+        for name in snapshot.columns:
+            target = path / f'{name}.npy'
+            if target.exists():
+                continue
+            # Dictionary and NULL mask first: a present value file implies a complete column
+            if snapshot.is_encoded(name):
+                self._write_array(path / f'{name}.categories.npy', snapshot.categories(name).astype(str))
+            mask = snapshot.null_mask(name)
+            if mask is not None:
+                self._write_array(path / f'{name}.nulls.npy', mask)
+            self._write_array(target, np.asarray(snapshot.column(name)))
+        self.stats['published'] += 1
+    
+    @staticmethod
+    def _temp_path(target: Path) -> Path:
+        return target.with_name(f'.{target.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    
+    def _write_array(self, target: Path, values: np.ndarray) -> None:
+        """Write an array to a temporary file and rename it into place"""
+        temp = self._temp_path(target)
+        with open(temp, 'wb') as handle:
+            np.save(handle, values, allow_pickle=False)
+        os.replace(temp, target)
+    
+    def _write_bytes(self, target: Path, content: bytes) -> None:
+        temp = self._temp_path(target)
+        temp.write_bytes(content)
+        os.replace(temp, target)
+    
+    def _live_references(self, version: Path) -> int:
+        """Count references of running processes, removing those of exited ones"""
+        live = 0
+        refs = version / REFS_DIR
+        if not refs.exists():
+            return 0
+        for ref in refs.iterdir():
+            if ref.name.isdigit() and not _process_alive(int(ref.name)):
+                ref.unlink(missing_ok=True)
+            else:
+                live += 1
+        return live
+    
+    def collect(self, key: Optional[str] = None) -> int:
+        """
+        Remove versions no running process references (the newest version of each key is kept)
+        
+        Args:
+            key: Snapshot key to collect, or None for all keys
+        
+        Returns:
+            int: Number of removed versions
+        """
+        key_dirs = [self.directory / _safe_name(key)] if key else [p for p in self.directory.iterdir() if p.is_dir()]
+        removed = 0
+        for key_dir in key_dirs:
+            if not key_dir.is_dir():
+                continue
+            versions: List[Path] = sorted(
+                (p for p in key_dir.iterdir() if (p / META_FILE).exists()),
+                key=lambda p: (p / META_FILE).stat().st_mtime
+            )
+            for version in versions[:-1]:
+                if self._live_references(version) == 0:
+                    shutil.rmtree(version, ignore_errors=True)
+                    removed += 1
+        self.stats['collected'] += removed
+        return removed
@@ -0,0 +1,586 @@
+"""
+Shared in-process columnar snapshots of audited tables.
+A snapshot holds selected columns of a table as NumPy arrays, keyed by the
+table's data version token, so every test in a run (and later runs, until the
+data changes) reads the same arrays instead of re-querying the database.
+
+String columns are dictionary encoded: an int32 code array plus the array of
+distinct values (code -1 marks NULL).
+
+When DATA_CACHE_DIR is configured, snapshots are built from the on-disk
+columnar cache (table_cache.py) instead of querying the database. When
+SHARED_SNAPSHOT_DIR is configured, snapshots are published as memory-mapped
+files (shared_snapshot.py) and every process maps the same copy.
+
+Date-bounded reads use period partitions (periods.py): each month / fiscal
+year of a table is a separate snapshot with its own version token, so a test
+over one year loads and re-validates only that year's partitions, and a change
+in one period reloads only that period.
+
+Sessions of a tenant database (tenants.py) use their own snapshots, keyed
+'<tenant>/<key>', and their own subdirectory of the table cache.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, false, func
+from config import Config
+from data_version import partition_versions, table_version
+from periods import DateLike, partition_column, partition_criteria, periods_between, range_end, scheme_name, to_datetime
+from projection import projected_columns, reads
+
+
+# Rows fetched from the cursor per round trip while loading a snapshot
+LOAD_BATCH_SIZE = 50000
+
+
+def column_kind(column: Any) -> str:
+    """Classify a mapped column by how it is stored in a snapshot"""
+    col_type = column.type
+    if isinstance(col_type, Boolean):
+        return 'bool'
+    if isinstance(col_type, (DateTime, Date)):
+        return 'datetime'
+    if isinstance(col_type, (Numeric, Float)):
+        return 'float'
+    if isinstance(col_type, Integer):
+        return 'int'
+    return 'string'
+
+
+class ColumnarSnapshot:
+    """Column arrays of one table at one data version"""
+    
+    def __init__(
+        self,
+        model_name: str,
+        token: str,
+        arrays: Dict[str, np.ndarray],
+        categories: Dict[str, np.ndarray],
+        nulls: Dict[str, np.ndarray]
+    ) -> None:
+        """
+        Initialize snapshot
+        
+        Args:
+            model_name: Mapped model class name
+            token: Data version token the snapshot was built at
+            arrays: Column name -> values (codes for dictionary-encoded columns)
+            categories: Column name -> distinct values of dictionary-encoded columns
+            nulls: Column name -> NULL mask (only for int/bool columns containing NULLs)
+        """
+        self.model_name = model_name
+        self.token = token
+        self._arrays = arrays
+        self._categories = categories
+        self._nulls = nulls
+    
+    def __len__(self) -> int:
+        if not self._arrays:
+            return 0
+        return len(next(iter(self._arrays.values())))
+    
+    @property
+    def columns(self) -> List[str]:
+        """Names of the columns held by the snapshot"""
+        return list(self._arrays)
+    
+    def has_columns(self, names: Sequence[str]) -> bool:
+        """Check whether all given columns are held by the snapshot"""
+        return all(name in self._arrays for name in names)
+    
+    def column(self, name: str) -> np.ndarray:
+        """
+        Get the array of a column
+        
+        Numeric columns are float64 (NaN for NULL), dates are datetime64 (NaT for NULL)
+        and string columns return their int32 dictionary codes (-1 for NULL).
+        """
+        return self._arrays[name]
+    
+    def is_encoded(self, name: str) -> bool:
+        """Check whether a column is dictionary encoded"""
+        return name in self._categories
+    
+    def categories(self, name: str) -> np.ndarray:
+        """Get the distinct values of a dictionary-encoded column"""
+        return self._categories[name]
+    
+    def null_mask(self, name: str) -> Optional[np.ndarray]:
+        """Get the NULL mask of an int/bool column, or None if it has no NULLs"""
+        return self._nulls.get(name)
+    
+    def decode(self, name: str) -> np.ndarray:
+        """
+        Get the values of a column as an object array (decoding strings)
+        
+        Returns:
+            np.ndarray: Values with None for NULL strings
+        """
+        values = self._arrays[name]
+        if name not in self._categories:
+            return values
+        lookup = np.append(self._categories[name].astype(object), None)
+        return lookup[values]
+    
+    def filter(self, mask: np.ndarray) -> 'ColumnarSnapshot':
+        """
+        Get a new snapshot with the rows selected by a boolean mask
+        
+        Dictionaries of encoded columns are shared with this snapshot.
+        """
+        return ColumnarSnapshot(
+            self.model_name,
+            self.token,
+            {name: values[mask] for name, values in self._arrays.items()},
+            dict(self._categories),
+            {name: values[mask] for name, values in self._nulls.items()}
+        )
+
+
+def concat_snapshots(model_name: str, parts: Sequence[ColumnarSnapshot]) -> ColumnarSnapshot:
+    """
+    Concatenate snapshots of the same columns (e.g. period partitions) in order
+    
+    String dictionaries are merged and the codes of each part remapped to the
+    merged dictionary.
+    
+    Args:
+        model_name: Mapped model class name
+        parts: Snapshots holding at least the columns of the first part
+    
+    Returns:
+        ColumnarSnapshot: Combined snapshot (token joins the parts' tokens)
+    """
+    if len(parts) == 1:
+        return parts[0]
+    names = parts[0].columns if parts else []
+    arrays: Dict[str, np.ndarray] = {}
+    categories: Dict[str, np.ndarray] = {}
+    nulls: Dict[str, np.ndarray] = {}
+    
+    for name in names:
+        if parts[0].is_encoded(name):
+            dictionary: Dict[Any, int] = {}
+            chunks = []
+            for part in parts:
+                remap = np.array(
+                    [dictionary.setdefault(value, len(dictionary)) for value in part.categories(name)] + [-1],
+                    dtype=np.int32
+                )
+                # code -1 (NULL) indexes the trailing -1 of the remap table
+                chunks.append(remap[part.column(name)])
+            merged = np.empty(len(dictionary), dtype=object)
+            for value, code in dictionary.items():
+                merged[code] = value
+            arrays[name] = np.concatenate(chunks)
+            categories[name] = merged
+        else:
+            arrays[name] = np.concatenate([part.column(name) for part in parts])
+        
+        if any(part.null_mask(name) is not None for part in parts):
+            nulls[name] = np.concatenate([
+                part.null_mask(name) if part.null_mask(name) is not None else np.zeros(len(part), dtype=np.bool_)
+                for part in parts
+            ])
+    
+    token = '|'.join(part.token for part in parts)
+    return ColumnarSnapshot(model_name, token, arrays, categories, nulls)
+
+
+class _ColumnBuilder:
+    """Accumulates fetched values of one column into a snapshot array"""
+    
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.chunks: List[np.ndarray] = []
+        self.null_chunks: List[np.ndarray] = []
+        self.dictionary: Dict[Any, int] = {}
+    
+    def add(self, values: List[Any]) -> None:
+        """Convert a batch of Python values and append it"""
+        if self.kind == 'string':
+            codes = np.fromiter(
+                (-1 if v is None else self.dictionary.setdefault(v, len(self.dictionary)) for v in values),
+                dtype=np.int32,
+                count=len(values)
+            )
+            self.chunks.append(codes)
+        elif self.kind == 'float':
+            self.chunks.append(np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64))
+        elif self.kind == 'datetime':
+            self.chunks.append(np.array(values, dtype='datetime64[us]'))
+        else:
+            dtype = np.int64 if self.kind == 'int' else np.bool_
+            nulls = np.fromiter((v is None for v in values), dtype=np.bool_, count=len(values))
+            self.chunks.append(np.array([0 if v is None else v for v in values], dtype=dtype))
+            self.null_chunks.append(nulls)
+    
+    def array(self) -> np.ndarray:
+        """Concatenate accumulated chunks"""
+        if not self.chunks:
+            empty_types = {'string': np.int32, 'float': np.float64, 'datetime': 'datetime64[us]', 'int': np.int64}
+            return np.array([], dtype=empty_types.get(self.kind, np.bool_))
+        return np.concatenate(self.chunks)
+    
+    def categories(self) -> np.ndarray:
+        """Distinct values in code order"""
+        values = np.empty(len(self.dictionary), dtype=object)
+        for value, code in self.dictionary.items():
+            values[code] = value
+        return values
+    
+    def null_mask(self) -> Optional[np.ndarray]:
+        """NULL mask if the column contained NULLs"""
+        if not self.null_chunks:
+            return None
+        mask = np.concatenate(self.null_chunks)
+        return mask if mask.any() else None
+
+
+def load_snapshot(
+    session: Any,
+    model: Any,
+    columns: Sequence[str],
+    token: str,
+    criteria: Sequence[Any] = ()
+) -> ColumnarSnapshot:
+    """
+    Load columns of a table into a columnar snapshot
+    
+    Args:
+        session: Read-only session
+        model: Mapped model class
+        columns: Column names to load
+        token: Data version token of the table
+        criteria: Optional WHERE criteria (e.g. a period partition's date range)
+    
+    Returns:
+        ColumnarSnapshot: Loaded snapshot (soft-deleted rows excluded)
+    """
+    names = list(columns)
+    table_columns = model.__table__.columns
+    builders = [_ColumnBuilder(column_kind(table_columns[name])) for name in names]
+    
+    entities = projected_columns(model, reads(model, *names))
+    query = session.query(*entities).filter(*criteria).yield_per(LOAD_BATCH_SIZE)
+    batch: List[Any] = []
+    for row in query:
+        batch.append(row)
+        if len(batch) >= LOAD_BATCH_SIZE:
+            _add_batch(builders, batch)
+            batch = []
+    _add_batch(builders, batch)
+    
+    arrays: Dict[str, np.ndarray] = {}
+    categories: Dict[str, np.ndarray] = {}
+    nulls: Dict[str, np.ndarray] = {}
+    for name, builder in zip(names, builders):
+        arrays[name] = builder.array()
+        if builder.kind == 'string':
+            categories[name] = builder.categories()
+        mask = builder.null_mask()
+        if mask is not None:
+            nulls[name] = mask
+    
+    return ColumnarSnapshot(model.__name__, token, arrays, categories, nulls)
+
+
+def _add_batch(builders: List[_ColumnBuilder], batch: List[Any]) -> None:
+    """Append a batch of rows to the column builders"""
+    if not batch:
+        return
+    for index, builder in enumerate(builders):
+        builder.add([row[index] for row in batch])
+
+
+def snapshot_from_arrow(model: Any, token: str, table: Any) -> ColumnarSnapshot:
+    """
+    Build a columnar snapshot from a cached Arrow table
+    
+    Float, integer and timestamp columns without NULLs are zero-copy views
+    of the (memory-mapped) Arrow buffers.
+    
+    Args:
+        model: Mapped model class
+        token: Data version token of the cached table
+        table: pyarrow.Table read from the table cache
+    
+    Returns:
+        ColumnarSnapshot: Snapshot of the table's columns
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    arrays: Dict[str, np.ndarray] = {}
+    categories: Dict[str, np.ndarray] = {}
+    nulls: Dict[str, np.ndarray] = {}
+    table_columns = model.__table__.columns
+    for name in table.column_names:
+        kind = column_kind(table_columns[name])
+        values = table.column(name)
+        if kind == 'string':
+            encoded = values.combine_chunks().dictionary_encode()
+            arrays[name] = encoded.indices.fill_null(-1).to_numpy().astype(np.int32)
+            categories[name] = encoded.dictionary.to_numpy(zero_copy_only=False)
+        elif kind == 'float':
+            arrays[name] = pc.cast(values, pa.float64()).to_numpy()
+        elif kind == 'datetime':
+            arrays[name] = values.to_numpy()
+        else:
+            if kind == 'int':
+                # Files written with int32 columns still load as int64
+                values = pc.cast(values, pa.int64())
+            if values.null_count:
+                nulls[name] = values.is_null().to_numpy()
+                values = values.fill_null(False if kind == 'bool' else 0)
+            arrays[name] = values.to_numpy()
+    
+    return ColumnarSnapshot(model.__name__, token, arrays, categories, nulls)
+
+
+def session_tenant(session: Any) -> Optional[str]:
+    """Tenant of a session (None for the default database)"""
+    return getattr(session, 'tenant', None)
+
+
+def snapshot_key(name: str, tenant: Optional[str] = None) -> str:
+    """
+    Cache key of a snapshot, namespaced by tenant
+    
+    Example:
+        snapshot_key('Transaction@month:2024-03', 'acme') -> 'acme/Transaction@month:2024-03'
+    """
+    return f'{tenant}/{name}' if tenant else name
+
+
+def _key_tenant(key: str) -> Optional[str]:
+    return key.split('/', 1)[0] if '/' in key else None
+
+
+def _key_model(key: str) -> str:
+    return key.rsplit('/', 1)[-1].split('@', 1)[0]
+
+
+class SnapshotManager:
+    """
+    Keeps one columnar snapshot per table, reloaded when its data version changes
+    """
+    
+    def __init__(self, table_cache: Any = None, shared_store: Any = None) -> None:
+        """
+        Initialize snapshot manager
+        
+        Args:
+            table_cache: Optional TableCache to build snapshots from instead of the database
+            shared_store: Optional SharedSnapshotStore holding snapshots shared between processes
+        """
+        self.table_cache = table_cache
+        self.shared_store = shared_store
+        self._tenant_caches: Dict[str, Any] = {}
+        self._snapshots: Dict[str, ColumnarSnapshot] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.stats: Dict[str, int] = {'hits': 0, 'loads': 0}
+    
+    def _lock_for(self, model_name: str) -> threading.Lock:
+        """Get the lock serializing loads of one table"""
+        with self._guard:
+            return self._locks.setdefault(model_name, threading.Lock())
+    
+    def get(self, session: Any, model: Any, columns: Sequence[str]) -> ColumnarSnapshot:
+        """
+        Get a snapshot holding the given columns at the current data version
+        
+        Args:
+            session: Read-only session (used for the version check and loading)
+            model: Mapped model class
+            columns: Column names the caller reads
+        
+        Returns:
+            ColumnarSnapshot: Shared snapshot (treat arrays as read-only)
+        """
+        token = table_version(session, model)
+        tenant = session_tenant(session)
+        
+        def load(needed: List[str]) -> ColumnarSnapshot:
+            table_cache = self._table_cache_for(tenant)
+            if table_cache is not None:
+                table = table_cache.load(session, model, needed, token=token)
+                return snapshot_from_arrow(model, token, table)
+            return load_snapshot(session, model, needed, token)
+        
+        return self._cached(snapshot_key(model.__name__, tenant), token, columns, load)
+    
+    def _table_cache_for(self, tenant: Optional[str]) -> Any:
+        """Table cache of a tenant: a subdirectory of the default cache's directory"""
+        if self.table_cache is None or not tenant:
+            return self.table_cache
+        with self._guard:
+            cache = self._tenant_caches.get(tenant)
+            if cache is None:
+                cache = type(self.table_cache)(
+                    str(self.table_cache.directory / tenant), self.table_cache.file_format
+                )
+                self._tenant_caches[tenant] = cache
+            return cache
+    
+    def get_range(
+        self,
+        session: Any,
+        model: Any,
+        columns: Sequence[str],
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+        scheme: Optional[str] = None
+    ) -> ColumnarSnapshot:
+        """
+        Get a snapshot of the rows whose partition date lies in start..end
+        
+        Only the period partitions overlapping the range are version-checked
+        (in one grouped query) and, if stale or missing, loaded; each partition
+        is cached separately
+        (always loaded from the database, with the period's date range as
+        WHERE). Rows with a NULL partition date are not part of any partition.
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class with a partition column (periods.PARTITION_COLUMNS)
+            columns: Column names the caller reads
+            start: First date (inclusive); None for the earliest row
+            end: Last date (inclusive, a date covers the whole day); None for the latest row
+            scheme: Partition scheme (defaults to PARTITION_SCHEME)
+        
+        Returns:
+            ColumnarSnapshot: Rows in the range (treat arrays as read-only)
+        
+        Raises:
+            ValueError: If the model has no partition column or the scheme is unknown
+        """
+        scheme = scheme_name(scheme)
+        date_column = partition_column(model)
+        names = list(columns) + ([date_column] if date_column not in columns else [])
+        
+        if start is None or end is None:
+            column = getattr(model, date_column)
+            first, last = session.query(func.min(column), func.max(column)).one()
+            if first is None:
+                return load_snapshot(session, model, names, '', [false()])
+            start = first if start is None else start
+            end = last if end is None else end
+        
+        periods = periods_between(start, end, scheme)
+        partitions = [partition_criteria(model, period) for period in periods]
+        # One grouped query checks the versions of all touched periods (an open
+        # range can span many of them)
+        tokens = partition_versions(session, model, partitions)
+        parts = []
+        for period, criteria, token in zip(periods, partitions, tokens):
+            key = snapshot_key(f'{model.__name__}@{scheme}:{period.key}', session_tenant(session))
+            parts.append(self._cached(
+                key, token, names,
+                lambda needed, token=token, criteria=criteria: load_snapshot(session, model, needed, token, criteria)
+            ))
+        if not parts:
+            return load_snapshot(session, model, names, '', [false()])
+        
+        snapshot = concat_snapshots(model.__name__, parts)
+        dates = snapshot.column(date_column)
+        lower = np.datetime64(to_datetime(start), 'us')
+        upper = np.datetime64(range_end(end), 'us')
+        mask = (dates >= lower) & (dates < upper)
+        return snapshot if mask.all() else snapshot.filter(mask)
+    
+    def _cached(
+        self,
+        key: str,
+        token: str,
+        columns: Sequence[str],
+        load: Callable[[List[str]], ColumnarSnapshot]
+    ) -> ColumnarSnapshot:
+        """Return the cached snapshot under key if current, otherwise load and cache it"""
+        with self._lock_for(key):
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.token == token and snapshot.has_columns(columns):
+                self.stats['hits'] += 1
+                return snapshot
+            
+            # Keep columns already loaded at this version so tests share one snapshot
+            needed = list(columns)
+            if snapshot is not None and snapshot.token == token:
+                needed = snapshot.columns + [c for c in columns if c not in snapshot.columns]
+            
+            previous = snapshot
+            snapshot = self._load(key, token, needed, load)
+            self._snapshots[key] = snapshot
+            self.stats['loads'] += 1
+            if previous is not None and previous.token != token and self.shared_store is not None:
+                self.shared_store.release(key, previous.token)
+            return snapshot
+    
+    def _load(
+        self,
+        key: str,
+        token: str,
+        columns: List[str],
+        load: Callable[[List[str]], ColumnarSnapshot]
+    ) -> ColumnarSnapshot:
+        """Load a snapshot, through the shared store when one is configured"""
+        store = self.shared_store
+        if store is None:
+            return load(columns)
+        
+        # Another process may have published this version already
+        snapshot = store.attach(key, token, columns)
+        if snapshot is not None:
+            return snapshot
+        with store.publishing(key, token):
+            # ... or published it while this process waited for the lock
+            snapshot = store.attach(key, token, columns)
+            if snapshot is not None:
+                return snapshot
+            built = load(columns)
+            store.publish(key, built)
+        return store.attach(key, token, columns) or built
+    
+    def invalidate(self, model: Any = None, tenant: Optional[str] = None) -> None:
+        """
+        Drop cached snapshots
+        
+        Args:
+            model: Model whose snapshot and period partitions to drop, or None to drop all
+            tenant: Only drop snapshots of this tenant (default: of every tenant)
+        """
+        with self._guard:
+            keys = [
+                key for key in self._snapshots
+                if (model is None or _key_model(key) == model.__name__)
+                and (tenant is None or _key_tenant(key) == tenant)
+            ]
+            dropped = [(key, self._snapshots.pop(key)) for key in keys]
+        if self.shared_store is not None:
+            for key, snapshot in dropped:
+                self.shared_store.release(key, snapshot.token)
+
+
+def _default_table_cache() -> Any:
+    """Create the configured on-disk table cache, or None if disabled"""
+    if not Config.DATA_CACHE_DIR:
+        return None
+    from table_cache import TableCache, PYARROW_AVAILABLE
+    if not PYARROW_AVAILABLE:
+        print("⚠ DATA_CACHE_DIR is set but pyarrow is not installed; snapshots are loaded from the database")
+        return None
+    return TableCache()
+
+
+def _default_shared_store() -> Any:
+    """Create the configured cross-process snapshot store, or None if disabled"""
+    if not Config.SHARED_SNAPSHOT_DIR:
+        return None
+    from shared_snapshot import SharedSnapshotStore
+    return SharedSnapshotStore()
+
+
+# Global snapshot manager shared by all sessions of the process
+snapshots = SnapshotManager(table_cache=_default_table_cache(), shared_store=_default_shared_store())
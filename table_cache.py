@@ -0,0 +1,339 @@
+"""
+On-disk columnar cache of audited tables.
+Each model is written as an Arrow IPC file (memory-mapped on load) or a
+Parquet file. The table's data version token (row count, max Id, max
+LastModificationTime/DeletionTime) is stored in the file's schema metadata,
+so checking whether a cached file is still valid costs one small query.
+
+Usage:
+    python table_cache.py --refresh              # Warm the cache for all tables
+    python table_cache.py --refresh --force      # Rewrite every cached file
+    python table_cache.py --status               # Show cache validity per table
+"""
+import os
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric
+from config import Config
+from data_version import table_version
+from projection import projected_columns, reads
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# Schema metadata key holding the data version token
+TOKEN_METADATA_KEY = b'audit_data_version'
+
+# Rows fetched from the cursor per record batch while writing a cache file
+WRITE_BATCH_SIZE = 50000
+
+SUPPORTED_FORMATS = ('arrow', 'parquet')
+
+
+def cached_models() -> List[Any]:
+    """
+    Get the audited models that can be cached (all soft-delete tables)
+    
+    Returns:
+        list: Mapped model classes
+    """
+    from database import Base
+    from models import SoftDeleteMixin
+    
+    models = [mapper.class_ for mapper in Base.registry.mappers if issubclass(mapper.class_, SoftDeleteMixin)]
+    return sorted(models, key=lambda model: model.__tablename__)
+
+
+def _arrow_type(column: Any) -> Any:
+    """Map a SQLAlchemy column type to an Arrow type"""
+    col_type = column.type
+    if isinstance(col_type, Boolean):
+        return pa.bool_()
+    if isinstance(col_type, (DateTime, Date)):
+        return pa.timestamp('us')
+    if isinstance(col_type, Numeric) and not isinstance(col_type, Float):
+        if col_type.precision is not None:
+            return pa.decimal128(col_type.precision, col_type.scale or 0)
+        return pa.float64()
+    if isinstance(col_type, Float):
+        return pa.float64()
+    if isinstance(col_type, Integer):
+        # int64 like the database load path, so snapshots match either way
+        return pa.int64()
+    return pa.string()
+
+
+class TableCache:
+    """Columnar file cache of audited tables with change detection"""
+    
+    def __init__(self, directory: Optional[str] = None, file_format: Optional[str] = None) -> None:
+        """
+        Initialize table cache
+        
+        Args:
+            directory: Cache directory (default: Config.DATA_CACHE_DIR)
+            file_format: 'arrow' (memory-mapped IPC files) or 'parquet'
+                         (default: Config.DATA_CACHE_FORMAT)
+        
+        Raises:
+            ImportError: If pyarrow is not installed
+            ValueError: If the format is not supported or no directory is configured
+        """
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for the table cache. Install it with: pip install pyarrow")
+        
+        cache_dir = directory or Config.DATA_CACHE_DIR
+        if not cache_dir:
+            raise ValueError("DATA_CACHE_DIR is not configured")
+        self.directory = Path(cache_dir)
+        self.file_format = (file_format or Config.DATA_CACHE_FORMAT).lower()
+        if self.file_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported cache format '{self.file_format}'. Use 'arrow' or 'parquet'.")
+        self.directory.mkdir(parents=True, exist_ok=True)
+    
+    def path_for(self, model: Any) -> Path:
+        """Get the cache file path of a model"""
+        extension = 'arrow' if self.file_format == 'arrow' else 'parquet'
+        return self.directory / f'{model.__tablename__}.{extension}'
+    
+    def cached_token(self, model: Any) -> Optional[str]:
+        """
+        Read the data version token stored in a model's cache file
+        
+        Returns:
+            str or None: Token, or None if the file is missing or unreadable
+        """
+        path = self.path_for(model)
+        if not path.exists():
+            return None
+        try:
+            schema = self._read_schema(path)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = schema.metadata or {}
+        token = metadata.get(TOKEN_METADATA_KEY)
+        return token.decode('utf-8') if token else None
+    
+    def _read_schema(self, path: Path) -> Any:
+        """Read only the schema of a cache file"""
+        if self.file_format == 'parquet':
+            return pq.read_schema(path)
+        with pa.memory_map(str(path), 'r') as source:
+            return pa.ipc.open_file(source).schema
+    
+    def is_valid(self, session: Any, model: Any, token: Optional[str] = None) -> bool:
+        """
+        Check whether the cache file of a model matches the database
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class
+            token: Current data version token (computed if not given)
+        """
+        current = token or table_version(session, model)
+        return self.cached_token(model) == current
+    
+    def refresh(self, session: Any, model: Any, force: bool = False, token: Optional[str] = None) -> str:
+        """
+        Write a model's cache file if it is missing or stale
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class
+            force: Rewrite even if the cached file is valid
+            token: Current data version token (computed if not given)
+        
+        Returns:
+            str: Data version token of the cached file
+        """
+        token = token or table_version(session, model)
+        if not force and self.cached_token(model) == token:
+            return token
+        
+        names = [column.name for column in model.__table__.columns]
+        schema = pa.schema(
+            [pa.field(name, _arrow_type(model.__table__.columns[name])) for name in names],
+            metadata={TOKEN_METADATA_KEY: token.encode('utf-8')}
+        )
+        
+        path = self.path_for(model)
+        temp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        writer = self._open_writer(temp_path, schema)
+        try:
+            entities = projected_columns(model, reads(model, *names))
+            rows = session.query(*entities).yield_per(WRITE_BATCH_SIZE)
+            batch: List[Any] = []
+            batches_written = 0
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    writer.write_batch(self._record_batch(batch, schema))
+                    batches_written += 1
+                    batch = []
+            # Empty tables still get one (empty) batch
+            if batch or batches_written == 0:
+                writer.write_batch(self._record_batch(batch, schema))
+        except Exception:
+            writer.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+        writer.close()
+        
+        # Replace atomically so readers never see a partially written file
+        os.replace(temp_path, path)
+        return token
+    
+    def _open_writer(self, path: Path, schema: Any) -> Any:
+        """Open a record batch writer for the configured format"""
+        if self.file_format == 'parquet':
+            return _ParquetBatchWriter(path, schema)
+        return pa.ipc.new_file(str(path), schema)
+    
+    @staticmethod
+    def _record_batch(rows: List[Any], schema: Any) -> Any:
+        """Build a record batch from fetched rows"""
+        arrays = []
+        for index, field in enumerate(schema):
+            values = [row[index] for row in rows]
+            if pa.types.is_string(field.type):
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+    
+    def load(
+        self,
+        session: Any,
+        model: Any,
+        columns: Optional[Sequence[str]] = None,
+        token: Optional[str] = None
+    ) -> Any:
+        """
+        Load a model's table from the cache, refreshing the file first if stale
+        
+        Arrow files are memory-mapped, so columns are read from the page cache
+        without copying the file into process memory.
+        
+        Args:
+            session: Read-only session
+            model: Mapped model class
+            columns: Column names to load (default: all)
+            token: Current data version token (computed if not given)
+        
+        Returns:
+            pyarrow.Table: Cached table (soft-deleted rows excluded)
+        """
+        token = self.refresh(session, model, token=token)
+        return self.read(model, columns, token)
+    
+    def read(self, model: Any, columns: Optional[Sequence[str]] = None, token: Optional[str] = None) -> Any:
+        """
+        Read a model's cache file without contacting the database
+        
+        Args:
+            model: Mapped model class
+            columns: Column names to load (default: all)
+            token: Expected data version token; if given and different, raises
+        
+        Returns:
+            pyarrow.Table: Cached table
+        
+        Raises:
+            FileNotFoundError: If the model is not cached
+            ValueError: If the cached file does not match the expected token
+        """
+        path = self.path_for(model)
+        if not path.exists():
+            raise FileNotFoundError(f"No cache file for {model.__name__}: {path}")
+        
+        if self.file_format == 'parquet':
+            table = pq.read_table(path, columns=list(columns) if columns else None, memory_map=True)
+        else:
+            # The table's buffers keep the mapping alive after the file is closed
+            with pa.memory_map(str(path), 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            if columns:
+                table = table.select(list(columns))
+        
+        metadata = table.schema.metadata or {}
+        cached = metadata.get(TOKEN_METADATA_KEY, b'').decode('utf-8')
+        if token is not None and cached != token:
+            raise ValueError(f"Cache file for {model.__name__} is stale")
+        return table
+    
+    def refresh_all(self, session: Any, force: bool = False) -> Dict[str, str]:
+        """
+        Refresh the cache files of all audited tables
+        
+        Returns:
+            dict: Table name -> data version token
+        """
+        return {model.__tablename__: self.refresh(session, model, force=force) for model in cached_models()}
+    
+    def status(self, session: Any) -> List[Dict[str, Any]]:
+        """
+        Get the validity of every cached table
+        
+        Returns:
+            list: One dict per table with path, cached/current tokens and validity
+        """
+        result = []
+        for model in cached_models():
+            current = table_version(session, model)
+            cached = self.cached_token(model)
+            result.append({
+                'table': model.__tablename__,
+                'path': str(self.path_for(model)),
+                'cachedToken': cached,
+                'currentToken': current,
+                'valid': cached == current
+            })
+        return result
+
+
+class _ParquetBatchWriter:
+    """Adapter giving pyarrow's ParquetWriter the IPC writer interface"""
+    
+    def __init__(self, path: Path, schema: Any) -> None:
+        self._writer = pq.ParquetWriter(str(path), schema)
+    
+    def write_batch(self, batch: Any) -> None:
+        self._writer.write_batch(batch)
+    
+    def close(self) -> None:
+        self._writer.close()
+
+
+def main() -> None:
+    """
+    Command line entry point for warming and inspecting the cache
+    """
+    from database import get_db
+    
+    parser = argparse.ArgumentParser(description='Audited tables columnar cache')
+    parser.add_argument('--refresh', action='store_true', help='Write missing or stale cache files')
+    parser.add_argument('--force', action='store_true', help='Rewrite all cache files (with --refresh)')
+    parser.add_argument('--status', action='store_true', help='Show cache validity per table')
+    parser.add_argument('--dir', type=str, default=None, help='Cache directory (default: DATA_CACHE_DIR)')
+    args = parser.parse_args()
+    
+    cache = TableCache(args.dir)
+    session = get_db()
+    try:
+        if args.refresh:
+            tokens = cache.refresh_all(session, force=args.force)
+            print(json.dumps({'refreshed': tokens}, indent=2, ensure_ascii=False))
+        if args.status or not args.refresh:
+            print(json.dumps({'tables': cache.status(session)}, indent=2, ensure_ascii=False))
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
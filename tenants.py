@@ -0,0 +1,166 @@
+"""
+Tenant databases for multi-company audits.
+Each tenant (company) has its own database, configured in
+TENANT_CONNECTION_STRINGS or through TENANT_CONNECTION_TEMPLATE. A tenant's
+Database (engines, pools and session factories) is created on first use and
+kept in a bounded LRU: at most TENANT_MAX_ENGINES tenants keep open pools, the
+least recently used one is closed when another tenant is opened, and pools of
+tenants idle for TENANT_IDLE_SECONDS are closed as well.
+
+Closing a tenant only closes its idle pooled connections; a run still using
+the tenant's Database keeps working and its connections are closed when
+returned.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from config import Config
+from database import Database, db
+
+
+class TenantRegistry:
+    """Bounded LRU of tenant databases"""
+    
+    def __init__(self, max_engines: Optional[int] = None, idle_seconds: Optional[int] = None) -> None:
+        """
+        Initialize the registry
+        
+        Args:
+            max_engines: Maximum number of open tenant databases (default: TENANT_MAX_ENGINES)
+            idle_seconds: Close databases unused for this many seconds, 0 = never
+                (default: TENANT_IDLE_SECONDS)
+        """
+        self.max_engines = max(1, max_engines if max_engines is not None else Config.TENANT_MAX_ENGINES)
+        self.idle_seconds = idle_seconds if idle_seconds is not None else Config.TENANT_IDLE_SECONDS
+        # tenant -> (database, last use), least recently used first
+        self._databases: 'OrderedDict[str, List[Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {'opened': 0, 'evicted': 0, 'idle_evicted': 0}
+    
+    def database(self, tenant: str) -> Database:
+        """
+        Get the database of a tenant, opening it if needed
+        
+        Args:
+            tenant: Tenant id
+        
+        Returns:
+            Database: The tenant's database manager (engines are created lazily)
+        
+        Raises:
+            ValueError: If the tenant id is invalid or not configured
+        """
+        now = time.monotonic()
+        closed: List[Database] = []
+        with self._lock:
+            entry = self._databases.get(tenant)
+            if entry is not None:
+                entry[1] = now
+                self._databases.move_to_end(tenant)
+            else:
+                entry = [Database(Config.get_tenant_connection_string(tenant), tenant=tenant), now]
+                self._databases[tenant] = entry
+                self.stats['opened'] += 1
+                while len(self._databases) > self.max_engines:
+                    closed.append(self._pop_lru(exclude=tenant))
+                    self.stats['evicted'] += 1
+            closed.extend(self._pop_idle(now, exclude=tenant))
+        
+        for database in closed:
+            database.dispose()
+        return entry[0]
+    
+    def _pop_lru(self, exclude: str) -> Database:
+        """Remove the least recently used tenant, preferring one without checked-out connections"""
+        candidates = [tenant for tenant in self._databases if tenant != exclude]
+        idle = [tenant for tenant in candidates if self._databases[tenant][0].checked_out == 0]
+        return self._databases.pop((idle or candidates)[0])[0]
+    
+    def _pop_idle(self, now: float, exclude: Optional[str] = None) -> List[Database]:
+        """Remove tenants unused for idle_seconds that have no checked-out connections"""
+        if not self.idle_seconds:
+            return []
+        expired = [
+            tenant for tenant, (database, last_used) in self._databases.items()
+            if tenant != exclude and now - last_used >= self.idle_seconds and database.checked_out == 0
+        ]
+        self.stats['idle_evicted'] += len(expired)
+        return [self._databases.pop(tenant)[0] for tenant in expired]
+    
+    def evict_idle(self) -> List[str]:
+        """
+        Close the databases of idle tenants
+        
+        Returns:
+            list: Closed tenant ids
+        """
+        with self._lock:
+            closed = self._pop_idle(time.monotonic())
+        for database in closed:
+            database.dispose()
+        return [database.tenant for database in closed]
+    
+    def evict(self, tenant: str) -> bool:
+        """
+        Close the database of a tenant
+        
+        Returns:
+            bool: True if the tenant was open
+        """
+        with self._lock:
+            entry = self._databases.pop(tenant, None)
+        if entry is None:
+            return False
+        entry[0].dispose()
+        return True
+    
+    def dispose_all(self) -> None:
+        """Close the databases of all tenants"""
+        with self._lock:
+            databases = [database for database, _ in self._databases.values()]
+            self._databases.clear()
+        for database in databases:
+            database.dispose()
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Get the open tenants and their pool statistics
+        
+        Returns:
+            dict: Limits, counters and one entry per open tenant (most recently used last)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = [(tenant, database, last_used) for tenant, (database, last_used) in self._databases.items()]
+        return {
+            'max_engines': self.max_engines,
+            'idle_seconds': self.idle_seconds,
+            **self.stats,
+            'tenants': [
+                {'tenant': tenant, 'idle_seconds': round(now - last_used, 1), **database.pool_status()}
+                for tenant, database, last_used in entries
+            ]
+        }
+
+
+# Global tenant registry of the process
+tenant_databases = TenantRegistry()
+
+
+def database_for(tenant: Optional[str] = None) -> Database:
+    """
+    Get the database of a tenant, or the default database
+    
+    Args:
+        tenant: Tenant id, or None/'' for CONNECTION_STRING
+    
+    Returns:
+        Database: Database manager to open sessions on
+    
+    Raises:
+        ValueError: If the tenant id is invalid or not configured
+    """
+    if not tenant:
+        return db
+    return tenant_databases.database(tenant)
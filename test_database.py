@@ -0,0 +1,794 @@
+"""
+تست مدیریت اتصال دیتابیس
+Database connection management tests
+"""
+import pytest
+from sqlalchemy import text
+
+from config import Config
+from database import Database
+
+
+def test_queue_pool_reuses_connections(monkeypatch):
+    """در حالت queue اتصال‌ها بین sessionها مجدداً استفاده می‌شوند"""
+    monkeypatch.setattr(Config, 'DB_POOL_MODE', 'queue')
+    database = Database()
+    
+    for _ in range(3):
+        session = database.get_session()
+        try:
+            session.execute(text('SELECT 1'))
+        finally:
+            session.close()
+    
+    status = database.pool_status()
+    assert status['pool_class'] == 'QueuePool'
+    assert status['connects'] == 1
+    assert status['checkouts'] == 3
+    assert status['checked_out'] == 0
+
+
+def test_null_pool_opens_connection_per_session(monkeypatch):
+    """در حالت null برای هر session اتصال جدید باز می‌شود"""
+    monkeypatch.setattr(Config, 'DB_POOL_MODE', 'null')
+    database = Database()
+    
+    for _ in range(2):
+        session = database.get_session()
+        try:
+            session.execute(text('SELECT 1'))
+        finally:
+            session.close()
+    
+    status = database.pool_status()
+    assert status['pool_class'] == 'NullPool'
+    assert status['connects'] == 2
+
+
+def test_invalid_pool_mode(monkeypatch):
+    """حالت نامعتبر استخر اتصال خطا می‌دهد"""
+    monkeypatch.setattr(Config, 'DB_POOL_MODE', 'bogus')
+    with pytest.raises(ValueError):
+        Config.get_pool_options()
+
+
+def test_stream_batches_skip_soft_deleted(seed_transactions):
+    """خواندن جریانی رکوردها به صورت دسته‌ای و بدون رکوردهای حذف‌شده"""
+    from database import db
+    from models import Transaction
+    
+    seed_transactions(dict(Uuid=f'stream-{i}', Debit=i, Credit=0, IsDeleted=(i % 5 == 0)) for i in range(25))
+    
+    session = db.get_session()
+    try:
+        batches = list(session.stream(Transaction, ['Id', 'Debit'], batch_size=8, batches=True))
+        rows = list(session.stream(Transaction, ['Debit']))
+    finally:
+        session.close()
+    
+    assert [len(batch) for batch in batches] == [8, 8, 4]
+    assert sorted(float(row.Debit) for row in rows) == [float(i) for i in range(25) if i % 5 != 0]
+
+
+def test_declared_filters_are_applied_in_sql(seed_transactions):
+    """فیلترهای سطری اعلام‌شده با مقدار پارامترها در WHERE اعمال می‌شوند"""
+    from database import db
+    from filters import between, gt, param, resolve_filters, where
+    from models import Transaction
+    
+    seed_transactions(dict(Uuid=f'filter-{i}', Debit=i * 100, Credit=i, IsDeleted=False) for i in range(10))
+    
+    declared = where(
+        Transaction,
+        gt(param('columnName', 'Debit', choices=['Debit', 'Credit'], otherwise='Credit'), param('minAmount', 0)),
+        between('Credit', param('fromCredit'), param('toCredit'))
+    )
+    parameters = {'columnName': 'Debit', 'minAmount': '450'}
+    filters = resolve_filters(declared, lambda key, default: parameters.get(key, default))
+    assert len(filters['Transaction']) == 1  # بازه بدون مقدار نادیده گرفته می‌شود
+    
+    session = db.get_session(filters=filters)
+    try:
+        queried = sorted(float(t.Debit) for t in session.query(Transaction).all())
+        streamed = sorted(float(t.Debit) for t in session.stream(Transaction, ['Debit']))
+    finally:
+        session.close()
+    
+    assert queried == streamed == [500.0, 600.0, 700.0, 800.0, 900.0]
+    
+    # متن آزاد هرگز نام ستون نمی‌شود: مقدار خارج از گزینه‌ها به ستون جایگزین نگاشت می‌شود
+    for free_text in ('Id', 'credit'):
+        parameters['columnName'] = free_text
+        filters = resolve_filters(declared, lambda key, default: parameters.get(key, default))
+        assert filters['Transaction'][0]['column'] == 'Credit'
+    with pytest.raises(ValueError):
+        where(Transaction, gt(param('columnName', 'Debit'), 0))
+
+
+def test_batch_planner_shares_one_scan_per_model(seed_transactions):
+    """آزمون‌های یک جدول از یک اسکن مشترک با ستون‌ها و فیلترهای خودشان می‌خوانند"""
+    from types import SimpleNamespace
+    from batch_planner import BatchPlanner
+    from database import db
+    from filters import eq, gt, resolve_filters, where
+    from models import Transaction
+    from projection import reads
+    
+    seed_transactions(
+        dict(Uuid=f'batch-{i}', Debit=i * 100, Credit=i, AccountCode=f'A{i % 2}', IsDeleted=(i == 9)) for i in range(10)
+    )
+    
+    def module(definitions):
+        return SimpleNamespace(define=lambda: definitions, execute=lambda session: sorted(session.query(Transaction).all()))
+    
+    modules = {
+        'large_debits': module({'columns': reads(Transaction, 'Debit'), 'filters': where(Transaction, gt('Debit', 450))}),
+        'credits': module({'columns': reads(Transaction, 'Id', 'Credit')}),
+        'by_account': module({'columns': reads(Transaction, 'Debit'), 'filters': where(Transaction, eq('AccountCode', 'A1'))})
+    }
+    planner = BatchPlanner(modules, lambda key, default: default)
+    
+    results = {}
+    for test_id, test_module in modules.items():
+        definitions = test_module.define()
+        filters = resolve_filters(definitions.get('filters'), lambda key, default: default)
+        own_session = db.get_session(columns=definitions['columns'], filters=filters)
+        expected = test_module.execute(own_session)
+        session = planner.session(test_id, db.get_session(columns=definitions['columns'], filters=filters))
+        try:
+            results[test_id] = test_module.execute(session)
+        finally:
+            session.close()
+            own_session.close()
+        assert [tuple(row) for row in results[test_id]] == [tuple(row) for row in expected]
+    
+    # رشته‌ها (وابسته به collation) در SQL فیلتر می‌شوند
+    assert planner.summary() == {
+        'Transaction': {'columns': ['Id', 'Debit', 'Credit'], 'tests': ['large_debits', 'credits'], 'scans': 1}
+    }
+    assert [float(row.Debit) for row in results['large_debits']] == [500.0, 600.0, 700.0, 800.0]
+    assert results['credits'][0]._fields == ('Id', 'Credit')
+
+
+def test_result_cache_tiers_and_data_version(tmp_path, seed_transactions):
+    """نتیجه آزمون تا تغییر پارامترها یا داده‌ها از حافظه نهان (حافظه و دیسک) خوانده می‌شود"""
+    from types import SimpleNamespace
+    from database import db
+    from models import Transaction
+    from result_cache import ResultCache, execute_cached
+    
+    seed_transactions([])
+    calls = []
+    module = SimpleNamespace(
+        Transaction=Transaction,
+        define=lambda: {'parameters': []},
+        execute=lambda session: calls.append(1) or [{'rows': session.query(Transaction).count()}]
+    )
+    cache = ResultCache(memory_bytes=1024 * 1024, directory=str(tmp_path), disk_bytes=1024 * 1024)
+    
+    session = db.get_session()
+    try:
+        first = execute_cached('t', module, session, {'b': 1, 'a': ''}, cache=cache)
+        assert execute_cached('t', module, session, {'b': 1}, cache=cache) == first
+        execute_cached('t', module, session, {'b': 2}, cache=cache)
+    finally:
+        session.close()
+    
+    seed_transactions([dict(Uuid='cache-new', Debit=1, Credit=0)], replace=False)
+    session = db.get_session()
+    try:
+        changed = execute_cached('t', module, session, {'b': 1}, cache=cache)
+        # A new process has only the disk tier
+        assert execute_cached('t', module, session, {'b': 1}, cache=ResultCache(0, str(tmp_path), 1024 * 1024)) == changed
+    finally:
+        session.close()
+    
+    assert changed != first
+    assert len(calls) == 3
+    assert cache.status()['memory_hits'] == 1 and cache.status()['misses'] == 3
+    
+    small = ResultCache(memory_bytes=200, directory=str(tmp_path / 'small'), disk_bytes=200)
+    for key in ('k1', 'k2', 'k3'):
+        small.put(key, list(range(40)))
+    assert small.get('k1') is None and small.get('k3') == list(range(40))
+    assert small.status()['memory_evictions'] == 1 and small.status()['disk_entries'] == 2
+
+
+def test_result_cache_key_follows_test_source(tmp_path, monkeypatch, seed_transactions):
+    """بازنویسی و بارگذاری دوباره کد آزمون (مثل رفع خطای آزمون) نتیجه ذخیره‌شده قبلی را برنمی‌گرداند"""
+    import importlib
+    from database import db
+    from result_cache import ResultCache, execute_cached
+    
+    seed_transactions([])
+    source = tmp_path / 'cached_source_test.py'
+    source.write_text("def execute(session):\n    return [1]\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('cached_source_test')
+    cache = ResultCache(memory_bytes=1024 * 1024, directory='', disk_bytes=0)
+    
+    session = db.get_session()
+    try:
+        assert execute_cached('cached_source_test', module, session, cache=cache) == [1]
+        source.write_text("def execute(session):\n    return [1, 2]\n")
+        module = importlib.reload(module)
+        assert execute_cached('cached_source_test', module, session, cache=cache) == [1, 2]
+        assert execute_cached('cached_source_test', module, session, cache=cache) == [1, 2]
+    finally:
+        session.close()
+    assert cache.status()['misses'] == 2 and cache.status()['memory_hits'] == 1
+
+def test_incremental_state_folds_new_rows_and_unfolds_deletes(tmp_path, seed_transactions):
+    """در اجرای افزایشی فقط رکوردهای جدید خوانده و رکوردهای حذف‌شده از وضعیت کم می‌شوند"""
+    from datetime import datetime, timedelta
+    from aggregation import key, sum_of
+    from database import db
+    from incremental import IncrementalStore, evaluate
+    from models import Transaction
+    
+    def write(change):
+        write_session = db.SessionLocal()
+        try:
+            change(write_session)
+            write_session.commit()
+        finally:
+            write_session.close()
+    
+    def add(*rows, replace=False):
+        seed_transactions(
+            (dict(Uuid=f'inc-{account}-{debit}', AccountCode=account, Debit=debit, Credit=0) for account, debit in rows),
+            replace=replace
+        )
+    
+    def fold(state, rows):
+        for values in rows:
+            state[values['AccountCode']] = state.get(values['AccountCode'], 0) + values['Debit']
+    
+    def unfold(state, rows):
+        for values in rows:
+            state[values['AccountCode']] -= values['Debit']
+    
+    store = IncrementalStore(str(tmp_path))
+    
+    def totals():
+        session = db.SessionLocal()
+        try:
+            state = evaluate(
+                session, None, 't', Transaction, dict, fold, unfold,
+                keys=[key('AccountCode')], measures=[sum_of('Debit')], key=['AccountCode'], store=store
+            )
+            return {account: float(total) for account, total in state.items()}
+        finally:
+            session.close()
+    
+    add(('A', 10), ('B', 5), replace=True)
+    assert totals() == {'A': 10.0, 'B': 5.0}
+    add(('A', 1))
+    assert totals() == {'A': 11.0, 'B': 5.0}
+    assert store.stats['full'] == 1 and store.stats['incremental'] == 1 and store.stats['rows_folded'] == 3
+    
+    # حذف نرم: فقط رکورد حذف‌شده خوانده و از جمع کم می‌شود
+    write(lambda write_session: write_session.query(Transaction).filter(Transaction.Uuid == 'inc-A-10').update(
+        {'IsDeleted': True, 'DeletionTime': datetime.now()}
+    ))
+    assert totals() == {'A': 1.0, 'B': 5.0}
+    assert store.stats['rows_unfolded'] == 1 and store.stats['recomputed'] == 0
+    
+    # ویرایش رکوردهای قبلی قابل ادغام نیست و وضعیت از ابتدا محاسبه می‌شود
+    write(lambda write_session: write_session.query(Transaction).filter(Transaction.Uuid == 'inc-B-5').update(
+        {'Debit': 6, 'LastModificationTime': datetime.now() + timedelta(seconds=1)}
+    ))
+    assert totals() == {'A': 1.0, 'B': 6.0}
+    assert store.stats['recomputed'] == 1 and store.stats['full'] == 2
+
+
+def test_incremental_state_recomputed_after_test_edit(tmp_path, monkeypatch, seed_transactions):
+    """ویرایش fold آزمون (مثل رفع خطای آزمون) وضعیت ذخیره‌شده قبلی را باطل می‌کند"""
+    import importlib
+    from database import db
+    from incremental import IncrementalStore, evaluate
+    from models import Transaction
+    
+    seed_transactions([dict(Uuid='edit-1', Debit=10, Credit=0), dict(Uuid='edit-2', Debit=5, Credit=0)])
+    source = tmp_path / 'incremental_edit_test.py'
+    source.write_text("def fold(state, rows):\n    state['total'] += sum(row.Debit for row in rows)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('incremental_edit_test')
+    store = IncrementalStore(str(tmp_path / 'states'))
+    
+    def total():
+        session = db.SessionLocal()
+        try:
+            state = evaluate(session, None, 't', Transaction, lambda: {'total': 0}, module.fold, columns=['Debit'], store=store)
+            return float(state['total'])
+        finally:
+            session.close()
+    
+    assert total() == 15.0 and total() == 15.0
+    source.write_text("def fold(state, rows):\n    state['total'] += sum(2 * row.Debit for row in rows)\n")
+    module = importlib.reload(module)
+    assert total() == 30.0
+    assert store.stats['full'] == 2 and store.stats['incremental'] == 1 and store.stats['recomputed'] == 1
+
+
+def test_aggregate_groups_in_sql(seed_transactions):
+    """تجمیع گروهی در دیتابیس همراه با ردیف جمع کل"""
+    from aggregation import count_rows, count_where, key, sum_of
+    from database import db
+    from filters import gt
+    from models import Transaction
+    
+    rows = [('A', 10, 0, False), ('A', 5, 0, False), ('B', 0, 7, False), ('B', 100, 0, True)]
+    seed_transactions(
+        dict(Uuid=f'agg-{i}', AccountCode=account, Debit=debit, Credit=credit, IsDeleted=deleted)
+        for i, (account, debit, credit, deleted) in enumerate(rows)
+    )
+    
+    session = db.get_session()
+    try:
+        result = session.aggregate(
+            Transaction,
+            keys=[key('AccountCode')],
+            measures=[sum_of('Debit'), count_where(gt('Credit', 0), 'CreditCount'), count_rows()],
+            totals=True
+        )
+    finally:
+        session.close()
+    
+    assert [(r['AccountCode'], float(r['Debit']), r['CreditCount'], r['Count']) for r in result] == [
+        ('A', 15.0, 0, 2),
+        ('B', 0.0, 1, 1)
+    ]
+    assert float(result.total['Debit']) == 15.0 and result.total['Count'] == 3
+
+
+def test_core_fetch_rows_and_arrays(seed_transactions):
+    """خواندن از مسیر Core به صورت ردیف و آرایه بدون رکوردهای حذف‌شده"""
+    import numpy as np
+    from database import db
+    from models import Transaction
+    
+    seed_transactions(dict(Uuid=f'core-{i}', AccountCode=f'A{i}', Debit=i * 1.5, IsDeleted=(i == 0)) for i in range(6))
+    
+    session = db.get_session(columns={'Transaction': ['AccountCode', 'Debit']})
+    try:
+        rows = session.fetch(Transaction)
+        arrays = session.fetch_arrays(Transaction)
+        # stream_results applies to the fetch only, not to the session's connection
+        assert 'stream_results' not in session._session.connection().get_execution_options()
+    finally:
+        session.close()
+    
+    assert sorted(row.AccountCode for row in rows) == ['A1', 'A2', 'A3', 'A4', 'A5']
+    assert arrays['Debit'].dtype == np.float64
+    assert sorted(arrays['Debit'].tolist()) == [1.5, 3.0, 4.5, 6.0, 7.5]
+    assert arrays['AccountCode'].dtype == object
+
+
+def test_fetch_numeric_modes(seed_transactions):
+    """تبدیل ستون‌های مبلغ به float یا واحد خرد (ریال/سنت) در خود SQL"""
+    from decimal import Decimal
+    from database import db
+    from models import Transaction
+    
+    seed_transactions([
+        dict(Uuid='num-1', Debit=Decimal('0.29'), Credit=None, IsDeleted=False),
+        dict(Uuid='num-2', Debit=Decimal('1234.57'), Credit=Decimal('0.01'), IsDeleted=False)
+    ])
+    
+    session = db.get_session()
+    try:
+        floats = session.fetch(Transaction, ['Debit', 'Credit'], numeric='float')
+        minor = session.fetch_arrays(Transaction, ['Debit', 'Credit'], numeric='minor')
+        with pytest.raises(ValueError):
+            session.fetch(Transaction, ['Debit'], numeric='bogus')
+    finally:
+        session.close()
+    
+    assert sorted((type(r.Debit), r.Debit) for r in floats) == [(float, 0.29), (float, 1234.57)]
+    assert str(minor['Debit'].dtype) == 'int64'
+    assert sorted(minor['Debit'].tolist()) == [29, 123457]
+    assert sorted(minor['Credit'].tolist()) == [0, 1]
+
+
+def test_load_frame_types_and_chunks(seed_transactions):
+    """بارگذاری DataFrame نوع‌دار (کد به صورت category) به صورت کامل یا تکه‌ای"""
+    from datetime import datetime
+    from database import db
+    from filters import gt
+    from models import Transaction
+    
+    seed_transactions(
+        dict(
+            Uuid=f'frame-{i}', AccountCode=f'{1101 + i % 2}', Debit=i, Credit=0,
+            DocumentDate=datetime(2024, 1, i + 1), IsDeleted=(i == 4)
+        )
+        for i in range(5)
+    )
+    
+    session = db.get_session()
+    try:
+        frame = session.load_frame(Transaction, ['AccountCode', 'DocumentDate', 'Debit'], filters=[gt('Debit', 0)])
+        chunks = list(session.load_frame(Transaction, ['Debit'], chunksize=2, numeric='minor'))
+        assert 'stream_results' not in session._session.connection().get_execution_options()
+    finally:
+        session.close()
+    
+    assert str(frame['AccountCode'].dtype) == 'category'
+    assert str(frame['DocumentDate'].dtype).startswith('datetime64')
+    assert str(frame['Debit'].dtype) == 'float64'
+    assert frame['Debit'].tolist() == [1.0, 2.0, 3.0]
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert str(chunks[0]['Debit'].dtype) == 'int64'
+
+
+def test_parallel_runner_isolates_timeouts_and_crashes(monkeypatch, tmp_path, seed_transactions):
+    """آزمون کند یا پردازه از کار افتاده فقط خودش خطا می‌گیرد و ترتیب نتایج حفظ می‌شود"""
+    import parallel_runner
+    
+    seed_transactions([])
+    (tmp_path / 'pr_fast.py').write_text('def execute(session):\n    return [1, 2, 3]\n')
+    (tmp_path / 'pr_slow.py').write_text('import time\ndef execute(session):\n    time.sleep(30)\n')
+    (tmp_path / 'pr_crash.py').write_text('import os\ndef execute(session):\n    os._exit(3)\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(parallel_runner, 'test_module_path', lambda test_id: test_id)
+    
+    runner = parallel_runner.ParallelRunner(workers=2, timeout=2, start_method='fork')
+    outcomes = runner.run(['pr_slow', 'pr_crash', 'pr_fast', 'pr_fast_again'], limit=2)
+    
+    assert list(outcomes) == ['pr_slow', 'pr_crash', 'pr_fast', 'pr_fast_again']
+    assert 'timed out' in outcomes['pr_slow']['error']
+    assert 'exit code 3' in outcomes['pr_crash']['error']
+    assert outcomes['pr_fast']['success'] and outcomes['pr_fast']['count'] == 3
+    assert outcomes['pr_fast']['results'] == [1, 2]
+    assert not outcomes['pr_fast_again']['success']
+
+
+def test_job_queue_depth_cancellation_and_results(monkeypatch, tmp_path, seed_transactions):
+    """کارهای پس‌زمینه: محدودیت عمق صف، لغو کار در صف و در حال اجرا، و نتیجه هر آزمون"""
+    import time
+    import parallel_runner
+    from jobs import JobQueue, QueueFullError
+    
+    seed_transactions([])
+    (tmp_path / 'job_fast.py').write_text('def execute(session):\n    return [1, 2, 3]\n')
+    (tmp_path / 'job_slow.py').write_text('import time\ndef execute(session):\n    time.sleep(30)\n')
+    (tmp_path / 'job_crash.py').write_text('import os\ndef execute(session):\n    os._exit(3)\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(parallel_runner, 'test_module_path', lambda test_id: test_id)
+    
+    queue = JobQueue(str(tmp_path / 'jobs.db'), workers=1, depth=1, timeout=20, start_method='fork')
+    
+    def wait_for(job_id, statuses):
+        deadline = time.monotonic() + 15
+        while queue.get(job_id)['status'] not in statuses:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        return queue.get(job_id)
+    
+    try:
+        slow = queue.submit(['job_slow'])
+        assert wait_for(slow, ('running',))['current_test'] == 'job_slow'
+        waiting = queue.submit(['job_fast'])
+        assert queue.get(waiting)['queue_position'] == 1
+        with pytest.raises(QueueFullError):
+            queue.submit(['job_fast'])
+        
+        assert queue.cancel(waiting) == 'cancelled'
+        assert queue.cancel(slow) == 'running'
+        assert wait_for(slow, ('cancelled',))['progress']['done'] == 0
+        
+        batch = queue.submit(['job_fast', 'job_crash'])
+        job = wait_for(batch, ('succeeded', 'failed'))
+        assert job['status'] == 'succeeded' and job['progress'] == {'done': 2, 'total': 2, 'percent': 100.0}
+        outcomes = queue.result(batch)
+        assert outcomes['job_fast']['success'] and outcomes['job_fast']['results'] == [1, 2, 3]
+        assert 'exit code 3' in outcomes['job_crash']['error']
+    finally:
+        queue.stop()
+
+
+def test_read_sessions_use_read_connection(monkeypatch, tmp_path):
+    """sessionهای تست از اتصال خواندنی و نوشتن‌ها از اتصال اصلی استفاده می‌کنند"""
+    from database import Base
+    from models import Transaction
+    
+    monkeypatch.setattr(Config, 'CONNECTION_STRING', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(Config, 'READ_CONNECTION_STRING', f"sqlite:///{tmp_path / 'replica.db'}")
+    database = Database()
+    database._initialize()
+    Base.metadata.create_all(database.engine)
+    Base.metadata.create_all(database.read_engine)
+    
+    write_session = database.get_write_session()
+    try:
+        write_session.add(Transaction(Uuid='primary-1', IsDeleted=False))
+        write_session.commit()
+    finally:
+        write_session.close()
+    
+    session = database.get_session()
+    try:
+        replica_count = session.query(Transaction).count()
+    finally:
+        session.close()
+    
+    assert database.has_read_engine
+    assert database.pool_status()['read_engine'] == 'separate'
+    assert replica_count == 0
+    with database.engine.connect() as connection:
+        assert connection.execute(text('SELECT COUNT(*) FROM Transactions')).scalar() == 1
+
+
+def test_read_intent_added_to_sql_server_url(monkeypatch):
+    """افزودن ApplicationIntent=ReadOnly به رشته اتصال SQL Server"""
+    monkeypatch.setattr(Config, 'CONNECTION_STRING', 'mssql+pyodbc://user:pw@server/audit?driver=ODBC+Driver+17+for+SQL+Server')
+    monkeypatch.setattr(Config, 'READ_CONNECTION_STRING', '')
+    monkeypatch.setattr(Config, 'DB_READ_INTENT', True)
+    
+    assert 'ApplicationIntent=ReadOnly' in Config.get_read_connection_string()
+    assert Config.has_separate_read_connection()
+
+
+def test_tenant_registry_lru_and_idle_eviction(monkeypatch, tmp_path):
+    """دیتابیس هر شرکت جداگانه باز می‌شود و کم‌استفاده‌ترین/بیکارترین بسته می‌شود"""
+    import json
+    from tenants import TenantRegistry
+    
+    monkeypatch.setattr(Config, 'DB_POOL_MODE', 'queue')
+    monkeypatch.setattr(Config, 'TENANT_CONNECTION_STRINGS', json.dumps({'acme': f"sqlite:///{tmp_path / 'acme.db'}"}))
+    monkeypatch.setattr(Config, 'TENANT_CONNECTION_TEMPLATE', f"sqlite:///{tmp_path}/{{tenant}}.db")
+    registry = TenantRegistry(max_engines=2, idle_seconds=60)
+    
+    for tenant in ('acme', 'beta'):
+        session = registry.database(tenant).get_session()
+        try:
+            session.execute(text('SELECT 1'))
+            assert session.tenant == tenant
+        finally:
+            session.close()
+    assert registry.database('acme').engine.url.database.endswith('acme.db')
+    
+    # beta is now the least recently used tenant
+    registry.database('gamma')
+    assert [entry['tenant'] for entry in registry.status()['tenants']] == ['acme', 'gamma']
+    assert registry.stats['evicted'] == 1
+    
+    registry._databases['acme'][1] -= 120
+    assert registry.evict_idle() == ['acme']
+    with pytest.raises(ValueError):
+        registry.database('../other')
+    monkeypatch.setattr(Config, 'TENANT_CONNECTION_TEMPLATE', '')
+    with pytest.raises(ValueError):
+        registry.database('unknown')
+    registry.dispose_all()
+
+
+def test_request_tenant_requires_allowed_user(monkeypatch):
+    """کاربر غیرادمین فقط شرکت‌های مجاز خود در TENANT_USERS را انتخاب می‌کند و ادمین همه را"""
+    import json
+    from flask_login import login_user
+    from models import User
+    import web_ui
+    
+    monkeypatch.setattr(Config, 'TENANT_USERS', json.dumps({'acme': ['ali']}))
+    for username, is_admin, tenant, allowed in [
+        ('ali', False, 'acme', True), ('ali', False, 'beta', False),
+        ('sara', False, 'acme', False), ('root', True, 'beta', True)
+    ]:
+        with web_ui.app.test_request_context(headers={'X-Tenant': tenant}):
+            login_user(User(id=1, username=username, is_admin=is_admin, is_active=True))
+            if allowed:
+                assert web_ui.get_request_tenant() == tenant
+            else:
+                with pytest.raises(PermissionError):
+                    web_ui.get_request_tenant()
+    
+    with web_ui.app.test_request_context():
+        login_user(User(id=1, username='sara', is_admin=False, is_active=True))
+        assert web_ui.get_request_tenant({'b': 1}) is None
+    
+    # The async routes only run on the default database
+    with web_ui.app.test_request_context(method='POST', json={'tenant': 'acme'}):
+        login_user(User(id=1, username='root', is_admin=True, is_active=True))
+        response, status = web_ui.run_test_async('accounting_footing_test')
+    assert status == 400 and 'tenant' in response.get_json()['error'].lower()
+
+
+def test_async_connection_string_uses_asyncio_driver(monkeypatch):
+    """تبدیل رشته اتصال به درایور asyncio برای endpointهای async"""
+    monkeypatch.setattr(Config, 'ASYNC_CONNECTION_STRING', '')
+    monkeypatch.setattr(Config, 'CONNECTION_STRING', 'mssql+pyodbc://user:pw@server/audit?driver=ODBC+Driver+17+for+SQL+Server')
+    
+    assert Config.get_async_connection_string() == 'mssql+aioodbc://user:pw@server/audit?driver=ODBC+Driver+17+for+SQL+Server'
+    assert Config.get_async_connection_string('sqlite:///audit.db') == 'sqlite+aiosqlite:///audit.db'
+    with pytest.raises(ValueError):
+        Config.get_async_connection_string('oracle://user:pw@server/audit')
+
+
+def test_async_session_runs_query_on_pooled_loop(monkeypatch, seed_transactions):
+    """اجرای کامل آزمون روی موتور async (aiosqlite) در حلقه رویداد ماندگار با اتصال‌های pool شده"""
+    from async_database import AsyncDatabase
+    from filters import gt
+    from models import Transaction
+    
+    pytest.importorskip('aiosqlite')
+    monkeypatch.setattr(Config, 'DB_POOL_MODE', 'queue')
+    seed_transactions(dict(Uuid=f'async-{i}', Debit=i, Credit=0, IsDeleted=(i == 4)) for i in range(5))
+    database = AsyncDatabase()
+    
+    async def run_query():
+        session = await database.get_session(
+            columns={'Transaction': ['Debit']},
+            filters={'Transaction': [gt('Debit', 1)]}
+        )
+        async with session:
+            debits = await session.run(lambda s: sorted(float(t.Debit) for t in s.query(Transaction).all()))
+            fetched = await session.fetch(Transaction)
+        return debits, len(fetched)
+    
+    try:
+        assert database.run(run_query()) == ([2.0, 3.0], 2)
+        assert database.run(run_query()) == ([2.0, 3.0], 2)
+        # The second run reused the pooled connection of the loop
+        assert database.read_engine.pool.checkedin() == 1
+    finally:
+        database.run(database.dispose())
+
+
+def test_isolation_level_per_session_and_shared_run(monkeypatch, tmp_path):
+    """سطح ایزوله‌سازی هر session و تراکنش مشترک برای اجرای همه آزمون‌ها"""
+    from database import Base
+    from models import Transaction
+    
+    monkeypatch.setattr(Config, 'CONNECTION_STRING', f"sqlite:///{tmp_path / 'isolation.db'}")
+    monkeypatch.setattr(Config, 'READ_CONNECTION_STRING', '')
+    database = Database()
+    
+    session = database.get_session(isolation_level='read_uncommitted')
+    try:
+        assert session._session.connection().get_isolation_level() == 'READ UNCOMMITTED'
+    finally:
+        session.close()
+    
+    with pytest.raises(ValueError):
+        database.get_session(isolation_level='bogus')
+    
+    with database.consistent_snapshot('SNAPSHOT') as connection:
+        first = database.get_session(isolation_level='READ UNCOMMITTED')
+        second = database.get_session()
+        try:
+            # SQLite has no SNAPSHOT level; the nearest one (SERIALIZABLE) is used
+            assert connection.get_isolation_level() == 'SERIALIZABLE'
+            assert first._session.connection() is connection
+            assert second._session.connection() is connection
+        finally:
+            # Savepoints nest, so sessions in the block close in reverse order
+            second.close()
+            first.close()
+    
+    assert connection.closed
+    
+    # A test failing partway through the run rolls back only its own savepoint
+    Base.metadata.create_all(database.engine)
+    with database.consistent_snapshot() as connection:
+        transaction = connection.get_transaction()
+        failing = database.get_session()
+        try:
+            failing.query(Transaction).count()
+            with pytest.raises(Exception):
+                failing.execute(text('SELECT * FROM missing_table'))
+            failing.rollback()
+        finally:
+            failing.close()
+        following = database.get_session()
+        try:
+            assert following.query(Transaction).count() == 0
+            assert following._session.connection() is connection
+        finally:
+            following.close()
+        assert transaction.is_active and connection.get_transaction() is transaction
+    
+    session = database.get_session()
+    try:
+        assert session._session.connection() is not connection
+    finally:
+        session.close()
+
+
+def test_index_advisor_recommends_filtered_covering_index():
+    """پیشنهاد ایندکس فیلترشده و پوششی از SQL اجراشده آزمون‌ها"""
+    from index_advisor import analyze_statement, index_ddl, recommend
+    
+    tables = {'Transactions': ['Id', 'AccountCode', 'DocumentDate', 'Debit', 'Credit', 'IsDeleted']}
+    sql = (
+        'SELECT "Transactions"."AccountCode", sum("Transactions"."Debit") FROM "Transactions" '
+        'WHERE "Transactions"."DocumentDate" >= ? AND "Transactions"."AccountCode" = ? '
+        'AND "Transactions"."IsDeleted" = 0 GROUP BY "Transactions"."AccountCode"'
+    )
+    patterns = analyze_statement('footing_test', sql, tables)
+    recommendations = recommend(patterns, tables, {'Transactions': ['Id']})
+    
+    assert len(recommendations) == 1
+    assert recommendations[0].key == ['AccountCode', 'DocumentDate']
+    assert index_ddl(recommendations[0], 'mssql') == (
+        'CREATE NONCLUSTERED INDEX [IX_Transactions_AccountCode_DocumentDate_Active_Cov] '
+        'ON [dbo].[Transactions] ([AccountCode], [DocumentDate]) INCLUDE ([Debit], [IsDeleted]) '
+        'WHERE [IsDeleted] = 0;'
+    )
+    
+    # A range seek and a covering scan led by the same column share one index
+    patterns = analyze_statement('range_test', (
+        'SELECT "Transactions"."Debit", "Transactions"."Credit" FROM "Transactions" '
+        'WHERE "Transactions"."Debit" >= ? AND "Transactions"."IsDeleted" = 0'
+    ), tables) + analyze_statement('scan_test', (
+        'SELECT "Transactions"."Debit", "Transactions"."AccountCode" FROM "Transactions" '
+        'WHERE "Transactions"."IsDeleted" = 0'
+    ), tables)
+    recommendations = recommend(patterns, tables, {'Transactions': ['Id']})
+    
+    assert [r.name for r in recommendations] == ['IX_Transactions_Debit_Active_Cov']
+    assert recommendations[0].include == ['Credit', 'AccountCode', 'IsDeleted']
+    assert recommendations[0].tests == ['range_test', 'scan_test']
+
+
+def test_index_advisor_handles_schema_qualified_tables(monkeypatch):
+    """ستون‌های سه‌بخشی (af.[Transactions].[AccountCode]) و schema جدول در DDL"""
+    from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, select
+    from sqlalchemy.dialects import mssql
+    from index_advisor import analyze_statement, index_ddl, recommend
+    from models import get_schema_args
+    
+    monkeypatch.setattr(Config, 'get_connection_string', staticmethod(lambda: 'mssql+pyodbc://server/db'))
+    table = Table(
+        'Transactions', MetaData(),
+        Column('Id', Integer, primary_key=True), Column('AccountCode', String(50)), Column('IsDeleted', Boolean),
+        **get_schema_args()
+    )
+    statement = select(table.c.AccountCode).where(table.c.AccountCode == 'A', table.c.IsDeleted == False)  # noqa: E712
+    sql = str(statement.compile(dialect=mssql.dialect()))
+    assert 'af.[Transactions].[AccountCode]' in sql
+    
+    tables = {table.name: list(table.columns.keys())}
+    patterns = analyze_statement('t', sql, tables)
+    recommendations = recommend(patterns, tables, {table.name: ['Id']}, {table.name: table.schema})
+    
+    assert patterns[0].equality == ['AccountCode'] and patterns[0].soft_delete
+    assert index_ddl(recommendations[0], 'mssql') == (
+        'CREATE NONCLUSTERED INDEX [IX_Transactions_AccountCode_Active_Cov] '
+        'ON [af].[Transactions] ([AccountCode]) INCLUDE ([IsDeleted]) WHERE [IsDeleted] = 0;'
+    )
+
+
+def test_embedded_backend_loads_excel_headers(tmp_path):
+    """ساخت دیتابیس SQLite محلی از فایل اکسل با عناوین فارسی"""
+    import pandas as pd
+    from sqlalchemy import create_engine
+    from embedded_backend import build_database, discover_sources
+    
+    pd.DataFrame({
+        'تاریخ': ['2023/11/24', '2023/01/16'],
+        'شماره سند': [1000, 1001],
+        'کد حساب': [1101, 2101],
+        'بدهکار': [347.61, 0.0],
+        'بستانکار': [0.0, 2000.0],
+        'شرح': ['خرید کالا', 'پرداخت']
+    }).to_excel(tmp_path / 'Transactions_SampleData.xlsx', index=False)
+    
+    sources = discover_sources(str(tmp_path))
+    assert list(sources) == ['Transactions']
+    
+    path = str(tmp_path / 'embedded.db')
+    assert build_database(path, sources) == {'Transactions': 2}
+    
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(text(
+                'SELECT AccountCode, Debit, Credit, IsDeleted, DocumentDate FROM Transactions ORDER BY DocumentNumber'
+            )).all()
+    finally:
+        engine.dispose()
+    
+    assert [(r.AccountCode, r.Debit, r.Credit, r.IsDeleted) for r in rows] == [('1101', 347.61, 0, 0), ('2101', 0, 2000, 0)]
+    assert rows[0].DocumentDate.startswith('2023-11-24')
@@ -0,0 +1,221 @@
+"""
+تست snapshot ستونی مشترک
+Shared columnar snapshot tests
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_version import data_versions, partition_versions, table_version
+from database import db
+from models import Transaction
+from periods import gregorian_to_jalali, jalali_to_gregorian, partition_criteria, periods_between
+from shared_snapshot import SharedSnapshotStore
+from snapshot import SnapshotManager
+
+
+def _rows(rows):
+    """ردیف‌های (حساب، بدهکار) به شکل مورد نیاز seed_transactions"""
+    return [dict(Uuid=f'snap-{i}', AccountCode=account, Debit=debit, Credit=0) for i, (account, debit) in enumerate(rows)]
+
+
+def test_snapshot_shared_until_data_changes(seed_transactions):
+    """snapshot تا زمان تغییر داده‌ها مجدداً استفاده می‌شود"""
+    seed_transactions(_rows([('1101', 10), ('2101', None), ('1101', 30)]))
+    manager = SnapshotManager()
+    
+    session = db.get_session()
+    try:
+        first = manager.get(session, Transaction, ['AccountCode', 'Debit'])
+        second = manager.get(session, Transaction, ['Debit'])
+    finally:
+        session.close()
+    
+    assert first is second
+    assert manager.stats == {'hits': 1, 'loads': 1}
+    assert list(first.decode('AccountCode')) == ['1101', '2101', '1101']
+    assert list(first.column('AccountCode')) == [0, 1, 0]
+    debit = first.column('Debit')
+    assert debit.dtype == np.float64 and np.isnan(debit[1])
+    
+    seed_transactions(_rows([('1101', 10)]))
+    session = db.get_session()
+    try:
+        third = manager.get(session, Transaction, ['Debit'])
+    finally:
+        session.close()
+    
+    assert third is not first
+    assert len(third) == 1
+    assert manager.stats['loads'] == 2
+
+
+def test_shared_store_maps_one_copy_per_version(tmp_path, seed_transactions):
+    """snapshot مشترک بین پردازه‌ها: یک بار ساخته و در بقیه memory-map می‌شود"""
+    seed_transactions(_rows([('1101', 10), ('2101', None)]))
+    store = SharedSnapshotStore(str(tmp_path / 'shared'))
+    builder = SnapshotManager(shared_store=store)
+    worker = SnapshotManager(shared_store=store)
+    
+    session = db.get_session()
+    try:
+        built = builder.get(session, Transaction, ['AccountCode', 'Debit'])
+        mapped = worker.get(session, Transaction, ['Debit'])
+    finally:
+        session.close()
+    
+    assert store.stats['published'] == 1
+    assert isinstance(mapped.column('Debit'), np.memmap)
+    assert list(mapped.decode('AccountCode')) == list(built.decode('AccountCode')) == ['1101', '2101']
+    
+    seed_transactions(_rows([('1101', 10)]))
+    session = db.get_session()
+    try:
+        builder.get(session, Transaction, ['Debit'])
+    finally:
+        session.close()
+    
+    # The old version is removed once no process references it; mapped arrays stay valid
+    assert store.stats['collected'] == 1
+    assert len(list((tmp_path / 'shared' / 'Transaction').iterdir())) == 1
+    assert list(mapped.column('Debit'))[0] == 10.0
+    store.release_all()
+
+def test_soft_delete_changes_token_in_every_process(seed_transactions):
+    """حذف نرم (DeletionTime) نسخه داده را عوض می‌کند؛ توکن فقط از دیتابیس و برای همه پردازه‌ها یکسان است"""
+    from data_version import DataVersions
+    
+    seed_transactions(_rows([('1101', 10), ('2101', 20)]))
+    manager = SnapshotManager()
+    
+    session = db.get_session()
+    try:
+        tokens = data_versions.tokens(session)
+        first = manager.get(session, Transaction, ['Debit'])
+    finally:
+        session.close()
+    
+    write_session = db.SessionLocal()
+    try:
+        write_session.query(Transaction).filter(Transaction.Uuid == 'snap-1').update(
+            {'IsDeleted': True, 'DeletionTime': datetime(2024, 1, 1)}
+        )
+        write_session.commit()
+    finally:
+        write_session.close()
+    
+    session = db.get_session()
+    try:
+        second = manager.get(session, Transaction, ['Debit'])
+        changed = data_versions.token(session, Transaction)
+        # Another process has its own service instance and computes the same token
+        assert DataVersions().token(session, Transaction) == changed
+    finally:
+        session.close()
+    
+    assert 'Transactions' in tokens and 'users' in tokens
+    assert changed != tokens['Transactions']
+    assert second is not first and list(second.column('Debit')) == [10.0]
+    assert manager.stats == {'hits': 0, 'loads': 2}
+
+def test_partitioned_snapshot_loads_only_touched_periods(seed_transactions):
+    """بارگذاری فقط دوره‌های (ماه‌های شمسی) مورد نیاز بازه تاریخ"""
+    assert gregorian_to_jalali(2024, 3, 20) == (1403, 1, 1)
+    assert jalali_to_gregorian(1402, 12, 29) == (2024, 3, 19)
+    assert [p.key for p in periods_between('2024-03-01', '2024-04-25', 'jalali_month')] == ['1402-12', '1403-01', '1403-02']
+    
+    dates = [datetime(2024, 3, 10), datetime(2024, 3, 19, 23), datetime(2024, 3, 20), datetime(2024, 4, 25)]
+    seed_transactions(
+        dict(Uuid=f'period-{i}', AccountCode='1101', Debit=i + 1, Credit=0, DocumentDate=value) for i, value in enumerate(dates)
+    )
+    manager = SnapshotManager()
+    
+    session = db.get_session()
+    try:
+        # اسفند ۱۴۰۲ و فروردین ۱۴۰۳
+        first = manager.get_range(session, Transaction, ['Debit'], '2024-03-15', '2024-03-20', 'jalali_month')
+        again = manager.get_range(session, Transaction, ['Debit'], '2024-03-15', '2024-03-20', 'jalali_month')
+    finally:
+        session.close()
+    
+    assert list(first.column('Debit')) == [2.0, 3.0]
+    assert list(again.column('Debit')) == [2.0, 3.0]
+    assert manager.stats == {'hits': 2, 'loads': 2}
+    
+    seed_transactions([dict(Uuid='period-new', AccountCode='1101', Debit=9, Credit=0, DocumentDate=datetime(2024, 4, 1))], replace=False)
+    
+    session = db.get_session()
+    try:
+        latest = manager.get_range(session, Transaction, ['Debit'], '2024-03-15', '2024-04-10', 'jalali_month')
+    finally:
+        session.close()
+    
+    # only فروردین ۱۴۰۳ changed and is reloaded
+    assert list(latest.column('Debit')) == [2.0, 3.0, 9.0]
+    assert manager.stats == {'hits': 3, 'loads': 3}
+    
+    # The versions of all touched periods are checked in one grouped query
+    periods = periods_between('2024-03-01', '2024-05-31', 'jalali_month')
+    partitions = [partition_criteria(Transaction, period) for period in periods]
+    session = db.get_session()
+    try:
+        assert partition_versions(session, Transaction, partitions) == [
+            table_version(session, Transaction, criteria) for criteria in partitions
+        ]
+    finally:
+        session.close()
+
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_table_cache_round_trip_and_staleness(tmp_path, seed_transactions, file_format):
+    """کش ستونی جدول‌ها: رفت و برگشت arrow/parquet و باطل شدن با تغییر توکن نسخه داده"""
+    from table_cache import TableCache
+    
+    seed_transactions([
+        dict(Uuid='cache-1', AccountCode='1101', Debit=10, Credit=0, FileIndex=7),
+        dict(Uuid='cache-2', AccountCode='2101', Debit=None, Credit=5, FileIndex=None)
+    ])
+    cache = TableCache(str(tmp_path), file_format)
+    
+    session = db.get_session()
+    try:
+        token = cache.refresh(session, Transaction)
+        assert cache.is_valid(session, Transaction)
+        from_file = SnapshotManager(table_cache=cache).get(session, Transaction, ['AccountCode', 'Debit', 'FileIndex'])
+        from_db = SnapshotManager().get(session, Transaction, ['AccountCode', 'Debit', 'FileIndex'])
+    finally:
+        session.close()
+    
+    assert cache.read(Transaction, ['Debit'], token).num_rows == 2
+    assert list(from_file.decode('AccountCode')) == list(from_db.decode('AccountCode')) == ['1101', '2101']
+    assert np.array_equal(from_file.column('Debit'), from_db.column('Debit'), equal_nan=True)
+    # Non-key integer columns are int64 on both paths
+    assert from_file.column('FileIndex').dtype == from_db.column('FileIndex').dtype == np.int64
+    
+    seed_transactions(_rows([('1101', 10)]), replace=False)
+    session = db.get_session()
+    try:
+        assert not cache.is_valid(session, Transaction)
+        with pytest.raises(ValueError):
+            cache.read(Transaction, token=data_versions.token(session, Transaction))
+        assert cache.load(session, Transaction, ['Debit']).num_rows == 3
+    finally:
+        session.close()
+
+
+def test_table_cache_cli_refresh_and_status(tmp_path, seed_transactions, monkeypatch, capsys):
+    """خط فرمان table_cache: گرم کردن کش و نمایش وضعیت اعتبار جدول‌ها"""
+    import json
+    import sys
+    import table_cache
+    
+    seed_transactions(_rows([('1101', 10)]))
+    monkeypatch.setattr(sys, 'argv', ['table_cache.py', '--refresh', '--status', '--dir', str(tmp_path)])
+    table_cache.main()
+    refreshed, status = capsys.readouterr().out.split('\n}\n{', 1)
+    
+    assert 'Transactions' in json.loads(refreshed + '\n}')['refreshed']
+    tables = {row['table']: row for row in json.loads('{' + status)['tables']}
+    assert tables['Transactions']['valid']
+    assert (tmp_path / 'Transactions.arrow').exists() or (tmp_path / 'Transactions.parquet').exists()
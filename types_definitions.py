@@ -2,7 +2,7 @@
 Type definitions for the query runner.
 Provides TypedDict classes for structured data validation.
 """
-from typing import TypedDict, List, Optional, Literal, Union
+from typing import Any, TypedDict, Dict, List, Optional, Literal, Union
 
 
 # Parameter Types
@@ -41,13 +41,73 @@ class SchemaDict(TypedDict):
     columns: List[ColumnDict]
 
 
+# Source Column Projection
+# Model class name -> list of column names the query reads
+ColumnsDict = Dict[str, List[str]]
+
+
+# Row Filters
+FilterOperator = Literal['gt', 'ge', 'lt', 'le', 'eq', 'ne', 'between', 'not_null', 'in']
+
+
+class ParamRefDict(TypedDict, total=False):
+    """Reference to an input parameter, resolved when the query runs"""
+    param: str
+    default: Any
+    choices: List[Any]  # Allowed values; required when the parameter names a column
+    otherwise: Any  # Used for a value outside choices (None skips the predicate)
+
+
+class PredicateDict(TypedDict, total=False):
+    """Row predicate on a model column"""
+    column: Union[str, ParamRefDict]
+    op: FilterOperator
+    value: Any  # Literal value, ParamRefDict, or a list of them (between / in)
+
+
+# Model class name -> row predicates applied in the WHERE clause
+FiltersDict = Dict[str, List[PredicateDict]]
+
+
+# Transaction isolation levels (see Config.get_isolation_level)
+IsolationLevel = Literal['READ UNCOMMITTED', 'READ COMMITTED', 'REPEATABLE READ', 'SNAPSHOT', 'SERIALIZABLE']
+
+
+# Aggregation
+DatePart = Literal['year', 'month']
+AggregateFunction = Literal['count', 'count_where', 'sum', 'avg', 'min', 'max']
+
+
+class GroupKeyDict(TypedDict):
+    """Group key of an aggregation"""
+    column: str
+    part: Optional[DatePart]  # None groups by the column value itself
+    name: str
+
+
+class MeasureDict(TypedDict):
+    """Aggregate computed per group"""
+    name: str
+    function: AggregateFunction
+    column: Optional[str]
+    predicate: Optional[PredicateDict]  # Only for count_where
+
+
 # Query Definition
-class QueryDefinition(TypedDict):
-    """Complete query definition returned by define()"""
+class _QueryDefinitionBase(TypedDict):
+    """Required keys of a query definition"""
     parameters: List[ParameterDict]
     schema: List[ColumnDict]
 
 
+class QueryDefinition(_QueryDefinitionBase, total=False):
+    """Complete query definition returned by define()"""
+    columns: ColumnsDict  # Optional: source columns read by execute()
+    filters: FiltersDict  # Optional: row predicates pushed into SQL
+    isolation_level: IsolationLevel  # Optional: transaction isolation of the test session
+    cache: bool  # Optional: False = never serve the results from the result cache
+
+
 # Output Types
 class OutputSchema(TypedDict):
     """Output schema wrapper"""
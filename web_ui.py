@@ -20,12 +20,20 @@ import json
 from pathlib import Path
 import traceback
 from functools import wraps
+from contextlib import nullcontext
 
 # اضافه کردن مسیر پروژه به sys.path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from database import get_db, Base, db
+from async_database import async_db
+from data_version import data_versions
+from tenants import database_for, tenant_databases
+from result_cache import execute_cached, results as result_cache
+from incremental import states as incremental_states
+from jobs import FINISHED as JOB_FINISHED, QueueFullError, jobs as job_queue
+from config import Config
 from models import Transaction, User
 from sqlalchemy.orm import sessionmaker
 from test_data_requirements import get_test_requirements, get_all_required_files
@@ -33,14 +41,39 @@ from auth import init_auth, authenticate_user, create_user, create_password_rese
 from flask_login import login_user, logout_user, login_required, current_user
 from test_generator import generate_and_save_test
 
+def get_test_session(test_module, tenant=None):
+    """
+    ایجاد session فقط‌خواندنی برای اجرای یک آزمون
+    ستون‌ها (کلید columns) و فیلترهای سطری (کلید filters) اعلام‌شده در define() آزمون
+    اعمال می‌شوند؛ پارامترهای فیلتر از query_runner.INPUT_PARAMETERS خوانده می‌شوند
+    tenant: شرکت (دیتابیس tenant) مورد حسابرسی؛ None = دیتابیس پیش‌فرض
+    """
+    import query_runner
+    definitions = test_module.define() if hasattr(test_module, 'define') else None
+    return query_runner.open_session(definitions, tenant)
+
+
+def get_request_tenant(params=None):
+    """
+    انتخاب tenant (شرکت) درخواست: کلید tenant بدنه JSON، پارامتر tenant در URL یا هدر X-Tenant
+    کلید tenant از params حذف می‌شود تا جزو پارامترهای آزمون نباشد
+    ادمین هر شرکتی را انتخاب می‌کند و سایر کاربران فقط شرکت‌های مجاز خود در TENANT_USERS را
+    
+    Raises:
+        PermissionError: If the current user may not audit the selected tenant
+    """
+    tenant = params.pop('tenant', None) if params else None
+    tenant = tenant or request.args.get('tenant') or request.headers.get('X-Tenant') or None
+    if tenant and not getattr(current_user, 'is_admin', False):
+        if getattr(current_user, 'username', None) not in Config.get_tenant_users().get(tenant, ()):
+            raise PermissionError(f"Access to tenant '{tenant}' is not allowed")
+    return tenant
+
+
 # ایجاد session factory برای write operations
 def get_write_session():
-    """Get a writable session for data uploads"""
-    if not db._initialized:
-        db._initialize()
-    if db.SessionLocal is None:
-        raise Exception("Database not initialized")
-    return db.SessionLocal()
+    """Get a writable session for data uploads (always on the write engine)"""
+    return db.get_write_session()
 
 
 app = Flask(__name__)
@@ -73,12 +106,12 @@ def load_custom_tests():
         # بررسی اینکه __init__.py نباشد
         if py_file.name == '__init__.py':
             continue
-            
+        
         # خواندن docstring برای استخراج نام فارسی و انگلیسی
         try:
             with open(py_file, 'r', encoding='utf-8') as f:
                 content = f.read(500)  # فقط 500 کاراکتر اول
-                
+            
             # استخراج docstring
             import re
             docstring_match = re.search(r'"""\s*\n(.*?)\n(.*?)\n', content, re.DOTALL)
@@ -802,14 +835,23 @@ def run_test(test_id):
             params = {}
         
         # تنظیم پارامترها برای query_runner
+        try:
+            tenant = get_request_tenant(params)
+            database_for(tenant)
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         import query_runner
         query_runner.INPUT_PARAMETERS = params
         
         # اجرای آزمون
-        session = get_db()
+        session = get_test_session(test_module, tenant)
         
         try:
-            results = test_module.execute(session)
+            # نتیجه ذخیره‌شده در صورت یکسان بودن پارامترها و نسخه داده‌ها (result_cache.py)
+            results = execute_cached(test_id, test_module, session, params, tenant)
             
             return jsonify({
                 'success': True,
@@ -832,6 +874,11 @@ def run_test(test_id):
 @login_required
 def get_test_parameters(test_id):
     """دریافت پارامترهای یک آزمون"""
+    return _test_parameters_response(test_id)
+
+
+def _test_parameters_response(test_id):
+    """پاسخ JSON پارامترهای یک آزمون (مشترک بین endpoint همگام و async)"""
     try:
         # بررسی امنیت test_id - جلوگیری از path traversal و محدود کردن به فرمت مجاز
         if not test_id.replace('_', '').isalnum() or '..' in test_id or '/' in test_id or '\\' in test_id:
@@ -882,43 +929,355 @@ def get_test_parameters(test_id):
         }), 500
 
 
+# Async endpoints: the database is accessed through async_database.async_db on
+# its long-lived event loop (async_db.run), with pooled async connections.
+# The views are regular (WSGI) views: Flask's async views would run each request
+# in a fresh event loop, which cannot reuse the loop's connections.
+@app.route('/async/run-test/<test_id>', methods=['POST'])
+@login_required
+def run_test_async(test_id):
+    """اجرای یک آزمون خاص با دسترسی async به دیتابیس"""
+    try:
+        # بررسی آیا آزمون از نوع custom است
+        if test_id.startswith('custom_tests_'):
+            actual_test_name = test_id.replace('custom_tests_', '')
+            module_path = f'queries.custom_tests.{actual_test_name}'
+        else:
+            module_path = f'queries.{test_id}'
+        
+        test_module = importlib.import_module(module_path)
+        
+        # مسیرهای async فقط دیتابیس پیش‌فرض را دارند؛ آزمون شرکت‌ها با /run-test اجرا می‌شود
+        params = request.get_json(silent=True) or {}
+        if get_request_tenant(params):
+            return jsonify({'error': 'Tenants are not supported on /async routes, use /run-test'}), 400
+        
+        # تنظیم پارامترها برای query_runner
+        import query_runner
+        query_runner.INPUT_PARAMETERS = params
+        
+        definitions = test_module.define() if hasattr(test_module, 'define') else None
+        
+        async def run_on_loop():
+            session = await query_runner.open_async_session(definitions)
+            async with session:
+                return await session.run(test_module.execute)
+        
+        results = async_db.run(run_on_loop())
+        
+        return jsonify({
+            'success': True,
+            'test_id': test_id,
+            'results': results,
+            'count': len(results)
+        })
+    
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except Exception as e:
+        return jsonify({
+            'error': f'خطا در اجرای آزمون: {str(e)}',
+            'traceback': traceback.format_exc()
+        }), 500
+
+
+@app.route('/async/get-test-parameters/<test_id>', methods=['GET'])
+@login_required
+def get_test_parameters_async(test_id):
+    """دریافت پارامترهای یک آزمون (همان /get-test-parameters؛ به دیتابیس نیازی ندارد)"""
+    return _test_parameters_response(test_id)
+
+
+@app.route('/async/users', methods=['GET'])
+@login_required
+def list_users_async():
+    """فهرست کاربران به صورت JSON (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این بخش را ندارید.'}), 403
+    
+    try:
+        from auth import get_all_users_async
+        users = async_db.run(get_all_users_async())
+        return jsonify({
+            'success': True,
+            'users': [{
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'full_name': user.full_name,
+                'is_active': user.is_active,
+                'is_admin': user.is_admin,
+                'created_at': user.created_at.isoformat() if user.created_at else None,
+                'last_login': user.last_login.isoformat() if user.last_login else None
+            } for user in users]
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'خطا در دریافت کاربران: {str(e)}'}), 500
+
+
 @app.route('/run-all-tests', methods=['POST'])
 @login_required
 def run_all_tests():
     """اجرای همه آزمون‌ها"""
     results = {}
     
-    for category_id, category in AUDIT_TESTS.items():
-        for test in category['tests']:
-            try:
-                module_path = f'queries.{test["id"]}'
-                test_module = importlib.import_module(module_path)
-                
-                session = get_db()
+    # با تعیین سطح ایزوله‌سازی (isolation_level در بدنه درخواست یا DB_RUN_ALL_ISOLATION_LEVEL)
+    # همه آزمون‌ها در یک تراکنش مشترک و روی یک تصویر سازگار از داده‌ها اجرا می‌شوند
+    # tenant: اجرای همه آزمون‌ها روی دیتابیس یک شرکت (tenants.py)
+    body = request.get_json(silent=True) or {}
+    try:
+        run_level = Config.get_isolation_level(
+            body.get('isolation_level') or Config.DB_RUN_ALL_ISOLATION_LEVEL
+        )
+        tenant = get_request_tenant(body)
+        run_db = database_for(tenant)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # اجرای موازی در چند پردازه (workers در بدنه درخواست یا RUN_ALL_WORKERS)؛
+    # با تراکنش مشترک (run_level) آزمون‌ها به ترتیب در همین پردازه اجرا می‌شوند
+    try:
+        workers = int(body.get('workers') or Config.RUN_ALL_WORKERS)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'workers must be an integer'}), 400
+    if workers > 1 and not run_level:
+        return run_all_tests_parallel(workers, tenant)
+    
+    import query_runner
+    
+    # نسخه داده هر جدول یک بار در هر اجرا بررسی می‌شود (کلید حافظه نهان نتایج)
+    versions = {}
+    
+    # برنامه‌ریزی اسکن مشترک: هر جدول یک بار خوانده می‌شود و ردیف‌ها بین آزمون‌های آن جدول مشترک است
+    planner = None
+    if Config.BATCH_SHARED_SCANS:
+        from batch_planner import BatchPlanner
+        modules = {}
+        for category in AUDIT_TESTS.values():
+            for test in category['tests']:
                 try:
-                    test_results = test_module.execute(session)
+                    modules[test['id']] = importlib.import_module(f'queries.{test["id"]}')
+                except Exception:
+                    # خطا هنگام اجرای آزمون گزارش می‌شود
+                    pass
+        planner = BatchPlanner(modules, query_runner.get_parameter)
+    
+    with run_db.consistent_snapshot(run_level) if run_level else nullcontext():
+        for category_id, category in AUDIT_TESTS.items():
+            for test in category['tests']:
+                try:
+                    module_path = f'queries.{test["id"]}'
+                    test_module = importlib.import_module(module_path)
+                    
+                    session = get_test_session(test_module, tenant)
+                    if planner is not None:
+                        session = planner.session(test['id'], session)
+                    try:
+                        test_results = execute_cached(
+                            test['id'], test_module, session, query_runner.INPUT_PARAMETERS, tenant, versions
+                        )
+                        results[test['id']] = {
+                            'success': True,
+                            'name': test['name'],
+                            'count': len(test_results),
+                            'data': test_results[:10]  # فقط 10 رکورد اول
+                        }
+                    finally:
+                        session.close()
+                
+                except Exception as e:
                     results[test['id']] = {
-                        'success': True,
+                        'success': False,
                         'name': test['name'],
-                        'count': len(test_results),
-                        'data': test_results[:10]  # فقط 10 رکورد اول
+                        'error': str(e)
                     }
-                finally:
-                    session.close()
-            
-            except Exception as e:
-                results[test['id']] = {
-                    'success': False,
-                    'name': test['name'],
-                    'error': str(e)
-                }
     
     return jsonify({
         'success': True,
+        'tenant': tenant,
+        'shared_scans': planner.summary() if planner is not None else {},
+        'results': results
+    })
+
+
+def run_all_tests_parallel(workers, tenant):
+    """اجرای همه آزمون‌ها در پردازه‌های موازی با محدودیت زمان هر آزمون (parallel_runner.py)"""
+    import query_runner
+    from parallel_runner import ParallelRunner
+    
+    tests = [test for category in AUDIT_TESTS.values() for test in category['tests']]
+    outcomes = ParallelRunner(workers).run(
+        [test['id'] for test in tests],
+        parameters=query_runner.INPUT_PARAMETERS,
+        tenant=tenant,
+        limit=10  # فقط 10 رکورد اول
+    )
+    
+    # نتایج به ترتیب فهرست آزمون‌ها
+    results = {}
+    for test in tests:
+        outcome = outcomes[test['id']]
+        if outcome['success']:
+            results[test['id']] = {
+                'success': True,
+                'name': test['name'],
+                'count': outcome['count'],
+                'data': outcome['results']
+            }
+        else:
+            results[test['id']] = {
+                'success': False,
+                'name': test['name'],
+                'error': outcome['error']
+            }
+    
+    return jsonify({
+        'success': True,
+        'tenant': tenant,
+        'workers': workers,
+        'shared_scans': {},
         'results': results
     })
 
 
+def _job_owner():
+    """شناسه کاربر جاری به عنوان مالک کارهای پس‌زمینه"""
+    return current_user.get_id() if current_user.is_authenticated else None
+
+
+def _visible_job(job_id):
+    """وضعیت یک کار پس‌زمینه در صورت وجود و دسترسی کاربر جاری (مالک کار یا ادمین)، در غیر این صورت None"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return None
+    if job['owner'] and job['owner'] != _job_owner() and not getattr(current_user, 'is_admin', False):
+        return None
+    return job
+
+
+def _submit_job(test_ids, params, tenant, limit=None):
+    """ثبت کار در صف و برگرداندن شناسه آن (202)؛ در صورت پر بودن صف 429"""
+    try:
+        job_id = job_queue.submit(test_ids, params, tenant, limit, owner=_job_owner())
+    except QueueFullError as e:
+        return jsonify({'error': f'صف کارها پر است، بعدا تلاش کنید ({e})'}), 429
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+
+@app.route('/jobs/run-test/<test_id>', methods=['POST'])
+@login_required
+def submit_test_job(test_id):
+    """اجرای یک آزمون به صورت کار پس‌زمینه (jobs.py)؛ شناسه کار بلافاصله برگردانده می‌شود"""
+    from parallel_runner import test_module_path
+    
+    if not test_id.replace('_', '').isalnum():
+        return jsonify({'error': 'Invalid test ID format'}), 400
+    try:
+        importlib.import_module(test_module_path(test_id))
+    except ImportError:
+        return jsonify({'error': 'Test ID not found'}), 404
+    
+    params = request.get_json(silent=True) or {}
+    try:
+        tenant = get_request_tenant(params)
+        database_for(tenant)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return _submit_job([test_id], params, tenant)
+
+
+@app.route('/jobs/run-all-tests', methods=['POST'])
+@login_required
+def submit_all_tests_job():
+    """اجرای همه آزمون‌ها به صورت یک کار پس‌زمینه (پیشرفت: تعداد آزمون‌های انجام‌شده)"""
+    body = request.get_json(silent=True) or {}
+    try:
+        tenant = get_request_tenant(body)
+        database_for(tenant)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    params = {name: value for name, value in body.items() if name not in ('isolation_level', 'workers')}
+    test_ids = [test['id'] for category in AUDIT_TESTS.values() for test in category['tests']]
+    return _submit_job(test_ids, params, tenant, limit=10)  # فقط 10 رکورد اول هر آزمون
+
+
+@app.route('/jobs')
+@login_required
+def list_jobs():
+    """کارهای اخیر کاربر (همه کارها برای ادمین) و وضعیت صف"""
+    owner = None if getattr(current_user, 'is_admin', False) else _job_owner()
+    return jsonify({'success': True, 'queue': job_queue.status(), 'jobs': job_queue.recent(owner)})
+
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """وضعیت و پیشرفت یک کار پس‌زمینه"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, **job})
+
+
+@app.route('/jobs/<job_id>/result')
+@login_required
+def job_result(job_id):
+    """نتیجه یک کار پایان‌یافته؛ برای کار یک آزمون به همان شکل پاسخ /run-test"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] not in JOB_FINISHED:
+        return jsonify({'error': 'کار هنوز پایان نیافته است', **job}), 409
+    
+    outcomes = job_queue.result(job_id) or {}
+    if len(job['test_ids']) > 1:
+        return jsonify({'success': True, 'job_id': job_id, 'status': job['status'], 'results': outcomes})
+    
+    test_id = job['test_ids'][0]
+    outcome = outcomes.get(test_id)
+    if outcome is None or not outcome['success']:
+        return jsonify({
+            'success': False,
+            'job_id': job_id,
+            'test_id': test_id,
+            'status': job['status'],
+            'error': f"خطا در اجرای آزمون: {(outcome or {}).get('error') or job['error'] or job['status']}",
+            'traceback': (outcome or {}).get('traceback')
+        })
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'test_id': test_id,
+        'results': outcome['results'],
+        'count': outcome['count']
+    })
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """لغو یک کار: کار در صف حذف و پردازه کار در حال اجرا متوقف می‌شود"""
+    if _visible_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    status = job_queue.cancel(job_id)
+    if status in ('succeeded', 'failed'):
+        return jsonify({'error': 'کار پیش از لغو پایان یافته است', 'status': status}), 409
+    return jsonify({'success': True, 'job_id': job_id, 'status': status})
+
+
 @app.route('/export/<test_id>')
 @login_required
 def export_test(test_id):
@@ -927,10 +1286,13 @@ def export_test(test_id):
         module_path = f'queries.{test_id}'
         test_module = importlib.import_module(module_path)
         
-        session = get_db()
+        tenant = get_request_tenant()
+        session = get_test_session(test_module, tenant)
         
         try:
-            results = test_module.execute(session)
+            # خروجی معمولاً بلافاصله بعد از اجرای آزمون گرفته می‌شود و از حافظه نهان خوانده می‌شود
+            import query_runner
+            results = execute_cached(test_id, test_module, session, query_runner.INPUT_PARAMETERS, tenant)
             
             # تبدیل به DataFrame
             df = pd.DataFrame(results)
@@ -946,10 +1308,74 @@ def export_test(test_id):
         finally:
             session.close()
     
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/db-pool-status')
+@login_required
+def db_pool_status():
+    """آمار استخر اتصالات دیتابیس (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این اطلاعات را ندارید'}), 403
+    
+    return jsonify({'success': True, 'pool': db.pool_status()})
+
+
+@app.route('/tenants')
+@login_required
+def tenants_status():
+    """دیتابیس‌های باز شرکت‌ها (tenant) و آمار استخر اتصالات هر کدام (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این اطلاعات را ندارید'}), 403
+    
+    tenant_databases.evict_idle()
+    return jsonify({'success': True, 'tenants': tenant_databases.status()})
+
+
+@app.route('/result-cache', methods=['GET', 'DELETE'])
+@login_required
+def result_cache_status():
+    """آمار حافظه نهان نتایج آزمون‌ها؛ DELETE همه نتایج ذخیره‌شده را پاک می‌کند (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این اطلاعات را ندارید'}), 403
+    
+    if request.method == 'DELETE':
+        result_cache.clear()
+    return jsonify({'success': True, 'cache': result_cache.status()})
+
+
+@app.route('/incremental-state', methods=['GET', 'DELETE'])
+@login_required
+def incremental_state_status():
+    """آمار اجرای افزایشی آزمون‌ها؛ DELETE وضعیت ذخیره‌شده (همه یا ?test=) را پاک می‌کند (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این اطلاعات را ندارید'}), 403
+    
+    removed = None
+    if request.method == 'DELETE':
+        removed = incremental_states.clear(request.args.get('test') or None)
+    return jsonify({'success': True, 'removed': removed, 'incremental': incremental_states.status()})
+
+
+@app.route('/data-versions')
+@login_required
+def data_versions_status():
+    """نسخه داده (data version token) همه جداول (فقط برای ادمین)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'شما اجازه دسترسی به این اطلاعات را ندارید'}), 403
+    
+    session = db.get_session()
+    try:
+        return jsonify({'success': True, 'versions': data_versions.tokens(session)})
+    except Exception as e:
+        return jsonify({'error': f'خطا در محاسبه نسخه داده: {str(e)}'}), 500
+    finally:
+        session.close()
+
+
 # روت‌های آزمون‌ساز (Test Generator)
 @app.route('/test-generator')
 @login_required
@@ -1425,7 +1851,7 @@ def fix_test_error():
             'message': 'کد با موفقیت اصلاح شد. لطفاً دوباره آزمون را اجرا کنید.',
             'backup_file': backup_path.name
         })
-        
+    
     except Exception as e:
         return jsonify({
             'success': False,